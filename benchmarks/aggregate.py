@@ -0,0 +1,65 @@
+"""Compares the netaddr and integer range CIDR aggregation on real-sized inputs
+
+    python -m benchmarks.aggregate --v4 1000000 --v6 200000
+"""
+import time
+import random
+import argparse
+
+import netaddr
+
+from bgpip_tools.bogon import get_bogon_ipset, get_bogon_ranges
+from bgpip_tools.ranges import IP_BITS, aggregate_prefixes, format_prefix, ranges_to_cidrs
+
+
+def generate_prefixes(count, version, seed=0):
+    """Generates clustered `(version, network, length)` prefixes, like a routing table"""
+    rnd = random.Random(seed)
+    bits = IP_BITS[version]
+    lengths = [16, 19, 20, 21, 22, 23, 24] if version == 4 else [29, 32, 36, 40, 44, 48]
+    prefixes = set()
+    while len(prefixes) < count:
+        # a block of neighbouring prefixes allocated to the same network
+        base = rnd.getrandbits(bits)
+        for _ in range(rnd.randint(1, 32)):
+            length = rnd.choice(lengths)
+            network = (base + rnd.getrandbits(bits - 12)) % (1 << bits)
+            network = network >> (bits - length) << (bits - length)
+            prefixes.add((version, network, length))
+    return list(prefixes)[:count]
+
+
+def aggregate_netaddr(prefixes, v4, v6):
+    ipset = get_bogon_ipset(v4, v6)
+    cidrs = [format_prefix(*prefix) for prefix in prefixes]
+    merged = netaddr.cidr_merge(cidr for cidr in cidrs if cidr not in ipset)
+    return [str(v.cidr) for v in merged]
+
+
+def aggregate_ranges(prefixes, v4, v6):
+    return ranges_to_cidrs(aggregate_prefixes(prefixes, get_bogon_ranges(v4, v6)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--v4', type=int, default=1_000_000, help="number of ipv4 prefixes")
+    parser.add_argument('--v6', type=int, default=200_000, help="number of ipv6 prefixes")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for version, count in ((4, args.v4), (6, args.v6)):
+        if not count:
+            continue
+        prefixes = generate_prefixes(count, version, args.seed)
+        results = {}
+        for name, func in (('netaddr', aggregate_netaddr), ('ranges', aggregate_ranges)):
+            start = time.perf_counter()
+            results[name] = func(prefixes, version == 4, version == 6)
+            print(f'v{version} {name:8} {count} prefixes -> {len(results[name])} cidrs '
+                  f'in {time.perf_counter() - start:.2f}s')
+        if results['netaddr'] != results['ranges']:
+            raise SystemExit(f'v{version} outputs differ')
+
+
+if __name__ == '__main__':
+    main()
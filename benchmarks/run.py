@@ -0,0 +1,114 @@
+"""Runs the pipeline benchmarks over a synthetic RIB and asninfo snapshot, offline
+
+    python -m benchmarks.run --prefixes 200000 --peers 8 --output results.json
+    python -m benchmarks.run --scenario end_to_end --compare results.json
+
+Inputs are generated deterministically from the parameters and the seed into
+a scratch working directory, results are written as JSON and compared by
+scenario with `--compare`.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'stable')
+
+
+def compare_results(previous, current):
+    """Prints the wall time of every scenario against a previous result"""
+    if previous.get('params') != current['params']:
+        print('warning: the parameters differ from the compared results', file=sys.stderr)
+    print(f'{"scenario":20} {"previous":>10} {"current":>10} {"ratio":>7}')
+    for name, result in current['scenarios'].items():
+        before = previous.get('scenarios', {}).get(name)
+        if not before:
+            print(f'{name:20} {"-":>10} {result["wall_seconds"]:>9.3f}s')
+            continue
+        ratio = result['wall_seconds'] / before['wall_seconds'] if before['wall_seconds'] else float('inf')
+        print(f'{name:20} {before["wall_seconds"]:>9.3f}s {result["wall_seconds"]:>9.3f}s {ratio:>6.2f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prefixes', type=int, default=100_000, help="number of prefixes of the RIB")
+    parser.add_argument('--peers', type=int, default=8, help="number of peers of the RIB")
+    parser.add_argument('--v6-ratio', type=float, default=0.2, help="share of IPv6 prefixes")
+    parser.add_argument('--asns', type=int, default=50_000, help="number of asninfo records")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--compression', choices=['gz', 'bz2', ''], default='gz', help="compression of the RIB file")
+    parser.add_argument('--reader', choices=['bgpstream', 'mrt'], default='bgpstream',
+                        help="RIB reader of the end-to-end scenario, bgpstream reads the fake source")
+    parser.add_argument('--jobs', type=int, default=1, help="decoding processes, adds the decode_mrt_jobs scenario")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per scenario, the fastest is reported")
+    parser.add_argument('--scenario', dest='scenarios', action='append', help="scenarios to run, repeatable")
+    parser.add_argument('--config-dir', default=CONFIG_DIR, help="configuration of the ASN classification")
+    parser.add_argument('--work-dir', help="keep the generated inputs in this directory")
+    parser.add_argument('--profile-dir', help="dump a cProfile profile of every scenario run")
+    parser.add_argument('-o', '--output', help="write the results as JSON")
+    parser.add_argument('--compare', help="compare with the JSON results of a previous run")
+    parser.add_argument('-v', '--verbose', action='store_true', help="show the logs of bgpip_tools")
+    args = parser.parse_args()
+
+    config_dir = os.path.abspath(args.config_dir)
+    output = args.output and os.path.abspath(args.output)
+    compare = args.compare and os.path.abspath(args.compare)
+    profile_dir = args.profile_dir and os.path.abspath(args.profile_dir)
+    work_dir = os.path.abspath(args.work_dir) if args.work_dir else tempfile.mkdtemp(prefix='bgpip-bench-')
+    os.makedirs(work_dir, exist_ok=True)
+    cwd = os.getcwd()
+    # bgpip_tools resolves its data directory from the working directory on import
+    os.chdir(work_dir)
+    os.environ.setdefault('TQDM_DISABLE', '1')
+    try:
+        from bgpip_tools.config import __version__, setup_logging
+        from .scenarios import SCENARIOS, BenchmarkContext, run_scenarios
+
+        setup_logging(logging.INFO if args.verbose else logging.WARNING)
+        for name in args.scenarios or ():
+            if name not in SCENARIOS:
+                parser.error(f'unknown scenario {name}, choose from {list(SCENARIOS)}')
+
+        start = time.perf_counter()
+        ctx = BenchmarkContext(
+            config_dir, asns=args.asns, prefixes=args.prefixes, peers=args.peers, v6_ratio=args.v6_ratio,
+            seed=args.seed, compression=args.compression, reader=args.reader, jobs=args.jobs)
+        print(f'generated inputs in {time.perf_counter() - start:.2f}s at {work_dir}', file=sys.stderr)
+        scenarios = run_scenarios(ctx, args.scenarios, args.repeat, profile_dir)
+    finally:
+        os.chdir(cwd)
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        'created_at': time.time(),
+        'params': {
+            'prefixes': args.prefixes, 'peers': args.peers, 'v6_ratio': args.v6_ratio, 'asns': args.asns,
+            'seed': args.seed, 'compression': args.compression, 'reader': args.reader, 'jobs': args.jobs,
+        },
+        'environment': {
+            'bgpip_tools': __version__,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'scenarios': scenarios,
+    }
+    for name, result in scenarios.items():
+        print(f'{name:20} {result["wall_seconds"]:>9.3f}s  cpu {result["cpu_seconds"]:.3f}s  {result["counts"]}')
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if compare:
+        with open(compare) as f:
+            compare_results(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""Timed scenarios over a synthetic RIB and asninfo snapshot, one per pipeline stage plus an end-to-end run
+
+Imported by `benchmarks.run` once the working directory is set, as
+`bgpip_tools` resolves its data directory on import.
+"""
+import os
+import collections
+
+from bgpip_tools.asn import load_asns_by_config
+from bgpip_tools.asnstore import ASNStore, get_asn_store_path
+from bgpip_tools.bgp import decode_origin_table, load_cidr_by_asns, load_ranges_by_asns
+from bgpip_tools.bogon import get_bogon_ipset, get_bogon_ranges
+from bgpip_tools.config import DATA_DIR, read_config
+from bgpip_tools.data import get_asn_data_path
+from bgpip_tools.metrics import StageMetrics, get_metrics, reset_metrics
+from bgpip_tools.origin import OriginTable, get_origin_table_path
+from bgpip_tools.ranges import ranges_to_cidrs
+from bgpip_tools.reader import read_rib_bgpstream, read_rib_mrt
+
+from .source import FakeBGPSource
+from .synthetic import SyntheticRIB, generate_asninfo, write_asninfo
+
+FAMILIES = ('ipv4', 'ipv6')
+
+
+class BenchmarkContext:
+    """Synthetic inputs shared by the scenarios, and the outputs of earlier scenarios"""
+
+    def __init__(self, config_dir, asns=50_000, prefixes=100_000, peers=8, v6_ratio=0.2, seed=0,
+                 compression='gz', reader='bgpstream', jobs=1):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        self.config = read_config(config_dir)
+        self.asn_filepath = get_asn_data_path()
+        records = generate_asninfo(asns, seed)
+        write_asninfo(self.asn_filepath, records)
+        self.rib = SyntheticRIB([v['asn'] for v in records], prefixes, peers, v6_ratio, seed)
+        self.rib_filepath = os.path.join(DATA_DIR, f'rib.synthetic.mrt{"." + compression if compression else ""}')
+        self.rib.write_mrt(self.rib_filepath)
+        self.source = FakeBGPSource({self.rib_filepath: self.rib})
+        self.bgp_config = {
+            'filepath': self.rib_filepath,
+            'data_dir': DATA_DIR,
+            'filename': os.path.basename(self.rib_filepath),
+            'rough_size': os.path.getsize(self.rib_filepath),
+        }
+        self.reader = reader
+        self.jobs = jobs
+        self.asns = None
+        self.pairs = None
+        self.table = None
+        self.range_maps = None
+
+    def clear_origin_table(self):
+        table_fp = get_origin_table_path(self.rib_filepath)
+        if os.path.isfile(table_fp):
+            os.remove(table_fp)
+
+
+def bench_asn_store(ctx, counts):
+    store_fp = get_asn_store_path(ctx.asn_filepath)
+    ASNStore.from_jsonl(ctx.asn_filepath).save(store_fp)
+    counts['records'] = len(ASNStore.load(store_fp))
+
+
+def bench_asn_classification(ctx, counts):
+    ctx.asns = load_asns_by_config(ctx.config, use_cache=False)
+    counts['groups'] = len(ctx.asns)
+    counts['asns'] = sum(len(v) for v in ctx.asns.values())
+
+
+def bench_bogon_ipset(ctx, counts):
+    counts['cidrs'] = len(get_bogon_ipset().iter_cidrs())
+
+
+def bench_bogon_ranges(ctx, counts):
+    counts['ranges'] = sum(len(v) for v in get_bogon_ranges().values())
+
+
+def bench_decode_bgpstream(ctx, counts):
+    decode_counters = collections.Counter()
+    with ctx.source.patch():
+        ctx.pairs = set(read_rib_bgpstream(ctx.rib_filepath, decode_counters))
+    counts.update(decode_counters)
+    counts['pairs'] = len(ctx.pairs)
+
+
+def bench_decode_mrt(ctx, counts):
+    decode_counters = collections.Counter()
+    ctx.pairs = set(read_rib_mrt(ctx.rib_filepath, decode_counters))
+    counts.update(decode_counters)
+    counts['pairs'] = len(ctx.pairs)
+
+
+def bench_decode_mrt_jobs(ctx, counts):
+    decode_counters = collections.Counter()
+    table = decode_origin_table(ctx.rib_filepath, ctx.jobs, 'mrt', decode_counters)
+    counts.update(decode_counters)
+    counts['pairs'] = len(table)
+
+
+def bench_origin_table(ctx, counts):
+    table_fp = get_origin_table_path(ctx.rib_filepath)
+    OriginTable.from_pairs(ctx.pairs).save(table_fp)
+    ctx.table = OriginTable.load(table_fp)
+    counts['rows'] = len(ctx.table)
+
+
+def bench_filter_aggregate(ctx, counts):
+    ctx.range_maps = {}
+    for family in FAMILIES:
+        ctx.range_maps[family] = load_ranges_by_asns(
+            ctx.bgp_config, ctx.asns, v4=family == 'ipv4', v6=family == 'ipv6', table=ctx.table)
+        counts[f'{family}_ranges'] = sum(len(r) for v in ctx.range_maps[family].values() for r in v.values())
+
+
+def bench_cidr_format(ctx, counts):
+    for family, range_map in ctx.range_maps.items():
+        counts[f'{family}_cidrs'] = sum(len(ranges_to_cidrs(v)) for v in range_map.values())
+
+
+def bench_end_to_end(ctx, counts):
+    ctx.clear_origin_table()
+    # the stages of the pipeline are reported alongside the scenario
+    reset_metrics(keep_stages=False)
+    # the fake source only knows the whole RIB file, not the chunks decoded by the workers
+    jobs = ctx.jobs if ctx.reader == 'mrt' else 1
+    with ctx.source.patch():
+        asns = load_asns_by_config(ctx.config, use_cache=False)
+        for family in FAMILIES:
+            cidr_map = load_cidr_by_asns(
+                ctx.bgp_config, asns, v4=family == 'ipv4', v6=family == 'ipv6', jobs=jobs, reader=ctx.reader)
+            counts[f'{family}_cidrs'] = sum(len(v) for v in cidr_map.values())
+
+
+# name: (function, runs only when)
+SCENARIOS = {
+    'asn_store': (bench_asn_store, None),
+    'asn_classification': (bench_asn_classification, None),
+    'bogon_ipset': (bench_bogon_ipset, None),
+    'bogon_ranges': (bench_bogon_ranges, None),
+    'decode_bgpstream': (bench_decode_bgpstream, None),
+    'decode_mrt': (bench_decode_mrt, None),
+    'decode_mrt_jobs': (bench_decode_mrt_jobs, lambda ctx: ctx.jobs > 1),
+    'origin_table': (bench_origin_table, None),
+    'filter_aggregate': (bench_filter_aggregate, None),
+    'cidr_format': (bench_cidr_format, None),
+    'end_to_end': (bench_end_to_end, None),
+}
+
+
+def run_scenarios(ctx, names=None, repeat=3, profile_dir=None):
+    """Runs the scenarios in order, `repeat` times each, returns `{name: result}`
+
+    The fastest run is reported; every scenario needs the outputs of the
+    scenarios before it, so a selection of `names` also runs those once.
+    """
+    metrics = StageMetrics(profile_dir)
+    results = {}
+    last = max(list(SCENARIOS).index(name) for name in names) if names else len(SCENARIOS) - 1
+    for name, (func, condition) in list(SCENARIOS.items())[:last + 1]:
+        if condition and not condition(ctx):
+            continue
+        selected = names is None or name in names
+        records = []
+        for _ in range(repeat if selected else 1):
+            with metrics.stage(name) as counts:
+                func(ctx, counts)
+            records.append(metrics.stages[-1])
+        if not selected:
+            continue
+        best = min(records, key=lambda v: v['wall_seconds'])
+        result = {
+            'runs': [v['wall_seconds'] for v in records],
+            'wall_seconds': best['wall_seconds'],
+            'cpu_seconds': best['cpu_seconds'],
+            'process_peak_rss_kb': best['process_peak_rss_kb'],
+            'counts': best['counts'],
+        }
+        if name == 'end_to_end':
+            # stage totals of the last run
+            result['stages'] = get_metrics().to_dict()['totals']
+        results[name] = result
+    return results
@@ -0,0 +1,35 @@
+"""Offline stand-in for `bgpip_tools.data.get_stream_bgp`, serving synthetic RIB snapshots"""
+import contextlib
+
+
+class FakeBGPSource:
+    """Maps RIB file paths to `SyntheticRIB` snapshots
+
+    `get_stream_bgp` stands in for `bgpip_tools.data.get_stream_bgp` over RIB
+    files and yields the elements of the snapshot registered for a path, the
+    file itself is never read. There are no synthetic update files, so the
+    incremental mode is not benchmarked.
+    """
+
+    def __init__(self, ribs=None):
+        self.ribs = dict(ribs or {})
+
+    def add(self, filepath, rib):
+        self.ribs[filepath] = rib
+
+    def get_stream_bgp(self, filepath):
+        if filepath not in self.ribs:
+            raise FileNotFoundError(filepath)
+        yield from self.ribs[filepath].iter_elements()
+
+    @contextlib.contextmanager
+    def patch(self):
+        """Replaces `get_stream_bgp` for the readers, so `reader='bgpstream'` needs no libbgpstream"""
+        from bgpip_tools import data
+
+        original = data.get_stream_bgp
+        data.get_stream_bgp = self.get_stream_bgp
+        try:
+            yield self
+        finally:
+            data.get_stream_bgp = original
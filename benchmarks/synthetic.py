@@ -0,0 +1,214 @@
+"""Deterministic synthetic RIB snapshots and asninfo data
+
+The same parameters and seed always give the same routes, ASNs and files,
+so benchmark runs on different machines or revisions are comparable.
+"""
+import bz2
+import gzip
+import json
+import random
+import struct
+import ipaddress
+
+from .aggregate import generate_prefixes
+
+ASN_COUNTRIES = ['US'] * 30 + ['CN'] * 10 + ['BR'] * 8 + ['RU'] * 6 + ['DE'] * 5 + ['GB'] * 4 + [
+    'IN', 'JP', 'HK', 'TW', 'KR', 'SG', 'AU', 'FR', 'NL', 'PL', 'UA', 'ID', 'CA', 'IT', None]
+# names matching the bundled configurations, the rest of the ASNs get generic names
+ASN_CN_NAMES = [
+    'CHINANET-BACKBONE No.31,Jin-rong Street',
+    'CHINANET-GD Guangdong Telecom',
+    'CHINA169-BACKBONE CHINA UNICOM China169 Backbone',
+    'UNICOM-SH China Unicom Shanghai network',
+    'CMNET-GD Guangdong Mobile Communication Co.Ltd.',
+    'TIETONG-BJ China Tietong Telecommunications',
+    'CERNET-AP China Education and Research Network',
+    'CNGI-CERNET2 China Next Generation Internet',
+    'CSTNET-AS-AP Computer Network Information Center',
+    'DXTNET Beijing Dian-Xin-Tong Network',
+    'DRPENG Dr.Peng Telecom & Media Group',
+    'GOOGLECN Google China',
+]
+
+# well known networks, some of them named by the bundled configurations
+ASN_FIXED = {
+    4134: ('CHINANET-BACKBONE No.31,Jin-rong Street', 'CN'),
+    4837: ('CHINA169-BACKBONE CHINA UNICOM China169 Backbone', 'CN'),
+    9808: ('CMNET-GD Guangdong Mobile Communication Co.Ltd.', 'CN'),
+    4538: ('ERX-CERNET-BKB China Education and Research Network Center', 'CN'),
+    4847: ('CNIX-AP China Networks Inter-Exchange', 'CN'),
+    15169: ('GOOGLE', 'US'),
+    13335: ('CLOUDFLARENET', 'US'),
+}
+
+MRT_HEADER = struct.Struct('>IHHI')
+MRT_TYPE_TABLE_DUMP_V2 = 13
+MRT_SUBTYPE_PEER_INDEX_TABLE = 1
+MRT_SUBTYPE_RIB_IPV4_UNICAST = 2
+MRT_SUBTYPE_RIB_IPV6_UNICAST = 4
+MRT_TIMESTAMP = 1_700_000_000
+
+
+def generate_asninfo(count, seed=0):
+    """Generates `count` asninfo records (`asn`, `name`, `country`, `as2org`) in ASN order"""
+    rnd = random.Random(f'{seed}:asninfo')
+    asns = set(list(ASN_FIXED)[:count])
+    while len(asns) < count:
+        # mostly 16-bit ASNs, like the registries
+        asns.add(rnd.randint(1, 65535) if rnd.random() < 0.6 else rnd.randint(131072, 400000))
+    records = []
+    for asn in sorted(asns):
+        country = rnd.choice(ASN_COUNTRIES)
+        if asn in ASN_FIXED:
+            name, country = ASN_FIXED[asn]
+        elif country == 'CN' and rnd.random() < 0.5:
+            name = rnd.choice(ASN_CN_NAMES)
+        else:
+            name = f'AS{asn}-NET Network {rnd.getrandbits(24):06x}'
+        records.append({'asn': asn, 'name': name, 'country': country, 'as2org': None})
+    return records
+
+
+def write_asninfo(filepath, records):
+    """Writes asninfo records as JSONL, like `download_asn_data`"""
+    with open(filepath, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+
+
+class SyntheticElem:
+    """Stand-in for `pybgpstream.BGPElem`, with the attributes the RIB readers use"""
+
+    __slots__ = ('record_type', 'type', 'time', 'project', 'collector', 'router', 'router_ip',
+                 'peer_asn', 'peer_address', 'fields')
+
+    def __init__(self, peer_asn, peer_address, fields):
+        self.record_type = 'rib'
+        self.type = 'R'
+        self.time = MRT_TIMESTAMP
+        self.project = 'synthetic'
+        self.collector = 'synthetic'
+        self.router = None
+        self.router_ip = None
+        self.peer_asn = peer_asn
+        self.peer_address = peer_address
+        self.fields = fields
+
+    def __repr__(self):
+        return f'<SyntheticElem {self.peer_asn} {self.fields}>'
+
+
+class SyntheticRIB:
+    """A RIB snapshot seen by `peers` peers, `prefixes` prefixes with `v6_ratio` of them IPv6
+
+    Routes are sorted by family then prefix like a TABLE_DUMP_V2 file. Each
+    prefix is announced by a skewed choice of the `asns`, a few of them by
+    several origins or through an AS_SET, and seen by most of the peers
+    through paths of 1 to 4 transit ASNs with occasional prepending.
+    """
+
+    def __init__(self, asns, prefixes=100_000, peers=8, v6_ratio=0.2, seed=0):
+        self.asns = list(asns)
+        self.prefix_count = prefixes
+        self.peers = [(64512 + i, f'192.0.2.{i + 1}') for i in range(peers)]
+        self.v6_ratio = v6_ratio
+        self.seed = seed
+        self._prefixes = None
+
+    @property
+    def prefixes(self):
+        """Sorted `(version, network, length)` prefixes"""
+        if self._prefixes is None:
+            v6_count = int(self.prefix_count * self.v6_ratio)
+            self._prefixes = sorted(
+                generate_prefixes(self.prefix_count - v6_count, 4, self.seed)
+                + generate_prefixes(v6_count, 6, self.seed))
+        return self._prefixes
+
+    def iter_routes(self):
+        """Yields `(version, network, length, [(peer index, [AS_SEQUENCE], [AS_SET]), ...])`"""
+        rnd = random.Random(f'{self.seed}:routes')
+        transits = self.asns[:max(1, len(self.asns) // 50)]
+        for version, network, length in self.prefixes:
+            # a few large networks originate most prefixes
+            origins = [self.asns[int(len(self.asns) * rnd.random() ** 3)]]
+            if rnd.random() < 0.01:
+                origins.append(rnd.choice(self.asns))
+            as_set = [origins[0], rnd.choice(self.asns)] if rnd.random() < 0.001 else []
+            entries = []
+            for i, (peer_asn, _) in enumerate(self.peers):
+                if rnd.random() < 0.1:
+                    continue
+                path = [peer_asn] + [rnd.choice(transits) for _ in range(rnd.randint(1, 4))]
+                origin = rnd.choice(origins)
+                path += [origin] * (3 if rnd.random() < 0.05 else 1)
+                if as_set:
+                    path.pop()
+                entries.append((i, path, as_set))
+            yield version, network, length, entries
+
+    def iter_elements(self):
+        """Yields `SyntheticElem` RIB elements, like `get_stream_bgp` over the snapshot"""
+        for version, network, length, entries in self.iter_routes():
+            address = ipaddress.IPv4Address(network) if version == 4 else ipaddress.IPv6Address(network)
+            prefix = f'{address}/{length}'
+            for i, path, as_set in entries:
+                as_path = ' '.join(map(str, path))
+                if as_set:
+                    as_path += ' {%s}' % ','.join(map(str, as_set))
+                peer_asn, peer_address = self.peers[i]
+                yield SyntheticElem(peer_asn, peer_address, {
+                    'prefix': prefix, 'as-path': as_path, 'next-hop': peer_address})
+
+    def write_mrt(self, filepath):
+        """Writes the snapshot as a TABLE_DUMP_V2 file, compressed by its `.gz` / `.bz2` extension"""
+        if filepath.endswith('.bz2'):
+            f = bz2.open(filepath, 'wb')
+        elif filepath.endswith('.gz'):
+            f = gzip.open(filepath, 'wb', compresslevel=6)
+        else:
+            f = open(filepath, 'wb')
+        with f:
+            f.write(_mrt_record(MRT_SUBTYPE_PEER_INDEX_TABLE, self._pack_peer_index()))
+            for sequence, (version, network, length, entries) in enumerate(self.iter_routes()):
+                body = bytearray(struct.pack('>IB', sequence, length))
+                body += network.to_bytes(4 if version == 4 else 16, 'big')[:(length + 7) // 8]
+                body += struct.pack('>H', len(entries))
+                for i, path, as_set in entries:
+                    attributes = _pack_attributes(version, self.peers[i][1], path, as_set)
+                    body += struct.pack('>HIH', i, MRT_TIMESTAMP, len(attributes)) + attributes
+                subtype = MRT_SUBTYPE_RIB_IPV4_UNICAST if version == 4 else MRT_SUBTYPE_RIB_IPV6_UNICAST
+                f.write(_mrt_record(subtype, body))
+
+    def _pack_peer_index(self):
+        view = b'synthetic'
+        body = bytearray(ipaddress.IPv4Address('192.0.2.254').packed)
+        body += struct.pack('>H', len(view)) + view + struct.pack('>H', len(self.peers))
+        for peer_asn, peer_address in self.peers:
+            # IPv4 peer address, 4-byte ASN
+            packed = ipaddress.IPv4Address(peer_address).packed
+            body += struct.pack('>B', 0x02) + packed + packed + struct.pack('>I', peer_asn)
+        return bytes(body)
+
+
+def _mrt_record(subtype, body):
+    return MRT_HEADER.pack(MRT_TIMESTAMP, MRT_TYPE_TABLE_DUMP_V2, subtype, len(body)) + body
+
+
+def _pack_attribute(flags, attr_type, value):
+    if len(value) > 255:
+        return struct.pack('>BBH', flags | 0x10, attr_type, len(value)) + value
+    return struct.pack('>BBB', flags, attr_type, len(value)) + value
+
+
+def _pack_attributes(version, next_hop, path, as_set):
+    segments = struct.pack(f'>BB{len(path)}I', 2, len(path), *path)
+    if as_set:
+        segments += struct.pack(f'>BB{len(as_set)}I', 1, len(as_set), *as_set)
+    # ORIGIN IGP, AS_PATH
+    attributes = _pack_attribute(0x40, 1, b'\x00') + _pack_attribute(0x40, 2, segments)
+    if version == 4:
+        return attributes + _pack_attribute(0x40, 3, ipaddress.IPv4Address(next_hop).packed)
+    # TABLE_DUMP_V2 keeps only the next hop of MP_REACH_NLRI
+    mapped = ipaddress.IPv6Address(f'::ffff:{next_hop}').packed
+    return attributes + _pack_attribute(0x80, 14, bytes([len(mapped)]) + mapped)
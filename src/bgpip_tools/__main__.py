@@ -2,27 +2,23 @@
 
 import os
 import json
+import collections
 
 import click
-import netaddr
 
-from .config import DATA_DIR, DIST_DIR, ROOT_LOGGER, load_config
+from .config import (
+    DATA_DIR, DIST_DIR, BGP_COLLECTORS, BGP_FULL_RELOAD_DAYS, BOGON_SOURCES, DEFAULT_BOGON_SOURCE,
+    DEFAULT_OUTPUT_FORMAT, DEFAULT_RIB_READER, OUTPUT_FORMATS, RIB_READER_NAMES, SERVE_POLL_INTERVAL, ROOT_LOGGER,
+    set_config_dir, setup_logging,
+)
 
 DEFAULT_ASNS_FILENAME = 'asns.json'
 DEFAULT_CIDRS_DIR = 'cidrs'
+FAMILY_VERSIONS = {'ipv4': 4, 'ipv6': 6}
 
 logger = ROOT_LOGGER.getChild('cli')
 
 
-def load_network(string):
-    try:
-        net = netaddr.IPNetwork(string)
-    except netaddr.AddrFormatError:
-        return
-    else:
-        return net
-
-
 @click.group()
 @click.option('-c', '--config-dir', type=str, default=None, help="configuration directory")
 @click.pass_context
@@ -30,7 +26,9 @@ def cli(ctx, config_dir):
     ctx.ensure_object(dict)
     if config_dir and os.path.isdir(config_dir) is False:
         raise click.ClickException(f'could not find configuration directory at {config_dir}')
-    load_config(config_dir)
+    setup_logging()
+    # configurations are only read by the commands using them
+    set_config_dir(config_dir)
 
 
 @cli.group('config')
@@ -62,11 +60,18 @@ def asn_prepare(ctx, **kwargs):
 
 @asn_group.command('stat')
 @click.pass_context
-def asn_stat(ctx):
-    from .data import stat_data_asn
-
-    ctx.forward(asn_prepare)
-    stat_data_asn()
+@click.argument('asns', type=int, nargs=-1)
+def asn_stat(ctx, asns):
+    """Show ASN data statistics, or the records of the given ASNs"""
+    from .data import stat_data_asn, load_asn_store
+
+    ctx.invoke(asn_prepare)
+    if not asns:
+        stat_data_asn()
+        return
+    store = load_asn_store()
+    for asn in asns:
+        click.echo(json.dumps(store.get(asn) or {'asn': asn}))
 
 
 @asn_group.command('generate')
@@ -109,15 +114,13 @@ def bogon_prepare(ctx, **kwargs):
 @click.pass_context
 def bogon_check(ctx, address):
     """Check a ip address/network is bogon or not"""
-    from .bogon import get_bogon_ipsets
+    from .bogon import is_bogon
 
     ctx.forward(bogon_prepare)
-    bogon_ipsets = get_bogon_ipsets()
-    net = load_network(address)
-    if net.version == 4:
-        print(net in bogon_ipsets['ipv4'])
-    else:
-        print(net in bogon_ipsets['ipv6'])
+    try:
+        print(is_bogon(address))
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='ADDRESS')
 
 
 @cli.group('bgp')
@@ -125,13 +128,21 @@ def bgp_group():
     """BGP related commands"""
 
 
+def _get_collectors(options):
+    """`{family: [collector]}` of repeated `--collector FAMILY COLLECTOR`, the configured ones for other families"""
+    collectors = {}
+    for family, collector in options or ():
+        collectors.setdefault(family, []).append(collector)
+    return {family: list(dict.fromkeys(collectors.get(family, v))) for family, v in BGP_COLLECTORS.items()}
+
+
 @bgp_group.command('prepare', hidden=True)
 @click.pass_context
 def bgp_prepare(ctx, **kwargs):
     from .data import prepare_data_bgp
 
     # load asns
-    if kwargs.get('use_dist'):
+    if 'asns' not in ctx.obj and kwargs.get('use_dist'):
         asns_fp = os.path.join(DIST_DIR, DEFAULT_ASNS_FILENAME)
         if os.path.isfile(asns_fp):
             with open(asns_fp) as f:
@@ -144,58 +155,476 @@ def bgp_prepare(ctx, **kwargs):
 
     # load bgp info
     if 'bgp' not in ctx.obj:
-        ctx.obj['bgp'] = prepare_data_bgp()
+        ctx.obj['bgp'] = prepare_data_bgp(_get_collectors(kwargs.get('collectors')))
 
 
 @bgp_group.command('info')
 @click.option('-i', '--indent', type=int, default=2, help="output strings/file indentations if available")
+@click.option('--collector', 'collectors', type=(click.Choice(list(FAMILY_VERSIONS)), str), multiple=True,
+              metavar='FAMILY COLLECTOR', help="RIB collector of a family, repeatable, replaces the configured ones")
 @click.pass_context
-def bgp_info(ctx, indent):
+def bgp_info(ctx, indent, collectors):
     """Query remote BGP information"""
     from .data import get_bgp_info
-    print(json.dumps(get_bgp_info(), indent=indent))
+    print(json.dumps(get_bgp_info(_get_collectors(collectors)), indent=indent))
+
+
+def _load_target_asns(ctx, config, output_dir, use_dist=False):
+    from .asn import load_asns_by_config
+
+    asns_fp = os.path.join(output_dir, DEFAULT_ASNS_FILENAME)
+    if use_dist and os.path.isfile(asns_fp):
+        with open(asns_fp) as f:
+            return json.load(f)
+
+    ctx.invoke(asn_prepare)
+    os.makedirs(output_dir, exist_ok=True)
+    asns = load_asns_by_config(config)
+    with open(asns_fp, 'w') as f:
+        logger.getChild('asn').info(f'{DEFAULT_ASNS_FILENAME} generated at {asns_fp}')
+        json.dump(asns, f, indent=2)
+    return asns
+
+
+def _get_tree_asns(asns, i, targets):
+    """The ASN mapping of the `i`th output tree, keyed by `(tree, name)` with `--target`"""
+    if targets:
+        return {k: v for (j, k), v in asns.items() if j == i}
+    return asns
+
+
+def _write_outputs(output_dir, family, range_map, output_formats, **options):
+    from .writers import write_output
+
+    version = FAMILY_VERSIONS[family]
+    range_map = {k: v.get(version, []) for k, v in range_map.items()}
+    for output_format in output_formats:
+        for k, fp, changed in write_output(output_dir, output_format, version, range_map, **options):
+            state = 'generated' if changed else 'unchanged'
+            logger.getChild('bgp').info(f'{output_format} v{version}/{k} {state} at {fp}')
+
+
+def _remove_outputs(output_dir, family, names, output_formats):
+    from .writers import remove_output
+
+    version = FAMILY_VERSIONS[family]
+    for output_format in output_formats:
+        for fp in remove_output(output_dir, output_format, version, names):
+            logger.getChild('bgp').info(f'{output_format} v{version} removed target at {fp}')
+
+
+def _write_range_table(output_dir, family, range_map):
+    from .rangetable import RANGE_TABLE_SUFFIX, write_range_table
+
+    family_dir = family.replace('ip', '')
+    fp = os.path.join(output_dir, DEFAULT_CIDRS_DIR, f'{family_dir}{RANGE_TABLE_SUFFIX}')
+    version = FAMILY_VERSIONS[family]
+    if write_range_table(fp, version, {k: v.get(version, []) for k, v in range_map.items()}):
+        logger.getChild('bgp').info(f'{family_dir} range table generated at {fp}')
+    else:
+        logger.getChild('bgp').info(f'{family_dir} range table unchanged at {fp}')
 
 
 @bgp_group.command('generate')
 @click.option('-u', '--use-dist', is_flag=True, default=False)
 @click.option('-o', '--output-dir', type=str, default=DIST_DIR, help="output directory")
-@click.option('-d', '--dry-run', is_flag=True, help="dry run")
+@click.option('-t', '--target', 'targets', type=(str, str), multiple=True, metavar='CONFIG_DIR OUTPUT_DIR',
+              help="generate several configuration directories from a single pass over BGP data, "
+                   "replaces -o and -c")
+@click.option('-d', '--dry-run', is_flag=True,
+              help="decode a sample of the BGP data and project the time and memory of a full run")
+@click.option('--sample-stride', type=click.IntRange(min=1), default=None, metavar='N',
+              help="decode every Nth RIB record in a dry run, chosen from the RIB size by default")
 @click.option('-n4', '--no-ipv4', is_flag=True, help="skip ipv4 cidrs generate")
 @click.option('-n6', '--no-ipv6', is_flag=True, help="skip ipv6 cidrs generate")
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=1, help="number of processes decoding BGP data")
+@click.option('-r', '--reader', type=click.Choice(RIB_READER_NAMES), default=DEFAULT_RIB_READER,
+              help="backend decoding BGP data")
+@click.option('-m', '--memory-limit', type=click.IntRange(min=1), default=None, metavar='MB',
+              help="spill decoded BGP data to sorted runs on disk past this many megabytes")
+@click.option('-P', '--pipeline', is_flag=True,
+              help="decode BGP data while it downloads with the builtin MRT decoder, fetching every collector "
+                   "concurrently, could not be used with -r or -j")
+@click.option('--collector', 'collectors', type=(click.Choice(list(FAMILY_VERSIONS)), str), multiple=True,
+              metavar='FAMILY COLLECTOR', help="RIB collector of a family, repeatable, replaces the configured ones")
+@click.option('-f', '--format', 'output_formats', type=click.Choice(OUTPUT_FORMATS), multiple=True,
+              default=[DEFAULT_OUTPUT_FORMAT], show_default=True, help="output formats, repeatable")
+@click.option('--route-via', type=str, default=None, metavar='GATEWAY|DEVICE',
+              help="next hop of the bird and iproute2 routes, blackhole routes by default")
+@click.option('-D', '--delta', is_flag=True,
+              help="write the CIDRs added and removed since the previous generation to delta/")
+@click.option('--previous', 'previous_dir', type=str, default=None,
+              help="directory of the previous generation for --delta, the output directory by default")
+@click.option('-b', '--bogons', type=click.Choice(BOGON_SOURCES), default=DEFAULT_BOGON_SOURCE, show_default=True,
+              help="bogon networks dropped from the lists: bundled, the online fullbogons lists, or both")
+@click.option('-C', '--changed-only', is_flag=True,
+              help="regenerate only the lists whose inputs changed since the last generation, and report them")
+@click.option('-I', '--incremental', is_flag=True, help="apply BGP update files to the persisted origin state")
+@click.option('--full-reload-days', type=click.IntRange(min=0), default=BGP_FULL_RELOAD_DAYS,
+              help="reload the full RIB in incremental mode once the state is that many days old")
+@click.option('--metrics-out', type=str, default=None, metavar='PATH',
+              help="write the wall time, CPU time, peak RSS and item counts of every stage as JSON")
+@click.option('--profile-dir', type=str, default=None, help="dump a cProfile profile of every stage to this directory")
 @click.pass_context
-def bgp_generate(ctx, use_dist, output_dir, dry_run, no_ipv4, no_ipv6):
-    """Generate CIDRs from ASN mapping and BGP data"""
-    from .bgp import load_cidr_by_asns
+def bgp_generate(ctx, use_dist, output_dir, targets, dry_run, sample_stride, no_ipv4, no_ipv6, jobs, reader,
+                 memory_limit, pipeline, collectors, output_formats, route_via, delta, previous_dir, bogons,
+                 changed_only, incremental, full_reload_days, metrics_out, profile_dir):
+    """Generate CIDRs from ASN mapping and BGP data
+
+    With `--target`, the ASN mappings of every configuration directory are
+    indexed together, so each RIB file is scanned exactly once and every
+    output tree is written from that scan.
+
+    Lists are written in every `--format`: `text` (cidrs/, one CIDR per line),
+    `nftables` interval sets, `ipset` restore batches, `bird` static routes or
+    `iproute2` batches, each under its own directory.
+
+    The RIB snapshots of the collectors of a family (`BGP_COLLECTORS`, or
+    `--collector`) are downloaded and decoded concurrently, one process per
+    collector, and merged; the prefixes seen by each one are logged.
+
+    With `--dry-run`, every `--sample-stride`th RIB record (spread over the
+    whole snapshot, about 100k pairs by default) is decoded instead of the
+    full snapshot, the lists are generated from the sample and the time of
+    every stage, the throughput, the total time and the peak memory of a full
+    run are projected from it, and saved under `projections` by
+    `--metrics-out`.
+
+    With `--delta`, the lists of the previous generation are read before
+    being overwritten and `delta/v4|v6/<target>.txt` files list the CIDRs
+    removed (`-cidr`) and added (`+cidr`) per target, `delta/summary.json`
+    counts them. Lists whose content did not change are never rewritten.
+
+    With `--bogons online` or `both`, the daily Team Cymru fullbogons lists
+    are downloaded and their ranges, cached per date in the data directory,
+    are dropped from the lists instead of or along the bundled ones.
+
+    Every output directory gets a `manifest.json` holding the fingerprints
+    of the inputs of each list (configuration, resolved ASNs, RIB snapshot,
+    bogons and output options). With `--changed-only`, only the lists whose
+    fingerprints changed are generated and written, the others keep their
+    ranges from the range tables, and a JSON report of the regenerated
+    lists and their changed inputs is printed.
+
+    With `--incremental`, the origin state of every collector is kept in the
+    data directory and only the BGP update files published since the last run
+    are downloaded and applied, the full RIB is reloaded on schedule.
+
+    With `--memory-limit`, decoded (prefix, origin) pairs past that many
+    megabytes are sorted and spilled next to the RIB file, then merged back.
+
+    With `--metrics-out`, the wall time, CPU time, process peak RSS and item
+    counts of every stage (config, asn_classification, download, sample,
+    decode, collector_merge, filter, bogon_subtraction, cidr_merge, write) are
+    saved as JSON.
+    """
+    from .bgp import load_ranges_by_asns, project_sampled_run
+    from .config import get_config_dict, read_config
+    from .derived import evaluate_derived_targets, load_derived_targets
+    from .metrics import get_metrics, reset_metrics, stage
+    from .ranges import ranges_to_prefixes
+
+    reset_metrics(profile_dir)
+    if memory_limit:
+        memory_limit <<= 20
+
+    if targets:
+        if ctx.get_parameter_source('output_dir') is not click.core.ParameterSource.DEFAULT:
+            raise click.UsageError('--output-dir could not be used with --target', ctx)
+        if ctx.find_root().params.get('config_dir'):
+            raise click.UsageError('--config-dir could not be used with --target', ctx)
+        for config_dir, _ in targets:
+            if os.path.isdir(config_dir) is False:
+                raise click.ClickException(f'could not find configuration directory at {config_dir}')
+        trees = []
+        ctx.obj['asns'] = {}
+        for i, (config_dir, target_output_dir) in enumerate(targets):
+            with stage('config', config_dir=config_dir) as counts:
+                config = read_config(config_dir)
+                counts['targets'] = len(config)
+            asns = _load_target_asns(ctx, config, target_output_dir, use_dist)
+            ctx.obj['asns'].update({(i, k): v for k, v in asns.items()})
+            trees.append((target_output_dir, config, load_derived_targets(config)))
+    else:
+        config = get_config_dict()
+        trees = [(output_dir, config, load_derived_targets(config))]
+
+    previous = {}
+    if previous_dir is not None:
+        delta = True
+        if len(trees) > 1:
+            raise click.ClickException('--previous could not be used with several --target')
+    if changed_only and dry_run:
+        raise click.ClickException('--changed-only could not be used with --dry-run')
+    if sample_stride and not dry_run:
+        raise click.ClickException('--sample-stride could only be used with --dry-run')
+    if pipeline:
+        for name in ('reader', 'jobs'):
+            if ctx.get_parameter_source(name) is not click.core.ParameterSource.DEFAULT:
+                raise click.UsageError(f'--{name} could not be used with --pipeline', ctx)
+    if delta:
+        from .delta import clear_deltas
+        from .rangetable import read_range_maps
+
+        for i, (tree_output_dir, _, _) in enumerate(trees):
+            previous[i] = read_range_maps(os.path.join(previous_dir or tree_output_dir, DEFAULT_CIDRS_DIR))
+            clear_deltas(tree_output_dir)
+
+    families = []
+    if not no_ipv4:
+        families.append('ipv4')
+    if not no_ipv6:
+        families.append('ipv6')
+
+    tables = {}
+    collectors = _get_collectors(collectors)
+    if incremental:
+        from .bgp import merge_collector_tables
+        from .download import map_downloads
+        from .incremental import get_origin_state_path, load_origin_state
+
+        os.makedirs(DATA_DIR, exist_ok=True)
+        ctx.obj['bgp'] = {}
+        names = list(dict.fromkeys(k for family in families for k in collectors[family]))
+        states = dict(zip(names, map_downloads(lambda k: load_origin_state(k, full_reload_days), names)))
+        for family in families:
+            ctx.obj['bgp'][family] = [{
+                'collector': k,
+                'data_dir': DATA_DIR,
+                'filename': os.path.basename(get_origin_state_path(k)),
+                'filepath': get_origin_state_path(k),
+            } for k in collectors[family]]
+            tables[family] = merge_collector_tables(
+                ctx.obj['bgp'][family], [states[k].to_origin_table() for k in collectors[family]])
+    elif pipeline and not dry_run:
+        from .bgp import stream_origin_tables
+        from .data import get_bgp_info, prepare_data_bgp_file
+
+        os.makedirs(DATA_DIR, exist_ok=True)
+        infos = get_bgp_info({family: collectors[family] for family in families})
+        stream_origin_tables(list({v['url']: v for family in families for v in infos[family]}.values()), memory_limit)
+        ctx.obj['bgp'] = {family: [prepare_data_bgp_file(v) for v in infos[family]] for family in families}
 
     ctx.forward(bgp_prepare)
+    if bogons != 'bundled':
+        ctx.invoke(bogon_prepare)
+
+    manifests = {}
+    fingerprints = {}
+    existing = {}
+    if not dry_run:
+        from .bogon import get_bogon_version
+        from .manifest import fingerprint, get_snapshot_identity, get_target_fingerprints, load_manifest
+        from .rangetable import read_range_maps
+
+        shared_inputs = {'bogons': get_bogon_version(bogons), 'outputs': fingerprint([sorted(output_formats), route_via])}
+        for i, (tree_output_dir, config, derived) in enumerate(trees):
+            manifests[i] = load_manifest(tree_output_dir)
+            tree_asns = _get_tree_asns(ctx.obj['asns'], i, targets)
+            for family in families:
+                inputs = dict(shared_inputs, snapshot=get_snapshot_identity(ctx.obj['bgp'][family]))
+                fingerprints[i, family] = get_target_fingerprints(config, tree_asns, derived, inputs)
+            if changed_only:
+                existing[i] = read_range_maps(os.path.join(tree_output_dir, DEFAULT_CIDRS_DIR))
+
+    range_maps = {}
+    delta_summaries = {}
+    report = {}
+    for family in families:
+        version = FAMILY_VERSIONS[family]
+        asns = ctx.obj['asns']
+        changes = {}
+        if changed_only:
+            from .manifest import get_changed_targets
+
+            for i, (tree_output_dir, _, _) in enumerate(trees):
+                changes[i] = get_changed_targets(manifests[i].get(family, {}), fingerprints[i, family])
+                for k in fingerprints[i, family]:
+                    if k not in changes[i] and version not in existing[i].get(k, {}):
+                        changes[i][k] = ['missing']
+                report.setdefault(tree_output_dir, {})[family] = {
+                    'regenerated': changes[i],
+                    'unchanged': sorted(k for k in fingerprints[i, family] if k not in changes[i]),
+                }
+                logger.getChild('bgp').info(
+                    f'{family} {tree_output_dir}: {len(changes[i])} of {len(fingerprints[i, family])} lists changed')
+            asns = {
+                key: v for key, v in asns.items()
+                if (key[1] in changes[key[0]] if targets else key in changes[0])
+            }
+        range_map = {}
+        counters = collections.Counter()
+        first_stage = len(get_metrics().stages)
+        if asns:
+            range_map = load_ranges_by_asns(
+                ctx.obj['bgp'][family], asns,
+                v4=family == 'ipv4', v6=family == 'ipv6', dry_run=dry_run, jobs=jobs, reader=reader,
+                counters=counters, table=tables.get(family), memory_limit=memory_limit, bogons=bogons,
+                sample_stride=sample_stride)
+        range_maps[family] = {}
+        for i, (tree_output_dir, _, derived) in enumerate(trees):
+            if targets:
+                tree_range_map = {k: v for (j, k), v in range_map.items() if j == i}
+            else:
+                tree_range_map = dict(range_map)
+            if changed_only:
+                # unchanged lists keep the ranges of the last generation
+                tree_range_map = {
+                    k: tree_range_map[k] if k in tree_range_map else existing[i][k]
+                    for k in _get_tree_asns(ctx.obj['asns'], i, targets)
+                }
+            tree_range_map.update(evaluate_derived_targets(tree_range_map, derived))
+            with stage('write', family=family, output_dir=tree_output_dir) as counts:
+                written_map = tree_range_map
+                if changed_only:
+                    written_map = {k: v for k, v in tree_range_map.items() if k in changes[i]}
+                _write_outputs(tree_output_dir, family, written_map, output_formats, route_via=route_via)
+                _write_range_table(tree_output_dir, family, tree_range_map)
+                if delta:
+                    from .delta import compute_deltas, write_deltas
+
+                    deltas = compute_deltas(
+                        {k: v[version] for k, v in previous[i].items() if version in v},
+                        {k: v.get(version, []) for k, v in tree_range_map.items()}, version)
+                    delta_summaries.setdefault(i, {})[family] = write_deltas(tree_output_dir, version, deltas)
+                counts['targets'] = len(tree_range_map)
+                # counted without formatting, the writers format the CIDRs
+                counts['cidrs'] = sum(
+                    sum(1 for _ in ranges_to_prefixes(v.get(version, []), version)) for v in tree_range_map.values())
+            if targets:
+                range_maps[family].update({(i, k): v for k, v in tree_range_map.items()})
+            else:
+                range_maps[family].update(tree_range_map)
+        if dry_run:
+            projection = project_sampled_run(
+                ctx.obj['bgp'][family], version, counters, get_metrics().stages[first_stage:], memory_limit)
+            if projection:
+                get_metrics().projections[family] = projection
+
+    if delta:
+        from .delta import write_delta_summary
+
+        for i, (tree_output_dir, _, _) in enumerate(trees):
+            write_delta_summary(tree_output_dir, previous_dir or tree_output_dir, delta_summaries.get(i, {}))
+
+    if not dry_run:
+        from .manifest import write_manifest
+
+        for i, (tree_output_dir, _, _) in enumerate(trees):
+            manifest = dict(manifests[i])
+            manifest.update({family: fingerprints[i, family] for family in families})
+            write_manifest(tree_output_dir, manifest)
+    if changed_only:
+        click.echo(json.dumps(report, indent=2))
+
+    if metrics_out:
+        get_metrics().save(metrics_out)
+        logger.getChild('bgp').info(f'metrics saved at {metrics_out}')
+    return range_maps
+
+
+@cli.command('serve')
+@click.option('-o', '--output-dir', type=str, default=DIST_DIR, help="output directory")
+@click.option('-w', '--watch', is_flag=True, help="keep running, regenerating the lists as their inputs change")
+@click.option('-i', '--interval', type=click.IntRange(min=1), default=SERVE_POLL_INTERVAL, show_default=True,
+              help="seconds between two checks for new RIB snapshots and configuration changes")
+@click.option('-n4', '--no-ipv4', is_flag=True, help="skip ipv4 cidrs generate")
+@click.option('-n6', '--no-ipv6', is_flag=True, help="skip ipv6 cidrs generate")
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=1, help="number of processes decoding BGP data")
+@click.option('-r', '--reader', type=click.Choice(RIB_READER_NAMES), default=DEFAULT_RIB_READER,
+              help="backend decoding BGP data")
+@click.option('-m', '--memory-limit', type=click.IntRange(min=1), default=None, metavar='MB',
+              help="spill decoded BGP data to sorted runs on disk past this many megabytes")
+@click.option('-f', '--format', 'output_formats', type=click.Choice(OUTPUT_FORMATS), multiple=True,
+              default=[DEFAULT_OUTPUT_FORMAT], show_default=True, help="output formats, repeatable")
+@click.option('--route-via', type=str, default=None, metavar='GATEWAY|DEVICE',
+              help="next hop of the bird and iproute2 routes, blackhole routes by default")
+@click.option('--collector', 'collectors', type=(click.Choice(list(FAMILY_VERSIONS)), str), multiple=True,
+              metavar='FAMILY COLLECTOR', help="RIB collector of a family, repeatable, replaces the configured ones")
+@click.option('-b', '--bogons', type=click.Choice(BOGON_SOURCES), default=DEFAULT_BOGON_SOURCE, show_default=True,
+              help="bogon networks dropped from the lists: bundled, the online fullbogons lists, or both")
+@click.pass_context
+def serve(ctx, output_dir, watch, interval, no_ipv4, no_ipv6, jobs, reader, memory_limit, output_formats,
+          route_via, collectors, bogons):
+    """Generate CIDRs, and with `--watch` keep them up to date
+
+    The ASN classification and the origin table of the latest RIB snapshots
+    stay in memory between checks. A new snapshot regenerates the lists of
+    its family, a configuration change only the lists whose `asn_filters`
+    changed; every file is replaced atomically and only when its content
+    changed, the files of removed targets are deleted. The ASN snapshot and
+    the online bogon lists follow the current day. Failed checks are logged
+    and retried at the next interval.
+    """
+    import time
+    from .config import get_config_dir
+    from .rangetable import read_range_maps
+    from .serve import GenerationService
+    from .utils import write_if_changed
+
+    families = [family for family, skip in (('ipv4', no_ipv4), ('ipv6', no_ipv6)) if not skip]
+    service = GenerationService(
+        get_config_dir(), families, jobs=jobs, reader=reader, memory_limit=memory_limit and memory_limit << 20,
+        collectors=_get_collectors(collectors), bogons=bogons)
+    ctx.invoke(asn_prepare)
+    if bogons != 'bundled':
+        ctx.invoke(bogon_prepare)
     os.makedirs(output_dir, exist_ok=True)
+    # family -> targets written in the output directory, from the previous generation at first
+    previous = read_range_maps(os.path.join(output_dir, DEFAULT_CIDRS_DIR))
+    written = {family: {k for k, v in previous.items() if FAMILY_VERSIONS[family] in v} for family in families}
+    while True:
+        try:
+            updates = service.poll()
+        except Exception:
+            if not watch or not service.bgp:
+                raise
+            logger.getChild('serve').exception('could not check for changes, retrying later')
+            updates = {}
+        if updates:
+            asns_fp = os.path.join(output_dir, DEFAULT_ASNS_FILENAME)
+            if write_if_changed(asns_fp, json.dumps(service.asns, indent=2)):
+                logger.getChild('asn').info(f'{DEFAULT_ASNS_FILENAME} generated at {asns_fp}')
+        for family, range_map in updates.items():
+            _write_outputs(output_dir, family, range_map, output_formats, route_via=route_via)
+            _write_range_table(output_dir, family, range_map)
+            _remove_outputs(output_dir, family, written[family] - set(range_map), output_formats)
+            written[family] = set(range_map)
+        if not watch:
+            return
+        time.sleep(interval)
+
+
+@cli.command('lookup')
+@click.argument('addresses', type=str, nargs=-1)
+@click.option('-o', '--output-dir', type=str, default=DIST_DIR, help="directory of the generated lists")
+@click.option('-i', '--input', 'input_file', type=click.File('r'), default=None,
+              help="file of addresses, one per line, - for stdin")
+@click.option('-s', '--socket', 'socket_path', type=str, default=None, help="serve lookups on a unix socket")
+@click.option('-l', '--listen', type=str, default=None, metavar='HOST:PORT', help="serve lookups on a TCP address")
+@click.option('--no-bogons', is_flag=True, help="skip the bogon networks")
+def lookup(addresses, output_dir, input_file, socket_path, listen, no_bogons):
+    """Find the generated lists containing addresses
+
+    Every `cidrs/v4` and `cidrs/v6` list of the output directory and the bogon
+    networks (as `bogon`) are loaded into one index. Addresses are read from
+    the arguments, `--input` or stdin and answered as `address<TAB>names`,
+    with `--socket` or `--listen` the same line protocol is served instead.
+    """
+    import sys
+    from .lookup import load_lookup_index, serve_lookup
+
+    index = load_lookup_index(os.path.join(output_dir, DEFAULT_CIDRS_DIR), bogons=not no_bogons)
+    if socket_path or listen:
+        address = None
+        if listen:
+            host, _, port = listen.rpartition(':')
+            address = (host or '127.0.0.1', int(port))
+        serve_lookup(index, socket_path=socket_path, address=address)
+        return
 
-    cidr_map = {}
-    if not no_ipv4:
-        v4_output_dir = os.path.join(output_dir, DEFAULT_CIDRS_DIR, 'v4')
-        os.makedirs(v4_output_dir, exist_ok=True)
-        cidr_map['ipv4'] = load_cidr_by_asns(
-            ctx.obj['bgp']['ipv4'], ctx.obj['asns'], v4=True, dry_run=dry_run)
-        for k, cidrs in cidr_map['ipv4'].items():
-            fp = os.path.join(v4_output_dir, f'{k}.txt')
-            with open(fp, 'w') as f:
-                for cidr in cidrs:
-                    f.write(f'{cidr}\n')
-                logger.getChild('bgp').info(f'v4/{k} generated at {fp}')
-
-    if not no_ipv6:
-        v6_output_dir = os.path.join(output_dir, DEFAULT_CIDRS_DIR, 'v6')
-        os.makedirs(v6_output_dir, exist_ok=True)
-        cidr_map['ipv6'] = load_cidr_by_asns(
-            ctx.obj['bgp']['ipv6'], ctx.obj['asns'], v6=True, dry_run=dry_run)
-        for k, cidrs in cidr_map['ipv6'].items():
-            fp = os.path.join(v6_output_dir, f'{k}.txt')
-            with open(fp, 'w') as f:
-                for cidr in cidrs:
-                    f.write(f'{cidr}\n')
-                logger.getChild('bgp').info(f'v6/{k} generated at {fp}')
-
-    return cidr_map
+    lines = addresses or input_file or sys.stdin
+    sys.stdout.writelines(index.lookup_lines(lines))
 
 
 if __name__ == "__main__":
@@ -1,7 +1,21 @@
+import os
 import re
+import glob
+import json
+import hashlib
+import itertools
 
-from .config import get_config_dict
-from .data import get_stream_asn
+from .config import DATA_DIR, ROOT_LOGGER, get_config_dict
+from .data import get_asn_data_path, load_asn_store
+from .metrics import stage
+
+# bumped whenever the classification of a snapshot may change for the same config
+ASNS_CACHE_VERSION = 1
+ASNS_CACHE_PREFIX = 'asns.'
+# numbered backreferences would point at the wrong group once patterns are fused
+_BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+logger = ROOT_LOGGER.getChild('asn')
 
 
 class ASNFilter:
@@ -52,6 +66,7 @@ class ASNFilterGroup:
     @classmethod
     def from_config(cls, config):
         filter_cls = cls.__filter_class__
+        config = dict(config)
         filters = []
         for cfg in config.pop('filters', []):
             filters.append(filter_cls(**cfg))
@@ -74,9 +89,11 @@ class ASNFilterGroup:
         return False
 
 
-def load_asn_filters():
+def load_asn_filters(config=None):
+    if config is None:
+        config = get_config_dict()
     asn_filter_dict = {}
-    for k, v in get_config_dict().items():
+    for k, v in config.items():
         asn_filters = v.get('asn_filters')
         if not asn_filters:
             continue
@@ -85,15 +102,140 @@ def load_asn_filters():
     return asn_filter_dict
 
 
-def load_asns_by_config():
-    asn_filter_dict = load_asn_filters()
-    asns_dict = {}
-    for name in asn_filter_dict:
-        asns_dict[name] = []
-
-    for asn_data in get_stream_asn():
-        for name, filter_group in asn_filter_dict.items():
-            if filter_group.match_dict(asn_data):
-                asns_dict[name].append(asn_data['asn'])
+def _fuse_patterns(patterns):
+    """Returns a search function matching any of the regexps, or None if one matches everything"""
+    if any(v is None for v in patterns):
+        return None
+    flags = re.IGNORECASE if ASNFilter.REGEX_IGNORECASE else 0
+    patterns = list(dict.fromkeys(patterns))
+    fusable = [v for v in patterns if not _BACKREFERENCE.search(v)]
+    searches = []
+    if fusable:
+        try:
+            searches.append(re.compile('|'.join(f'(?:{v})' for v in fusable), flags).search)
+        except re.error:
+            searches.extend(re.compile(v, flags).search for v in fusable)
+    searches.extend(re.compile(v, flags).search for v in patterns if v not in fusable)
+    if len(searches) == 1:
+        return searches[0]
+    return lambda name: any(search(name) for search in searches)
+
+
+class ASNClassifier:
+    """Matches ASN records against every filter group in a single pass
+
+    Filters are indexed by their country condition and the regexps of a group
+    sharing a condition are fused into one alternation, so a record only
+    visits the groups its country can match. Group includes and excludes are
+    resolved into a per ASN override table.
+    """
 
+    def __init__(self, filter_groups: dict):
+        self.names = list(filter_groups)
+        # [(name, search)] of the filters without country
+        self.unconditioned = []
+        # country -> [(name, search)]
+        self.by_country = {}
+        # [(excluded country, name, search)]
+        self.negated = []
+        self.overrides = {}
+
+        for name, group in filter_groups.items():
+            patterns = {}
+            for filter_ in group.filters:
+                patterns.setdefault(filter_.country or None, []).append(filter_.regexp or None)
+            for country, v in patterns.items():
+                search = _fuse_patterns(v)
+                if country is None:
+                    self.unconditioned.append((name, search))
+                elif country.startswith('!'):
+                    self.negated.append((country[1:], name, search))
+                else:
+                    self.by_country.setdefault(country, []).append((name, search))
+            for asn in group.includes:
+                self.overrides.setdefault(asn, {})[name] = True
+            for asn in group.excludes:
+                self.overrides.setdefault(asn, {})[name] = False
+
+    def classify(self, data: dict):
+        """Returns the names of the groups matching an ASN record"""
+        matched = set()
+        country = data['country']
+        for name, search in itertools.chain(self.unconditioned, self.by_country.get(country, ())):
+            if name not in matched and (search is None or search(data['name'])):
+                matched.add(name)
+        for excluded, name, search in self.negated:
+            if excluded != country and name not in matched and (search is None or search(data['name'])):
+                matched.add(name)
+
+        overrides = self.overrides.get(data['asn'])
+        if overrides:
+            for name, included in overrides.items():
+                if included:
+                    matched.add(name)
+                else:
+                    matched.discard(name)
+        return matched
+
+
+def get_asns_cache_key(config):
+    """Returns the `(snapshot, config)` digests keying a classification result"""
+    snapshot = hashlib.sha256()
+    with open(get_asn_data_path(), 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            snapshot.update(chunk)
+    filters = {k: v.get('asn_filters') for k, v in config.items() if v and v.get('asn_filters')}
+    config_digest = hashlib.sha256(
+        json.dumps([ASNS_CACHE_VERSION, filters], sort_keys=True, default=str).encode())
+    return snapshot.hexdigest()[:16], config_digest.hexdigest()[:16]
+
+
+def load_asns_by_config(config=None, use_cache=True):
+    """Classifying the ASN snapshot into `{name: [asn, ...]}` by the `asn_filters` of the configuration
+
+    Results are cached in the data directory keyed by the digests of the
+    snapshot and the filters, caches of other snapshots are removed.
+    """
+    if config is None:
+        config = get_config_dict()
+
+    with stage('asn_classification') as counts:
+        return _load_asns_by_config(config, use_cache, counts)
+
+
+def _load_asns_by_config(config, use_cache, counts):
+    cache_fp = None
+    if use_cache:
+        snapshot_key, config_key = get_asns_cache_key(config)
+        cache_fp = os.path.join(DATA_DIR, f'{ASNS_CACHE_PREFIX}{snapshot_key}.{config_key}.json')
+        if os.path.isfile(cache_fp):
+            logger.info(f"asns cache found at {cache_fp}")
+            counts['cache_hits'] = 1
+            with open(cache_fp) as f:
+                return json.load(f)
+
+    store = load_asn_store()
+    filter_groups = load_asn_filters(config)
+    for name, group in filter_groups.items():
+        missing = sorted(asn for asn in group.includes if asn not in store)
+        if missing:
+            logger.warning(f"{name}: included asns not found in asn data {missing}")
+
+    classifier = ASNClassifier(filter_groups)
+    asns_dict = {name: [] for name in classifier.names}
+    for asn_data in store.iter_records():
+        for name in classifier.classify(asn_data):
+            asns_dict[name].append(asn_data['asn'])
+    counts['records'] = len(store)
+    counts['groups'] = len(asns_dict)
+
+    if cache_fp:
+        for fp in glob.glob(os.path.join(DATA_DIR, f'{ASNS_CACHE_PREFIX}*.json')):
+            if not os.path.basename(fp).startswith(f'{ASNS_CACHE_PREFIX}{snapshot_key}.'):
+                os.remove(fp)
+        tmp_fp = f'{cache_fp}.tmp'
+        with open(tmp_fp, 'w') as f:
+            json.dump(asns_dict, f)
+        os.replace(tmp_fp, cache_fp)
+        logger.info(f"asns cache saved at {cache_fp}")
     return asns_dict
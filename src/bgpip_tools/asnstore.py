@@ -0,0 +1,175 @@
+import os
+import sys
+import mmap
+import json
+import array
+import struct
+
+ASN_STORE_SUFFIX = '.store'
+ASN_STORE_MAGIC = b'BGPA'
+ASN_STORE_VERSION = 1
+
+# magic, format version, padding, record count, hash slot count, names size, countries size
+_HEADER = struct.Struct('<4sB3xIIII')
+_HASH_MULTIPLIER = 2654435761
+_MASK_32 = (1 << 32) - 1
+
+
+def get_asn_store_path(asn_filepath):
+    return asn_filepath + ASN_STORE_SUFFIX
+
+
+def _hash_slot(asn, mask):
+    return (asn * _HASH_MULTIPLIER & _MASK_32) & mask
+
+
+def _padding(size):
+    return -size % 8
+
+
+class ASNStore:
+    """Compact ASN snapshot: ASNs, country codes and names in snapshot order, stored column-wise
+
+    Countries are indexes into a small code table (0 for unknown) and names
+    are slices of a single UTF-8 blob. An open addressing hash table of
+    record indexes gives O(1) lookups by ASN. Saved stores are read through
+    `mmap` without copying the columns.
+    """
+
+    def __init__(self, asns, countries, name_offsets, names, country_codes, slots):
+        self.asns = asns
+        self.countries = countries
+        self.name_offsets = name_offsets
+        self.names = names
+        self.country_codes = country_codes
+        self.slots = slots
+        self._mmap = None
+
+    def __len__(self):
+        return len(self.asns)
+
+    def __contains__(self, asn):
+        return self.find(asn) is not None
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a store from asninfo records (`asn`, `name` and `country` keys)"""
+        rows = ((v['asn'], v.get('name') or '', v.get('country')) for v in records)
+        country_codes = [None]
+        country_index = {None: 0}
+        asns = array.array('I')
+        countries = array.array('H')
+        name_offsets = array.array('I', [0])
+        names = bytearray()
+        for asn, name, country in rows:
+            if country not in country_index:
+                country_index[country] = len(country_codes)
+                country_codes.append(country)
+            asns.append(asn)
+            countries.append(country_index[country])
+            names += name.encode()
+            name_offsets.append(len(names))
+
+        slot_count = 1 << max(1, (2 * len(asns)).bit_length())
+        mask = slot_count - 1
+        # record index + 1 of every slot, 0 for empty slots
+        slots = array.array('I', bytes(4 * slot_count))
+        for i, asn in enumerate(asns):
+            slot = _hash_slot(asn, mask)
+            while slots[slot]:
+                slot = (slot + 1) & mask
+            slots[slot] = i + 1
+        return cls(asns, countries, name_offsets, bytes(names), country_codes, slots)
+
+    @classmethod
+    def from_jsonl(cls, filepath):
+        def _records():
+            with open(filepath) as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+        return cls.from_records(_records())
+
+    def find(self, asn):
+        """Returns the record index of an ASN, or None"""
+        mask = len(self.slots) - 1
+        slot = _hash_slot(asn, mask)
+        while True:
+            i = self.slots[slot]
+            if not i:
+                return None
+            if self.asns[i - 1] == asn:
+                return i - 1
+            slot = (slot + 1) & mask
+
+    def get_record(self, i):
+        return {
+            'asn': self.asns[i],
+            'name': bytes(self.names[self.name_offsets[i]:self.name_offsets[i + 1]]).decode(),
+            'country': self.country_codes[self.countries[i]],
+        }
+
+    def get(self, asn):
+        """Returns the record of an ASN, or None"""
+        i = self.find(asn)
+        if i is not None:
+            return self.get_record(i)
+
+    def iter_records(self):
+        """Yields `{asn, name, country}` records in snapshot order"""
+        names = self.names
+        country_codes = self.country_codes
+        offsets = self.name_offsets
+        for i, (asn, country) in enumerate(zip(self.asns, self.countries)):
+            yield {
+                'asn': asn,
+                'name': bytes(names[offsets[i]:offsets[i + 1]]).decode(),
+                'country': country_codes[country],
+            }
+
+    def save(self, filepath):
+        country_codes = json.dumps(self.country_codes).encode()
+        sections = [
+            self.asns, self.countries, self.name_offsets, self.slots,
+            self.names, country_codes,
+        ]
+        tmp_filepath = f'{filepath}.tmp'
+        with open(tmp_filepath, 'wb') as f:
+            f.write(_HEADER.pack(
+                ASN_STORE_MAGIC, ASN_STORE_VERSION,
+                len(self.asns), len(self.slots), len(self.names), len(country_codes)))
+            for section in sections:
+                if isinstance(section, array.array) and sys.byteorder != 'little':
+                    section = array.array(section.typecode, section)
+                    section.byteswap()
+                data = bytes(section)
+                f.write(data)
+                f.write(bytes(_padding(len(data))))
+        os.replace(tmp_filepath, filepath)
+
+    @classmethod
+    def load(cls, filepath):
+        with open(filepath, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(buffer)
+        magic, version, count, slot_count, names_size, codes_size = _HEADER.unpack_from(view)
+        if magic != ASN_STORE_MAGIC or version != ASN_STORE_VERSION:
+            raise ValueError(f'unsupported asn store at {filepath}')
+
+        offset = _HEADER.size
+        columns = []
+        for typecode, size in (('I', 4 * count), ('H', 2 * count), ('I', 4 * (count + 1)),
+                               ('I', 4 * slot_count), (None, names_size), (None, codes_size)):
+            section = view[offset:offset + size]
+            if typecode and sys.byteorder != 'little':
+                section = array.array(typecode, bytes(section))
+                section.byteswap()
+            elif typecode:
+                section = section.cast(typecode)
+            columns.append(section)
+            offset += size + _padding(size)
+        asns, countries, name_offsets, slots, names, codes = columns
+        store = cls(asns, countries, name_offsets, names, json.loads(bytes(codes)), slots)
+        store._mmap = buffer
+        return store
@@ -1,13 +1,32 @@
-import re
+import os
+import array
+import tempfile
+import functools
+import collections
+import multiprocessing
 
 import tqdm
-import netaddr
 
-from .data import get_stream_bgp
-from .bogon import get_bogon_ipset
-from .config import ROOT_LOGGER, get_config_dict
+from .mrt import open_mrt_file, read_rib_stream, sample_mrt_file, split_mrt_file
+from .utils import open_remote_data
+from .data import get_bgp_filename
+from .reader import DEFAULT_RIB_READER, get_rib_reader
+from .bogon import get_bogon_ranges
+from .ranges import RangeMerger, prefix_to_range, ranges_to_cidrs
+from .metrics import stage
+from .origin import (
+    OriginTable, OriginTableBuilder, estimate_builder_memory, get_origin_table_path, merge_origin_tables,
+)
+from .config import DATA_DIR, DEFAULT_BOGON_SOURCE, ROOT_LOGGER, get_config_dict
 
+# approximate number of pairs decoded by a dry run, sampled across the whole RIB
 DRY_RUN_COUNTER = 100_000
+# rough MRT bytes per (prefix, origin) pair, to estimate the progress total of a RIB
+ESTIMATED_BYTES_PER_PAIR = 300
+# stages of a sampled dry run growing with the RIB records, with the item counted by their throughput
+SAMPLED_STAGE_ITEMS = {
+    'decode': 'pairs', 'collector_merge': 'pairs', 'filter': 'pairs', 'bogon_subtraction': 'ranges', 'cidr_merge': 'ranges', 'write': 'cidrs',
+}
 
 logger = ROOT_LOGGER.getChild('bgp')
 
@@ -33,73 +52,481 @@ def load_bgp_filters():
     return bgp_filter_dict
 
 
-def load_cidr_by_asns(bgp_config, asns, v4=False, v6=False, dry_run=False):
-    """Loading CIDRs from BGP snapshots by asns_filters
+def build_origin_masks(names, asns):
+    """Inverts an ASN mapping into `origin ASN -> bitset of target names`, bit `i` being `names[i]`"""
+    origin_masks = {}
+    for bit, k in enumerate(names):
+        for asn in asns[k]:
+            origin_masks[asn] = origin_masks.get(asn, 0) | 1 << bit
+    return origin_masks
 
-    BGPElem
-    -------
-    record_type|type|time|project|collector|router|router_ip|peer_asn|peer_address
 
-    record_type: R RIB, U Update
-    type: R RIB, A announcement, W withdrawal, S state message
+def _get_table_prefix(table, version, i):
+    if version == 4:
+        return table.v4_nets[i], table.v4_lengths[i]
+    return table.v6_highs[i] << 64 | table.v6_lows[i], table.v6_lengths[i]
+
+
+def _log_decode_counters(counters, table):
+    elements = counters['elements']
+    counters['unique_pairs'] = len(table)
+    counters['unique_prefixes'] = table.count_prefixes()
+    message = (
+        f"decoded {elements} elements, {counters['unique_pairs']} unique pairs, "
+        f"{counters['unique_prefixes']} unique prefixes")
+    if 'path_cache_hits' in counters and elements:
+        message += f", as-path cache hit rate {counters['path_cache_hits'] / elements:.1%}"
+    logger.info(message)
+
+
+def _decode_origin_chunk(chunk_fp, reader=DEFAULT_RIB_READER):
+    counters = collections.Counter()
+    try:
+        pairs = set(get_rib_reader(reader)(chunk_fp, counters))
+    finally:
+        os.remove(chunk_fp)
+    return pairs, counters
+
+
+def decode_origin_table(filepath, jobs, reader=DEFAULT_RIB_READER, counters=None, memory_limit=None):
+    """Decoding the origin table of a RIB file with a pool of `jobs` processes
+
+    The decompressed file is split into record ranges which are decoded by the
+    workers while splitting goes on, at most `2 * jobs` chunks exist on disk.
+    Chunks are submitted from the calling thread, so a failing worker raises
+    here as soon as its result is collected.
     """
-    asns_sets = {k: set(v) for k, v in asns.items()}
-    result = {k: set() for k in asns}
-    as_path_splitter = re.compile('[ ,]+')
-    if not v4 and not v6:
-        raise ValueError('either v4 or v6 should be True')
+    if counters is None:
+        counters = collections.Counter()
+    builder = OriginTableBuilder(memory_limit, spill_dir=os.path.dirname(filepath))
+    decode = functools.partial(_decode_origin_chunk, reader=reader)
+    pending = collections.deque()
 
-    def _handle_elem(elem):
-        if elem.record_type != 'rib':
-            return
-        if elem.type != 'R':
-            return
-        if 'as-path' not in elem.fields or 'prefix' not in elem.fields:
-            return
-        prefix = elem.fields['prefix']
-        is_v6_prefix = ':' in prefix
-        if prefix == '0.0.0.0/0' or prefix == '::/0':
-            return
+    try:
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(filepath)) as chunk_dir:
+            with multiprocessing.Pool(jobs) as pool, tqdm.tqdm(
+                    ascii=True, desc='Decoding BGP Data', unit='chunk') as progress:
 
+                def _collect():
+                    chunk_pairs, chunk_counters = pending.popleft().get()
+                    builder.update(chunk_pairs)
+                    counters.update(chunk_counters)
+                    progress.update()
+
+                chunks = split_mrt_file(filepath, chunk_dir)
+                while True:
+                    if len(pending) >= jobs * 2:
+                        _collect()
+                    chunk_fp = next(chunks, None)
+                    if chunk_fp is None:
+                        break
+                    pending.append(pool.apply_async(decode, (chunk_fp,)))
+                while pending:
+                    _collect()
+    except BaseException:
+        builder.close()
+        raise
+    counters['spilled_runs'] += builder.spilled
+    return builder.build()
+
+
+def _stream_origin_table(info, memory_limit=None):
+    filename = get_bgp_filename(info)
+    filepath = os.path.abspath(os.path.join(DATA_DIR, filename))
+    table_fp = get_origin_table_path(filepath)
+    if os.path.isfile(table_fp) or os.path.isfile(filepath):
+        return
+
+    logger.info(f"streaming bgp data from {info['url']}")
+    counters = collections.Counter()
+    expected = {'size': info.get('exact_size') or None, 'rough_size': info.get('rough_size') or None}
+    with open_remote_data(info['url'], DATA_DIR, filename, **expected) as stream:
+        with open_mrt_file(filename, stream) as f:
+            table = OriginTable.from_pairs(read_rib_stream(f, counters), memory_limit, DATA_DIR)
+    _log_decode_counters(counters, table)
+    table.save(table_fp)
+    logger.info(f"origin table[{len(table)}] saved at {table_fp}")
+
+
+def stream_origin_tables(infos, memory_limit=None):
+    """Fetching and decoding RIB snapshots concurrently, one process per snapshot
+
+    Each snapshot is decoded by the builtin MRT decoder while it downloads,
+    the downloaded bytes are saved in the data directory along the way.
+    Snapshots already downloaded or decoded are skipped.
+    """
+    if not infos:
+        return
+    with multiprocessing.Pool(len(infos)) as pool:
+        pool.map(functools.partial(_stream_origin_table, memory_limit=memory_limit), infos)
+
+
+def load_origin_table(bgp_config, dry_run=False, jobs=1, reader=DEFAULT_RIB_READER, counters=None,
+                      memory_limit=None, sample_stride=None):
+    """Loading every (prefix, origin) pair of a BGP snapshot
+
+    The table is cached next to the RIB file, so later runs skip decoding.
+    Past `memory_limit` bytes, decoded pairs are spilled to sorted runs next to it.
+    A `dry_run` decodes every `sample_stride`th RIB record only, see `sample_origin_table`.
+    """
+    if counters is None:
+        counters = collections.Counter()
+    with stage('decode', file=os.path.basename(bgp_config['filepath'])) as stage_counts:
+        before = counters.copy()
+        if dry_run:
+            table = sample_origin_table(bgp_config, reader, counters, memory_limit, sample_stride)
+        else:
+            table = _load_origin_table(bgp_config, jobs, reader, counters, memory_limit)
+        stage_counts.update(counters - before)
+        stage_counts['pairs'] = len(table)
+    return table
+
+
+def sample_origin_table(bgp_config, reader=DEFAULT_RIB_READER, counters=None, memory_limit=None, stride=None):
+    """Loading the (prefix, origin) pairs of every `stride`th RIB record of a BGP snapshot
+
+    The sampled records, spread over the whole file, are written to a
+    temporary MRT file decoded by `reader`, so the table covers every part of
+    the address space and every target. By default, the stride is chosen
+    from the RIB size to decode about `DRY_RUN_COUNTER` pairs. `counters`
+    gets the `sample_records` and `sampled_records` of the file.
+    """
+    if counters is None:
+        counters = collections.Counter()
+    filepath = bgp_config['filepath']
+    if stride is None:
+        stride = max(1, (bgp_config.get('rough_size') or 0) // ESTIMATED_BYTES_PER_PAIR // DRY_RUN_COUNTER)
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(filepath)) as sample_dir:
+        sample_fp = os.path.join(sample_dir, f'{os.path.basename(filepath)}.sample')
+        with stage('sample', file=os.path.basename(filepath), stride=stride) as stage_counts:
+            records, sampled = sample_mrt_file(filepath, sample_fp, stride)
+            stage_counts.update(records=records, sampled=sampled)
+        counters['sample_records'] += records
+        counters['sampled_records'] += sampled
+        logger.info(f"sampling bgp data at {filepath}: {sampled} of {records} records, stride {stride}")
+        builder = OriginTableBuilder(memory_limit, spill_dir=sample_dir)
         try:
-            last_asn = int(re.split(as_path_splitter, elem.fields['as-path'])[-1].strip('{}'))
-        except KeyboardInterrupt:
+            builder.update(get_rib_reader(reader)(sample_fp, counters))
+        except BaseException:
+            builder.close()
             raise
-        except Exception as e:
-            logger.error(f'parse asn error {e}, element: {elem}')
+        counters['spilled_runs'] += builder.spilled
+        table = builder.build()
+    _log_decode_counters(counters, table)
+    return table
+
+
+def project_sampled_run(bgp_configs, version, counters, stages, memory_limit=None):
+    """Projecting the stages of a sampled dry run to the whole BGP snapshots of a family
+
+    `bgp_configs` are the snapshots of its collectors, `stages` the metrics
+    records of the run and `counters` its decoding counters. The time of the
+    stages in `SAMPLED_STAGE_ITEMS` is scaled by the inverse of the sampling
+    ratio, the pass reading the whole file while sampling is counted once in
+    `decode`, whose projection is the one of the slowest collector as they
+    are decoded concurrently. Merged ranges and CIDRs grow slower than the
+    records, so their projections are upper bounds. Returns None if nothing
+    was sampled.
+    """
+    if not counters['sampled_records']:
+        return None
+    scale = counters['sample_records'] / counters['sampled_records']
+    walls = collections.Counter()
+    items = collections.Counter()
+    # file -> (seconds reading the whole file, its sampling scale)
+    samples = {}
+    decodes = {}
+    peak_rss = None
+    stride = None
+    for record in stages:
+        name = record['name']
+        if name == 'sample':
+            stride = record['stride']
+            counts = record['counts']
+            samples[record['file']] = (record['wall_seconds'], counts['records'] / max(counts['sampled'], 1))
+        elif name == 'decode' and record.get('file') in samples:
+            read, file_scale = samples[record['file']]
+            decodes[record['file']] = read + (record['wall_seconds'] - read) * file_scale
+        walls[name] += record['wall_seconds']
+        items[name] += record['counts'].get(SAMPLED_STAGE_ITEMS.get(name), 0)
+        peak_rss = record['process_peak_rss_kb'] or peak_rss
+
+    projected_stages = {}
+    for name, item in SAMPLED_STAGE_ITEMS.items():
+        if name not in walls:
+            continue
+        if name == 'decode':
+            work = walls[name] - walls['sample']
+            projected = max(decodes.values(), default=0)
         else:
-            for k, v in asns_sets.items():
-                if last_asn not in v:
-                    continue
-                if v4 and not is_v6_prefix:
-                    result[k].add(prefix)
-                if v6 and is_v6_prefix:
-                    result[k].add(prefix)
-
-    # wrapper
-    # TODO: require an estimated total size
-    # total=estimated,
-    for i, elem in enumerate(tqdm.tqdm(
-            get_stream_bgp(bgp_config['filepath']),
-            ascii=True, desc='Filtering BGP Data',
-        )):
-        try:
-            _handle_elem(elem)
-            if dry_run and i > DRY_RUN_COUNTER:
+            work = walls[name]
+            projected = work * scale
+        projected_stages[name] = {
+            'sampled_seconds': round(walls[name], 6),
+            'projected_seconds': round(projected, 3),
+            item: items[name],
+            f'{item}_per_second': round(items[name] / work) if work > 0 else None,
+        }
+    projected_seconds = sum(v['projected_seconds'] for v in projected_stages.values())
+    decode_seconds = projected_stages.get('decode', {}).get('projected_seconds')
+    rough_size = sum(v.get('rough_size') or 0 for v in bgp_configs)
+    pairs = round(counters['unique_pairs'] * scale)
+    buffered = estimate_builder_memory(version, pairs - counters['unique_pairs'])
+    if memory_limit:
+        buffered = min(buffered, memory_limit)
+    projection = {
+        'stride': stride,
+        'records': counters['sample_records'],
+        'sampled_records': counters['sampled_records'],
+        'scale': round(scale, 3),
+        'rough_size': rough_size or None,
+        'bytes_per_second': round(rough_size / decode_seconds) if rough_size and decode_seconds else None,
+        'projected_pairs': pairs,
+        'projected_seconds': round(projected_seconds, 3),
+        'projected_peak_rss_kb': peak_rss + buffered // 1024 if peak_rss else None,
+        'stages': projected_stages,
+    }
+    files = ', '.join(os.path.basename(v['filepath']) for v in bgp_configs)
+    logger.info(
+        f"projected full run of {files} (x{scale:.1f}): "
+        f"{projection['projected_seconds']:.1f}s, {pairs} pairs, peak rss {projection['projected_peak_rss_kb']} KiB")
+    for name, v in projected_stages.items():
+        logger.info(f"  {name}: {v['projected_seconds']:.1f}s, {v[f'{SAMPLED_STAGE_ITEMS[name]}_per_second']} "
+                    f"{SAMPLED_STAGE_ITEMS[name]}/s")
+    return projection
+
+
+def _load_origin_table(bgp_config, jobs, reader, counters, memory_limit):
+    table_fp = get_origin_table_path(bgp_config['filepath'])
+    if os.path.isfile(table_fp):
+        logger.info(f"loading origin table at {table_fp}")
+        counters['origin_table_cache_hits'] += 1
+        return OriginTable.load(table_fp)
+
+    if jobs > 1:
+        logger.info(f"loading bgp data at {bgp_config['filepath']} with {jobs} jobs")
+        table = decode_origin_table(bgp_config['filepath'], jobs, reader, counters, memory_limit)
+        _log_decode_counters(counters, table)
+        table.save(table_fp)
+        logger.info(f"origin table[{len(table)}] saved at {table_fp}")
+        return table
+
+    builder = OriginTableBuilder(memory_limit, spill_dir=os.path.dirname(bgp_config['filepath']))
+    interrupted = False
+    total = (bgp_config.get('rough_size') or 0) // ESTIMATED_BYTES_PER_PAIR or None
+    try:
+        for pair in tqdm.tqdm(
+                get_rib_reader(reader)(bgp_config['filepath'], counters),
+                total=total, ascii=True, desc='Decoding BGP Data',
+            ):
+            try:
+                builder.add(*pair)
+            except KeyboardInterrupt:
+                interrupted = True
                 break
-        except KeyboardInterrupt:
-            break
+    except BaseException:
+        builder.close()
+        raise
+
+    counters['spilled_runs'] += builder.spilled
+    table = builder.build()
+    _log_decode_counters(counters, table)
+    if not interrupted:
+        table.save(table_fp)
+        logger.info(f"origin table[{len(table)}] saved at {table_fp}")
+    return table
+
+
+def _decode_collector_table(bgp_config, reader=DEFAULT_RIB_READER, memory_limit=None):
+    counters = collections.Counter()
+    _load_origin_table(bgp_config, 1, reader, counters, memory_limit)
+    return counters
+
+
+def load_collector_tables(bgp_configs, dry_run=False, jobs=1, reader=DEFAULT_RIB_READER, counters=None,
+                          memory_limit=None, sample_stride=None):
+    """Loading the merged origin table of the RIB snapshots of several collectors
+
+    Snapshots not decoded yet are decoded concurrently, one process per
+    collector (`jobs` only splits a single one), and cached like
+    `load_origin_table` does. Dry runs sample the collectors one after the
+    other. The tables are merged by `merge_collector_tables`.
+    """
+    if counters is None:
+        counters = collections.Counter()
+    pending = list({
+        v['filepath']: v for v in bgp_configs if not os.path.isfile(get_origin_table_path(v['filepath']))
+    }.values())
+    if not dry_run and len(pending) > 1:
+        logger.info(f"loading bgp data of {len(pending)} collectors concurrently")
+        with stage('decode', files=[os.path.basename(v['filepath']) for v in pending]) as stage_counts:
+            before = counters.copy()
+            with multiprocessing.Pool(len(pending)) as pool:
+                for collector_counters in pool.imap_unordered(
+                        functools.partial(_decode_collector_table, reader=reader, memory_limit=memory_limit),
+                        pending):
+                    counters.update(collector_counters)
+            stage_counts.update(counters - before)
+    tables = [
+        load_origin_table(
+            v, dry_run=dry_run, jobs=jobs, reader=reader, counters=counters, memory_limit=memory_limit,
+            sample_stride=sample_stride)
+        for v in bgp_configs
+    ]
+    return merge_collector_tables(bgp_configs, tables, counters)
+
+
+def merge_collector_tables(bgp_configs, tables, counters=None):
+    """Merging the origin tables of the collectors of a family in a single ordered pass
+
+    The prefixes seen by every collector, and by no other one, are logged
+    and recorded in the `collector_merge` stage.
+    """
+    if len(tables) == 1:
+        return tables[0]
+    if counters is None:
+        counters = collections.Counter()
+    names = [v['collector'] for v in bgp_configs]
+    with stage('collector_merge', collectors=names) as stage_counts:
+        table, visibility = merge_origin_tables(tables)
+        stage_counts['pairs'] = len(table)
+        stage_counts['visibility'] = dict(zip(names, visibility))
+    counters['unique_pairs'] = len(table)
+    for name, v in zip(names, visibility):
+        logger.info(
+            f"{name}: {v['pairs']} pairs, {v['prefixes']} prefixes, {v['exclusive_prefixes']} seen by no other collector")
+    logger.info(f"merged {len(tables)} collectors into {len(table)} pairs")
+    return table
+
+
+def load_ranges_by_asns(bgp_config, asns, v4=False, v6=False, dry_run=False, jobs=1,
+                        reader=DEFAULT_RIB_READER, counters=None, table=None, memory_limit=None,
+                        bogons=DEFAULT_BOGON_SOURCE, sample_stride=None):
+    """Loading merged ranges from BGP snapshots by asns_filters
+
+    `bgp_config` is a prepared RIB snapshot, or a list of them, one per
+    collector, merged by `load_collector_tables`.
+    Returns `{name: {version: sorted merged (start, end) ranges}}`.
+    `counters`, a `collections.Counter`, collects the decoding and filtering
+    statistics if given. A ready `table` (`OriginTable`) skips loading the
+    BGP snapshot.
+
+    Matched prefixes are kept once, as a row of the table with a bitset of
+    the targets they belong to, and merged per target in table order.
+    Prefixes lying entirely inside the bogon networks of the `bogons` source
+    are dropped by a linear sweep over both sorted lists.
+    """
+    if counters is None:
+        counters = collections.Counter()
+    if not v4 and not v6:
+        raise ValueError('either v4 or v6 should be True')
+    names = list(asns)
+    origin_masks = build_origin_masks(names, asns)
+
+    if table is None:
+        table = load_collector_tables(
+            bgp_config if isinstance(bgp_config, list) else [bgp_config], dry_run=dry_run, jobs=jobs,
+            reader=reader, counters=counters, memory_limit=memory_limit, sample_stride=sample_stride)
+    # version -> (first table row of every matched prefix, index of its targets in label_masks)
+    matched = {}
+    # version -> targets with at least one matched prefix
+    version_masks = {}
+    label_masks = [0]
+    label_ids = {0: 0}
+    with stage('filter') as stage_counts:
+        progress = tqdm.tqdm(
+            total=(len(table.v4_nets) if v4 else 0) + (len(table.v6_lows) if v6 else 0),
+            ascii=True, desc='Filtering BGP Data',
+        )
+        for version in [v for v, selected in ((4, v4), (6, v6)) if selected]:
+            rows = array.array('I')
+            labels = array.array('I')
+            seen = matched_pairs = 0
+
+            def _add_prefix(first, mask):
+                if mask not in label_ids:
+                    label_ids[mask] = len(label_masks)
+                    label_masks.append(mask)
+                rows.append(first)
+                labels.append(label_ids[mask])
+
+            previous = None
+            first = mask = 0
+            for i, (_, network, length, last_asn) in enumerate(table.iter_rows(v4=version == 4, v6=version == 6)):
+                if (network, length) != previous:
+                    if mask:
+                        _add_prefix(first, mask)
+                        seen |= mask
+                    previous = network, length
+                    first = i
+                    mask = 0
+                origin_mask = origin_masks.get(last_asn)
+                if origin_mask is not None:
+                    matched_pairs += 1
+                    mask |= origin_mask
+            if mask:
+                _add_prefix(first, mask)
+                seen |= mask
+            row_count = len(table.v4_nets if version == 4 else table.v6_lows)
+            counters['filtered_pairs'] += row_count
+            counters['matched_pairs'] += matched_pairs
+            progress.update(row_count)
+            matched[version] = rows, labels
+            version_masks[version] = seen
+        progress.close()
+        stage_counts['pairs'] = counters['filtered_pairs']
+        stage_counts['matched'] = counters['matched_pairs']
+    logger.info(f"matched {counters['matched_pairs']} of {counters['filtered_pairs']} pairs")
 
     # bogon filter
-    bogon_ipset = get_bogon_ipset(v4, v6)
-    def cidrs_filter(cidrs, ipset):
-        for cidr in cidrs:
-            if cidr not in ipset:
-                yield cidr
-
-    cidr_map = {}
-    for k, cidrs in result.items():
-        logger.info(f"merging {k}[{len(cidrs)}] cidrs ...")
-        merged = netaddr.cidr_merge(cidrs_filter(cidrs, bogon_ipset))
-        cidr_map[k] = [str(v.cidr) for v in merged]
-    return cidr_map
+    with stage('bogon_subtraction') as stage_counts:
+        bogon_ranges = get_bogon_ranges(v4, v6, bogons)
+        label_sizes = [bin(mask).count('1') for mask in label_masks]
+        total = kept = 0
+        for version, (rows, labels) in matched.items():
+            version_bogons = bogon_ranges.get(version) or []
+            # prefixes come in ascending start order
+            k = 0
+            for j, i in enumerate(rows):
+                size = label_sizes[labels[j]]
+                total += size
+                if version_bogons:
+                    start, end = prefix_to_range(version, *_get_table_prefix(table, version, i))
+                    while k < len(version_bogons) and version_bogons[k][1] < start:
+                        k += 1
+                    if k < len(version_bogons) and version_bogons[k][0] <= start and end <= version_bogons[k][1]:
+                        labels[j] = 0
+                        continue
+                kept += size
+        stage_counts['bogon_ranges'] = sum(len(v) for v in bogon_ranges.values())
+        stage_counts['ranges'] = total
+        stage_counts['kept'] = kept
+
+    with stage('cidr_merge') as stage_counts:
+        range_map = {k: {} for k in names}
+        label_bits = [[bit for bit in range(len(names)) if mask >> bit & 1] for mask in label_masks]
+        for version, (rows, labels) in matched.items():
+            mergers = [RangeMerger() for _ in names]
+            for j, i in enumerate(rows):
+                bits = label_bits[labels[j]]
+                if not bits:
+                    continue
+                start, end = prefix_to_range(version, *_get_table_prefix(table, version, i))
+                for bit in bits:
+                    mergers[bit].add(start, end)
+            for bit, k in enumerate(names):
+                if version_masks[version] >> bit & 1:
+                    range_map[k][version] = mergers[bit].get_ranges()
+        for k, ranges in range_map.items():
+            logger.info(f"merged {k} into {sum(len(v) for v in ranges.values())} ranges")
+            stage_counts['ranges'] = stage_counts.get('ranges', 0) + sum(len(v) for v in ranges.values())
+    return range_map
+
+
+def load_cidr_by_asns(bgp_config, asns, v4=False, v6=False, dry_run=False, jobs=1,
+                      reader=DEFAULT_RIB_READER, counters=None, memory_limit=None, bogons=DEFAULT_BOGON_SOURCE):
+    """Loading CIDRs from BGP snapshots by asns_filters"""
+    range_map = load_ranges_by_asns(
+        bgp_config, asns, v4=v4, v6=v6, dry_run=dry_run, jobs=jobs, reader=reader, counters=counters,
+        memory_limit=memory_limit, bogons=bogons)
+    return {k: ranges_to_cidrs(v) for k, v in range_map.items()}
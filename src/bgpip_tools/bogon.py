@@ -1,9 +1,18 @@
-import netaddr
+import os
+import bisect
 
+from .config import DATA_DIR, BOGONS_DATA, DEFAULT_BOGON_SOURCE, ROOT_LOGGER
 from .data import get_bogon_data
+from .ranges import IP_BITS, cidrs_to_ranges, parse_prefix, prefix_to_range, union_ranges
+
+ONLINE_BOGON_TARGET = 'fullbogons'
+
+logger = ROOT_LOGGER.getChild('bogon')
 
 
 def get_bogon_ipset(v4=True, v6=True):
+    import netaddr
+
     ipset = netaddr.IPSet()
     bogon_data = get_bogon_data()
     for k, bogons in bogon_data.items():
@@ -13,9 +22,83 @@ def get_bogon_ipset(v4=True, v6=True):
 
 
 def get_bogon_ipsets():
+    import netaddr
+
     ipsets = {}
     bogon_data = get_bogon_data()
     for k, bogons in bogon_data.items():
         ipset = netaddr.IPSet([netaddr.IPNetwork(cidr) for cidr in bogons])
         ipsets[k] = ipset
     return ipsets
+
+
+def get_bogon_ranges(v4=True, v6=True, source=DEFAULT_BOGON_SOURCE):
+    """Returns the bogon networks of a source in `BOGON_SOURCES` as `{version: sorted merged ranges}`"""
+    ranges = {}
+    if source in ('bundled', 'both'):
+        bogon_data = get_bogon_data()
+        cidrs = []
+        if v4:
+            cidrs.extend(bogon_data['ipv4'])
+        if v6:
+            cidrs.extend(bogon_data['ipv6'])
+        ranges = cidrs_to_ranges(cidrs)
+    if source in ('online', 'both'):
+        for version, online in get_online_bogon_ranges(v4, v6).items():
+            ranges[version] = union_ranges(ranges.get(version, []), online)
+    return ranges
+
+
+def get_online_bogon_ranges(v4=True, v6=True):
+    """Returns the downloaded fullbogons networks as `{version: sorted merged ranges}`
+
+    The ranges of every daily list are cached as a range table next to it
+    (`data/bogons_v4_<date>.ranges`), parsed again only if the list is newer.
+    """
+    from .rangetable import RANGE_TABLE_SUFFIX, RangeTable, write_range_table
+
+    ranges = {}
+    for family, version in (('ipv4', 4), ('ipv6', 6)):
+        if family == 'ipv4' and not v4 or family == 'ipv6' and not v6:
+            continue
+        filepath = os.path.abspath(os.path.join(DATA_DIR, BOGONS_DATA[family]['filename']))
+        if os.path.isfile(filepath) is False:
+            raise FileNotFoundError(filepath)
+        index_fp = os.path.splitext(filepath)[0] + RANGE_TABLE_SUFFIX
+        if os.path.isfile(index_fp) and os.path.getmtime(index_fp) >= os.path.getmtime(filepath):
+            table = RangeTable.load(index_fp)
+            ranges[version] = table.get_ranges(ONLINE_BOGON_TARGET)
+            table.close()
+            continue
+        with open(filepath) as f:
+            cidrs = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        ranges[version] = cidrs_to_ranges(cidrs)[version]
+        write_range_table(index_fp, version, {ONLINE_BOGON_TARGET: ranges[version]})
+        logger.info(f"bogon ranges[{len(ranges[version])}] saved at {index_fp}")
+    return ranges
+
+
+def get_bogon_version(source=DEFAULT_BOGON_SOURCE):
+    """Returns a digest of the bogon networks of a source subtracted from the generated lists"""
+    from .manifest import fingerprint
+
+    return fingerprint([source, get_bogon_ranges(source=source)])
+
+
+def is_bogon(network: str):
+    """Returns whether an address or a network lies entirely inside the bogon networks
+
+    Raises `ValueError` for malformed input.
+    """
+    if '/' not in network:
+        network += '/128' if ':' in network else '/32'
+    try:
+        version, address, length = parse_prefix(network)
+    except OSError as e:
+        raise ValueError(f'invalid network {network}') from e
+    if not 0 <= length <= IP_BITS[version]:
+        raise ValueError(f'invalid network {network}')
+    start, end = prefix_to_range(version, address, length)
+    ranges = get_bogon_ranges(v4=version == 4, v6=version == 6).get(version, [])
+    i = bisect.bisect_right([v[0] for v in ranges], start) - 1
+    return i >= 0 and ranges[i][1] >= end
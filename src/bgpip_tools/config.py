@@ -1,5 +1,5 @@
 import os
-import yaml
+import json
 import logging
 import datetime
 
@@ -10,10 +10,27 @@ DATA_DIR = os.path.join(WORK_DIR, 'data')
 CONFIG_DIR = os.path.join(WORK_DIR, 'config', 'stable')
 DIST_DIR = os.path.join(WORK_DIR, 'dist')
 
-BGP_V4_COLLECTOR = 'rrc00'
-BGP_V6_COLLECTOR = 'route-views6'
+# RIB collectors of every family, the prefixes seen by any of them are merged
+BGP_COLLECTORS = {
+    'ipv4': ['rrc00'],
+    'ipv6': ['route-views6'],
+}
+# backends decoding RIB snapshots, the keys of `reader.RIB_READERS`, listed here for a light CLI
+RIB_READER_NAMES = ('bgpstream', 'bgpkit', 'mrt')
+DEFAULT_RIB_READER = 'bgpstream'
+# list output formats, the keys of `writers.OUTPUT_WRITERS`
+OUTPUT_FORMATS = ('text', 'nftables', 'ipset', 'bird', 'iproute2')
+DEFAULT_OUTPUT_FORMAT = 'text'
+# days between full RIB reloads in incremental mode
+BGP_FULL_RELOAD_DAYS = 7
+# seconds between two checks for new RIB snapshots and configuration changes in watch mode
+SERVE_POLL_INTERVAL = 600
+
+# parsed configurations are cached in the configuration directory, keyed by the mtime and size of every file
+CONFIG_CACHE_FILENAME = '.config-cache.json'
 
 _CONFIG_DICT = {}
+_CONFIG_DIR = None
 
 DT_NOW = datetime.datetime.now(datetime.timezone.utc)
 
@@ -28,38 +45,128 @@ BOGONS_DATA = {
     },
 }
 
+
+
+def refresh_now():
+    """Moves `DT_NOW` and the dated filenames of `BOGONS_DATA` to the current time
+
+    Long-running commands call it to follow the daily data files; modules
+    importing `DT_NOW` by name keep the start time, the dated filenames
+    read `config.DT_NOW`.
+    """
+    global DT_NOW
+    DT_NOW = datetime.datetime.now(datetime.timezone.utc)
+    for family, item in BOGONS_DATA.items():
+        item['filename'] = f'bogons_{family.replace("ip", "")}_{DT_NOW.strftime("%Y%m%d")}.txt'
+    return DT_NOW
+
+
+# bundled: resources/bogon.json, online: the daily lists of BOGONS_DATA
+BOGON_SOURCES = ('bundled', 'online', 'both')
+DEFAULT_BOGON_SOURCE = 'bundled'
+
 # logger
 LOGGING_LEVEL = logging.INFO
 ROOT_LOGGER = logging.getLogger()
-ROOT_LOGGER.setLevel(LOGGING_LEVEL)
 
 _CONSOLE_HANDLER = logging.StreamHandler()
 _CONSOLE_HANDLER.setLevel(LOGGING_LEVEL)
 _CONSOLE_HANDLER.setFormatter(logging.Formatter(
     '%(asctime)s  %(levelname)s[%(name)s] %(message)s', datefmt='%Y-%m-%dT%H:%M:%S'))
 
-ROOT_LOGGER.addHandler(_CONSOLE_HANDLER)
-
 logger = ROOT_LOGGER.getChild('config')
 
 
-def load_config(config_dir=None):
-    if config_dir is None:
-        config_dir = CONFIG_DIR
-    _CONFIG_DICT.clear()
+def setup_logging(level=LOGGING_LEVEL):
+    """Logs to the console, called by the CLI rather than on import"""
+    ROOT_LOGGER.setLevel(level)
+    if _CONSOLE_HANDLER not in ROOT_LOGGER.handlers:
+        ROOT_LOGGER.addHandler(_CONSOLE_HANDLER)
+
+
+def get_config_key(config_dir):
+    """Returns `{filename: [mtime_ns, size]}` of the configuration files of a directory"""
+    key = {}
+    for entry in os.scandir(config_dir):
+        if entry.name.startswith(('.', '#')) or not entry.name.endswith(('.yml', '.yaml')):
+            continue
+        stat = entry.stat()
+        key[entry.name] = [stat.st_mtime_ns, stat.st_size]
+    return key
+
+
+def _read_config_cache(cache_fp, key):
+    try:
+        with open(cache_fp) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if isinstance(cache, dict) and cache.get('key') == key:
+        return cache.get('config')
+
+
+def _write_config_cache(cache_fp, key, config):
+    try:
+        content = json.dumps({'key': key, 'config': config})
+    except (TypeError, ValueError):
+        return
+    # YAML values JSON could not give back as they are, e.g. dates or integer keys
+    if json.loads(content)['config'] != config:
+        return
+    tmp_fp = f'{cache_fp}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_fp, 'w') as f:
+            f.write(content)
+        os.replace(tmp_fp, cache_fp)
+    except OSError:
+        # read-only configuration directory
+        if os.path.exists(tmp_fp):
+            os.remove(tmp_fp)
+
+
+def read_config(config_dir):
     if os.path.isdir(config_dir) is False:
         raise FileNotFoundError(config_dir)
-    
+
     logger.info(f'load configurations from {config_dir}')
-    # load
-    for filename in os.listdir(config_dir):
-        if filename.startswith(('.', '#')):
-            continue
-        if filename.endswith(('.yml', '.yaml')):
-            k = os.path.splitext(filename)[0]
-            with open(os.path.join(config_dir, filename)) as f:
-                v = yaml.safe_load(f)
-            _CONFIG_DICT[k] = v
+    key = get_config_key(config_dir)
+    cache_fp = os.path.join(config_dir, CONFIG_CACHE_FILENAME)
+    config = _read_config_cache(cache_fp, key)
+    if config is not None:
+        return config
+
+    import yaml
+
+    config = {}
+    for filename in key:
+        k = os.path.splitext(filename)[0]
+        with open(os.path.join(config_dir, filename)) as f:
+            v = yaml.safe_load(f)
+        config[k] = v
+    _write_config_cache(cache_fp, key, config)
+    return config
+
+
+def set_config_dir(config_dir=None):
+    """Sets the configuration directory `get_config_dict` loads on first use"""
+    global _CONFIG_DIR
+    _CONFIG_DIR = config_dir
+    _CONFIG_DICT.clear()
+
+
+def get_config_dir():
+    return _CONFIG_DIR or CONFIG_DIR
+
+
+def load_config(config_dir=None):
+    if config_dir is None:
+        config_dir = get_config_dir()
+    from .metrics import stage
+
+    with stage('config') as counts:
+        _CONFIG_DICT.clear()
+        _CONFIG_DICT.update(read_config(config_dir))
+        counts['targets'] = len(_CONFIG_DICT)
 
 
 def get_config_dict():
@@ -1,66 +1,95 @@
 import os
 import json
-import importlib.resources as pkg_resources
 
-import pybgpstream
-
-from . import resources
+from . import config, resources
+from .asnstore import ASNStore, get_asn_store_path
 from .config import (
-    DATA_DIR, BGP_V4_COLLECTOR, BGP_V6_COLLECTOR, BOGONS_DATA,
-    DT_NOW, ROOT_LOGGER,
+    DATA_DIR, BGP_COLLECTORS, BOGONS_DATA,
+    ROOT_LOGGER,
 )
-from .utils import download_asn_data, query_latest_bgp_data, download_remote_data
+from .metrics import stage
+from .utils import download_asn_data, query_latest_bgp_data
 
 logger = ROOT_LOGGER.getChild('data')
 
 
+def get_asn_filename():
+    """Name of the ASN snapshot of the day of `config.DT_NOW`"""
+    return f'asn_{config.DT_NOW.strftime("%Y%m%d")}.jsonl'
+
+
 def prepare_data_asn():
-    filename = f'asn_{DT_NOW.strftime("%Y%m%d")}.jsonl'
+    filename = get_asn_filename()
     filepath = os.path.abspath(os.path.join(DATA_DIR, filename))
-    if os.path.isfile(filepath) is False:
-        download_asn_data(DATA_DIR, filename)
+    with stage('download', file=filename) as counts:
+        counts['cached'] = os.path.isfile(filepath)
+        if os.path.isfile(filepath) is False:
+            download_asn_data(DATA_DIR, filename)
+        counts['bytes'] = os.path.getsize(filepath)
     logger.info(f"asn data found at {filepath}")
+    load_asn_store(filename)
 
 
-def stat_data_asn(filename=None):
+def get_asn_data_path(filename=None):
     if filename is None:
-        filename = f'asn_{DT_NOW.strftime("%Y%m%d")}.jsonl'
-    filepath = os.path.abspath(os.path.join(DATA_DIR, filename))
-    logger.info(f"loading asn data at {filepath}")
+        filename = get_asn_filename()
+    return os.path.abspath(os.path.join(DATA_DIR, filename))
+
+
+def load_asn_store(filename=None):
+    """Loading the binary store of an ASN snapshot, converting the asninfo output on first use"""
+    filepath = get_asn_data_path(filename)
+    store_fp = get_asn_store_path(filepath)
+    if os.path.isfile(store_fp) and os.path.getmtime(store_fp) >= os.path.getmtime(filepath):
+        return ASNStore.load(store_fp)
     if os.path.isfile(filepath) is False:
         raise FileNotFoundError(filepath)
 
-    with open(filepath) as f:
-        lines = sum(1 for _ in f)
-    logger.info(f"line counts: {lines}")
+    logger.info(f"converting asn data at {filepath}")
+    ASNStore.from_jsonl(filepath).save(store_fp)
+    logger.info(f"asn store saved at {store_fp}")
+    return ASNStore.load(store_fp)
 
 
-def get_stream_asn(filename=None):
-    if filename is None:
-        filename = f'asn_{DT_NOW.strftime("%Y%m%d")}.jsonl'
-    filepath = os.path.abspath(os.path.join(DATA_DIR, filename))
-    logger.info(f"loading asn data at {filepath}")
-    if os.path.isfile(filepath) is False:
-        raise FileNotFoundError(filepath)
+def stat_data_asn(filename=None):
+    store = load_asn_store(filename)
+    logger.info(f"line counts: {len(store)}")
+    logger.info(f"country counts: {len(store.country_codes) - 1}")
+
 
-    with open(filepath) as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                yield json.loads(line)
+def get_stream_asn(filename=None):
+    """Yields the `{asn, name, country}` records of an ASN snapshot"""
+    store = load_asn_store(filename)
+    logger.info(f"loading asn data at {get_asn_store_path(get_asn_data_path(filename))}")
+    yield from store.iter_records()
 
 
 def prepare_data_bogons():
-    for item in BOGONS_DATA.values():
+    def _prepare(item):
         filename = item['filename']
         filepath = os.path.abspath(os.path.join(DATA_DIR, filename))
-        if os.path.isfile(filepath) is False:
-            download_remote_data(item['url'], DATA_DIR, filename)
+        with stage('download', file=filename) as counts:
+            counts['cached'] = os.path.isfile(filepath)
+            if os.path.isfile(filepath) is False:
+                download_remote_data(item['url'], DATA_DIR, filename)
+            counts['bytes'] = os.path.getsize(filepath)
         logger.info(f"bogon data found at {filepath}")
 
+    missing = [v for v in BOGONS_DATA.values() if not os.path.isfile(os.path.join(DATA_DIR, v['filename']))]
+    if not missing:
+        # the common case, without loading the downloader
+        for item in BOGONS_DATA.values():
+            logger.info(f"bogon data found at {os.path.abspath(os.path.join(DATA_DIR, item['filename']))}")
+        return
+
+    from .download import download_remote_data, map_downloads
+
+    map_downloads(_prepare, BOGONS_DATA.values())
+
 
 def get_bogon_data(collections: set=None):
-    with pkg_resources.open_text(resources, 'bogon.json') as f:
+    # read directly rather than through importlib.resources, which is slow to import
+    with open(os.path.join(os.path.dirname(resources.__file__), 'bogon.json')) as f:
         bogons = json.load(f)
 
     data = {}
@@ -99,34 +128,64 @@ def get_online_bogon_data():
     return data
 
 
-def get_bgp_info():
-    info_mp = {
-        'ipv4': query_latest_bgp_data(BGP_V4_COLLECTOR),
-        'ipv6': query_latest_bgp_data(BGP_V6_COLLECTOR),
-    }
-    return info_mp
+def get_bgp_info(collectors=None):
+    """Returns `{family: [latest RIB info of every collector]}`, querying the broker concurrently"""
+    from .download import map_downloads
 
+    if collectors is None:
+        collectors = BGP_COLLECTORS
+    names = list(dict.fromkeys(k for v in collectors.values() for k in v))
+    infos = dict(zip(names, map_downloads(query_latest_bgp_data, names)))
+    return {family: [infos[k] for k in v] for family, v in collectors.items()}
 
-def prepare_data_bgp():
-    res = {}
-    for k, info in get_bgp_info().items():
-        url = info['url']
-        filename = os.path.basename(url)
-        filepath = os.path.abspath(os.path.join(DATA_DIR, filename))
+
+def get_bgp_filename(info):
+    # collectors of the same project publish files of the same names
+    return f"{info['collector']}.{os.path.basename(info['url'])}"
+
+
+def prepare_data_bgp_file(info, filename=None):
+    url = info['url']
+    if filename is None:
+        filename = get_bgp_filename(info)
+    filepath = os.path.abspath(os.path.join(DATA_DIR, filename))
+    from .download import download_remote_data, verify_download
+
+    expected = {'size': info.get('exact_size') or None, 'rough_size': info.get('rough_size') or None}
+    with stage('download', file=filename) as counts:
+        if os.path.isfile(filepath):
+            try:
+                verify_download(filepath, **expected)
+            except ValueError as e:
+                logger.warning(f"{e}, downloading again")
+                os.remove(filepath)
+        counts['cached'] = os.path.isfile(filepath)
         if os.path.isfile(filepath) is False:
-            download_remote_data(url, DATA_DIR, filename)
-        logger.info(f"bgp data found at {filepath}")
-        res[k] = {
-            'collector': info['collector'],
-            'data_dir': DATA_DIR,
-            'filename': filename,
-            'filepath': filepath,
-            'rough_size': info['rough_size'],
-        }
-    return res
-
-
-def get_stream_bgp(filepath):
+            download_remote_data(url, DATA_DIR, filename, **expected)
+        counts['bytes'] = os.path.getsize(filepath)
+    logger.info(f"bgp data found at {filepath}")
+    return {
+        'collector': info['collector'],
+        'data_dir': DATA_DIR,
+        'filename': filename,
+        'filepath': filepath,
+        'rough_size': info['rough_size'],
+        'url': url,
+    }
+
+
+def prepare_data_bgp(collectors=None):
+    """Downloads the latest RIB snapshots of the collectors concurrently, returns `{family: [bgp config]}`"""
+    from .download import map_downloads
+
+    infos = get_bgp_info(collectors)
+    # a collector may serve several families
+    unique = {info['url']: info for v in infos.values() for info in v}
+    bgp_configs = dict(zip(unique, map_downloads(prepare_data_bgp_file, unique.values())))
+    return {family: [bgp_configs[info['url']] for info in v] for family, v in infos.items()}
+
+
+def get_stream_bgp(filepath, updates=False):
     """Creates a generator that yields BGP elements from a given RIB (Routing Information Base) file.
 
     This function uses the pybgpstream library to read a BGP RIB file and iterate through its records.
@@ -134,8 +193,16 @@ def get_stream_bgp(filepath):
 
     likewise for `bgpreader -d singlefile -o rib-file=rib.gz -n 10`
     """
+    try:
+        import pybgpstream
+    except ImportError:
+        import click
+
+        raise click.ClickException(
+            'Could not import "pybgpstream", install the [bgpstream] extra or use another RIB reader (-r mrt)')
+
     stream = pybgpstream.BGPStream(data_interface='singlefile')
-    stream.set_data_interface_option("singlefile", "rib-file", filepath)
+    stream.set_data_interface_option("singlefile", "upd-file" if updates else "rib-file", filepath)
     logger.info(f"loading bgp data at {filepath}")
     for rec in stream.records():
         if rec.status != "valid":
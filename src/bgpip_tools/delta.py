@@ -0,0 +1,90 @@
+import os
+import json
+import shutil
+
+from .config import DT_NOW, ROOT_LOGGER
+from .ranges import format_prefix, ranges_to_prefixes, subtract_ranges
+
+DEFAULT_DELTA_DIR = 'delta'
+DELTA_SUMMARY_FILENAME = 'summary.json'
+
+logger = ROOT_LOGGER.getChild('delta')
+
+
+def compute_deltas(previous, current, version):
+    """Returns `{name: (added, removed, added addresses, removed addresses)}` of the changed targets
+
+    `previous` and `current` map target names to sorted merged ranges of a
+    single family, targets missing on one side count as empty. `added` and
+    `removed` are the sorted `(network, length)` prefixes only found in the
+    current and in the previous CIDR list of the target, the address counts
+    are those of the range differences.
+    """
+    deltas = {}
+    for name in sorted(set(previous) | set(current)):
+        old = previous.get(name, [])
+        new = current.get(name, [])
+        if old == new:
+            continue
+        old_prefixes = set(ranges_to_prefixes(old, version))
+        new_prefixes = set(ranges_to_prefixes(new, version))
+        deltas[name] = (
+            sorted(new_prefixes - old_prefixes),
+            sorted(old_prefixes - new_prefixes),
+            _count_addresses(subtract_ranges(new, old)),
+            _count_addresses(subtract_ranges(old, new)),
+        )
+    return deltas
+
+
+def _count_addresses(ranges):
+    return sum(end - start + 1 for start, end in ranges)
+
+
+def write_deltas(output_dir, version, deltas):
+    """Writes `delta/v4|v6/<name>.txt` files and returns the summary of the family
+
+    Each file lists the removed CIDRs as `-cidr` lines, then the added ones
+    as `+cidr` lines. Every removed CIDR is an entry of the previous list and
+    every added one of the current list, so deleting then adding them in
+    order (e.g. with `nft delete element` / `ipset del`) turns the previous
+    list into the current one.
+    """
+    family_dir = os.path.join(output_dir, DEFAULT_DELTA_DIR, f'v{version}')
+    os.makedirs(family_dir, exist_ok=True)
+    summary = {}
+    for name, (added, removed, added_addresses, removed_addresses) in deltas.items():
+        fp = os.path.join(family_dir, f'{name}.txt')
+        with open(fp, 'w') as f:
+            for network, length in removed:
+                f.write(f'-{format_prefix(version, network, length)}\n')
+            for network, length in added:
+                f.write(f'+{format_prefix(version, network, length)}\n')
+        summary[name] = {
+            'added': len(added),
+            'removed': len(removed),
+            'added_addresses': added_addresses,
+            'removed_addresses': removed_addresses,
+        }
+        logger.info(f"v{version}/{name} +{len(added)} -{len(removed)} cidrs")
+    return summary
+
+
+def clear_deltas(output_dir):
+    delta_dir = os.path.join(output_dir, DEFAULT_DELTA_DIR)
+    if os.path.isdir(delta_dir):
+        shutil.rmtree(delta_dir)
+
+
+def write_delta_summary(output_dir, previous_dir, summaries):
+    """Writes `delta/summary.json` with the per family summaries of `write_deltas`"""
+    delta_dir = os.path.join(output_dir, DEFAULT_DELTA_DIR)
+    os.makedirs(delta_dir, exist_ok=True)
+    fp = os.path.join(delta_dir, DELTA_SUMMARY_FILENAME)
+    with open(fp, 'w') as f:
+        json.dump({
+            'generated_at': DT_NOW.isoformat(),
+            'previous': previous_dir,
+            **summaries,
+        }, f, indent=2)
+    logger.info(f"delta summary generated at {fp}")
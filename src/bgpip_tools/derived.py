@@ -0,0 +1,117 @@
+import functools
+
+from .config import ROOT_LOGGER, get_config_dict
+from .ranges import union_ranges, intersect_ranges, subtract_ranges
+
+logger = ROOT_LOGGER.getChild('derived')
+
+
+def _union(*range_maps):
+    versions = set().union(*range_maps)
+    return {version: union_ranges(*(v.get(version, []) for v in range_maps)) for version in versions}
+
+
+def _intersection(*range_maps):
+    versions = set(range_maps[0]).intersection(*range_maps[1:])
+    return {
+        version: functools.reduce(intersect_ranges, (v[version] for v in range_maps))
+        for version in versions
+    }
+
+
+def _difference(*range_maps):
+    return {
+        version: functools.reduce(
+            subtract_ranges, (v.get(version, []) for v in range_maps[1:]), ranges)
+        for version, ranges in range_maps[0].items()
+    }
+
+
+DERIVED_OPERATIONS = {
+    'union': _union,
+    'intersection': _intersection,
+    'difference': _difference,
+}
+
+
+def load_derived_targets(config=None):
+    """Loading the `derived` expressions of the configuration
+
+    An expression is either a target name or a mapping with a single
+    operation (`union`, `intersection` or `difference`) to a list of
+    expressions, e.g.
+
+    derived:
+      difference:
+        - cn
+        - union: [cn.google, cn.cernet]
+    """
+    if config is None:
+        config = get_config_dict()
+    derived = {}
+    for k, v in config.items():
+        expression = v.get('derived') if v else None
+        if not expression:
+            continue
+        if v.get('asn_filters'):
+            raise ValueError(f'target {k} could not have both asn_filters and derived')
+        _validate_expression(k, expression)
+        derived[k] = expression
+    return derived
+
+
+def _validate_expression(name, expression):
+    if isinstance(expression, str):
+        return
+    if not isinstance(expression, dict) or len(expression) != 1:
+        raise ValueError(f'derived target {name}: expected a name or a single operation, got {expression}')
+    (operation, operands), = expression.items()
+    if operation not in DERIVED_OPERATIONS:
+        raise ValueError(f'derived target {name}: unknown operation {operation}')
+    if not isinstance(operands, list) or not operands:
+        raise ValueError(f'derived target {name}: {operation} requires a list of operands')
+    for operand in operands:
+        _validate_expression(name, operand)
+
+
+def evaluate_derived_targets(range_map, derived):
+    """Evaluating derived targets on merged ranges
+
+    `range_map` maps generated target names to `{version: merged ranges}`.
+    Every expression, named or nested, is evaluated once and its result is
+    reused by the other expressions referring to it.
+    """
+    cache = {}
+    evaluating = set()
+
+    def _key(expression):
+        if isinstance(expression, str):
+            return expression
+        (operation, operands), = expression.items()
+        return (operation, tuple(_key(v) for v in operands))
+
+    def _evaluate(expression):
+        key = _key(expression)
+        if key in cache:
+            return cache[key]
+        if isinstance(expression, str):
+            if expression in range_map:
+                return range_map[expression]
+            if expression not in derived:
+                raise KeyError(f'unknown target {expression} in derived expressions')
+            if expression in evaluating:
+                raise ValueError(f'circular derived target {expression}')
+            evaluating.add(expression)
+            result = _evaluate(derived[expression])
+            evaluating.discard(expression)
+        else:
+            (operation, operands), = expression.items()
+            result = DERIVED_OPERATIONS[operation](*(_evaluate(v) for v in operands))
+        cache[key] = result
+        return result
+
+    result = {}
+    for k in derived:
+        logger.info(f"deriving {k} ...")
+        result[k] = _evaluate(k)
+    return result
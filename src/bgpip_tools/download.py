@@ -0,0 +1,322 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+from .config import ROOT_LOGGER
+
+# the download cache lives in this directory of the data directory files are downloaded into
+DOWNLOAD_CACHE_DIRNAME = 'cache'
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_TIMEOUT = 60
+DOWNLOAD_BLOCK_SIZE = 1 << 20
+# cached files unused for this long, or past the total size (least recently used first), are evicted
+DOWNLOAD_CACHE_MAX_AGE_DAYS = 30
+DOWNLOAD_CACHE_MAX_SIZE = 16 << 30
+# allowed relative difference between a download and the rough size reported by the broker
+ROUGH_SIZE_TOLERANCE = 0.25
+
+logger = ROOT_LOGGER.getChild('download')
+
+# bounds the concurrent transfers of the process, whichever pool they come from
+_TRANSFERS = threading.BoundedSemaphore(DOWNLOAD_WORKERS)
+# guards the index against the threads of the process, `index.lock` against the other processes
+_INDEX_LOCK = threading.Lock()
+
+
+def _write_json(filepath, data):
+    tmp_filepath = f'{filepath}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_filepath, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_filepath, filepath)
+
+
+def _read_json(filepath):
+    try:
+        with open(filepath) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class DownloadCache:
+    """Content-addressed store of downloaded files
+
+    Every file is kept once at `objects/<sha256>`, `index.json` maps each URL
+    to its object along with the validators (ETag, Last-Modified) sent in
+    conditional requests. Interrupted transfers stay in `partial` until they
+    are resumed.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.index_filepath = os.path.join(cache_dir, 'index.json')
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.partial_dir = os.path.join(cache_dir, 'partial')
+
+    def get_object_path(self, digest):
+        return os.path.join(self.objects_dir, digest)
+
+    def get_partial_path(self, url):
+        return os.path.join(self.partial_dir, hashlib.sha1(url.encode()).hexdigest() + '.part')
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Holds the index lock of the process and, where `fcntl` is available, of the cache directory"""
+        with _INDEX_LOCK:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(os.path.join(self.cache_dir, 'index.lock'), 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                yield
+
+    def _update_index(self, func):
+        with self._locked():
+            index = _read_json(self.index_filepath) or {}
+            result = func(index)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            _write_json(self.index_filepath, index)
+        return result
+
+    def lookup(self, url):
+        with self._locked():
+            entry = (_read_json(self.index_filepath) or {}).get(url)
+        if entry and os.path.isfile(self.get_object_path(entry['sha256'])):
+            return entry
+
+    def touch(self, url):
+        def _touch(index):
+            index[url]['used_at'] = time.time()
+            return index[url]
+        return self._update_index(_touch)
+
+    def add(self, url, part_filepath, digest, etag=None, last_modified=None):
+        """Moves a complete download into the objects and indexes it, under the index lock"""
+        object_filepath = self.get_object_path(digest)
+
+        def _add(index):
+            os.makedirs(self.objects_dir, exist_ok=True)
+            os.replace(part_filepath, object_filepath)
+            index[url] = {
+                'sha256': digest,
+                'size': os.path.getsize(object_filepath),
+                'etag': etag,
+                'last_modified': last_modified,
+                'used_at': time.time(),
+            }
+            return index[url]
+        return self._update_index(_add)
+
+    def evict(self, max_age_days=DOWNLOAD_CACHE_MAX_AGE_DAYS, max_size=DOWNLOAD_CACHE_MAX_SIZE):
+        """Drops the entries unused for `max_age_days`, then the least recently used past `max_size`
+
+        The objects are swept under the index lock, so an object being added
+        is never taken for an unindexed one.
+        """
+        now = time.time()
+        max_age = max_age_days * 86400
+
+        def _evict(index):
+            total = 0
+            digests = set()
+            for url, entry in sorted(index.items(), key=lambda kv: kv[1]['used_at'], reverse=True):
+                if now - entry['used_at'] > max_age or (
+                        entry['sha256'] not in digests and total + entry['size'] > max_size):
+                    del index[url]
+                    continue
+                if entry['sha256'] not in digests:
+                    digests.add(entry['sha256'])
+                    total += entry['size']
+
+            for directory, is_stale in (
+                    (self.objects_dir, lambda name, fp: name not in digests),
+                    (self.partial_dir, lambda name, fp: now - os.path.getmtime(fp) > max_age)):
+                if not os.path.isdir(directory):
+                    continue
+                for name in os.listdir(directory):
+                    filepath = os.path.join(directory, name)
+                    if is_stale(name, filepath):
+                        logger.info(f"evicting {filepath} from download cache")
+                        os.remove(filepath)
+
+        self._update_index(_evict)
+
+
+def verify_download(filepath, size=None, rough_size=None, checksum=None):
+    """Checks a file against its expected exact size, rough size or `<algorithm>:<hex>` checksum
+
+    Raises `ValueError` on mismatch.
+    """
+    actual_size = os.path.getsize(filepath)
+    if size and actual_size != size:
+        raise ValueError(f'size mismatch of {filepath}: expected {size}, got {actual_size}')
+    if rough_size and abs(actual_size - rough_size) > rough_size * ROUGH_SIZE_TOLERANCE:
+        raise ValueError(f'size mismatch of {filepath}: expected about {rough_size}, got {actual_size}')
+    if checksum:
+        algorithm, _, expected = checksum.partition(':')
+        digest = hashlib.new(algorithm)
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(DOWNLOAD_BLOCK_SIZE), b''):
+                digest.update(chunk)
+        if digest.hexdigest() != expected.lower():
+            raise ValueError(f'checksum mismatch of {filepath}: expected {checksum}, got {digest.hexdigest()}')
+
+
+def _get_total_size(response, offset):
+    content_range = response.headers.get('Content-Range')
+    if content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        if total != '*':
+            return int(total)
+    length = response.headers.get('Content-Length')
+    if length is not None:
+        return offset + int(length)
+
+
+def _fetch(cache, url, desc, quiet, **expected):
+    import urllib.error
+    import urllib.request
+
+    import tqdm
+
+    entry = cache.lookup(url)
+    part_filepath = cache.get_partial_path(url)
+    meta_filepath = f'{part_filepath}.json'
+    part_meta = _read_json(meta_filepath) if os.path.isfile(part_filepath) else None
+
+    headers = {}
+    offset = 0
+    validator = part_meta and (part_meta.get('etag') or part_meta.get('last_modified'))
+    if validator:
+        offset = os.path.getsize(part_filepath)
+        headers['Range'] = f'bytes={offset}-'
+        headers['If-Range'] = validator
+    elif entry:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    try:
+        response = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=DOWNLOAD_TIMEOUT)
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and entry:
+            logger.info(f"{url} not modified, using cached {entry['sha256']}")
+            return cache.touch(url)
+        if e.code == 416 and offset:
+            logger.warning(f"could not resume {url}, restarting")
+            os.remove(part_filepath)
+            return _fetch(cache, url, desc, quiet, **expected)
+        raise
+
+    with response:
+        digest = hashlib.sha256()
+        if response.status == 206:
+            logger.info(f"resuming {url} from {offset} bytes")
+            with open(part_filepath, 'rb') as f:
+                for chunk in iter(lambda: f.read(DOWNLOAD_BLOCK_SIZE), b''):
+                    digest.update(chunk)
+            mode = 'ab'
+        else:
+            offset = 0
+            mode = 'wb'
+        total = _get_total_size(response, offset)
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+
+        os.makedirs(cache.partial_dir, exist_ok=True)
+        _write_json(meta_filepath, {'url': url, 'etag': etag, 'last_modified': last_modified})
+        with open(part_filepath, mode) as f, tqdm.tqdm(
+                total=total, initial=offset, unit='B', unit_scale=True, ascii=True, desc=desc,
+                disable=quiet or os.environ.get("DISABLE_DOWNLOAD_PROGRESS") == '1',
+            ) as progress:
+            for chunk in iter(lambda: response.read(DOWNLOAD_BLOCK_SIZE), b''):
+                f.write(chunk)
+                digest.update(chunk)
+                progress.update(len(chunk))
+
+    size = os.path.getsize(part_filepath)
+    if total is not None and size != total:
+        # the partial file is kept to be resumed
+        raise ValueError(f'incomplete download of {url}: {size} of {total} bytes')
+    os.remove(meta_filepath)
+    try:
+        verify_download(part_filepath, **expected)
+    except ValueError:
+        os.remove(part_filepath)
+        raise
+    return cache.add(url, part_filepath, digest.hexdigest(), etag, last_modified)
+
+
+def _link_file(src, dst):
+    tmp_filepath = f'{dst}.tmp'
+    if os.path.exists(tmp_filepath):
+        os.remove(tmp_filepath)
+    try:
+        os.link(src, tmp_filepath)
+    except OSError:
+        shutil.copyfile(src, tmp_filepath)
+    os.replace(tmp_filepath, dst)
+
+
+def download_remote_data(url, data_dir, filename, quiet=False, size=None, rough_size=None, checksum=None,
+                         cache=None):
+    """Downloading `url` into `data_dir` through the download cache
+
+    Interrupted transfers are resumed with HTTP range requests, cached files
+    are revalidated with their ETag / Last-Modified. The file only appears
+    at its destination once complete and verified against the expected
+    `size`, `rough_size` and `checksum` (`<algorithm>:<hex>`). The cache is
+    `data_dir/cache` unless given.
+    """
+    if cache is None:
+        cache = DownloadCache(os.path.join(data_dir, DOWNLOAD_CACHE_DIRNAME))
+    filepath = os.path.join(data_dir, filename)
+    with _TRANSFERS:
+        entry = _fetch(cache, url, filename, quiet, size=size, rough_size=rough_size, checksum=checksum)
+    object_filepath = cache.get_object_path(entry['sha256'])
+    # a revalidated cache entry has not been checked against the expectations of this call yet
+    verify_download(object_filepath, size=size, rough_size=rough_size, checksum=checksum)
+    _link_file(object_filepath, filepath)
+    cache.evict()
+    return filepath
+
+
+def add_downloaded_file(url, part_filepath, data_dir, filename, digest, etag=None, last_modified=None, **expected):
+    """Adds a file fetched outside `download_remote_data` to the cache of `data_dir`, linked at `filename`
+
+    `part_filepath` is verified against the `expected` size, rough size or
+    checksum first and removed if it does not match.
+    """
+    try:
+        verify_download(part_filepath, **expected)
+    except ValueError:
+        os.remove(part_filepath)
+        raise
+    cache = DownloadCache(os.path.join(data_dir, DOWNLOAD_CACHE_DIRNAME))
+    entry = cache.add(url, part_filepath, digest, etag, last_modified)
+    _link_file(cache.get_object_path(entry['sha256']), os.path.join(data_dir, filename))
+    cache.evict()
+    return entry
+
+
+def map_downloads(func, items, workers=DOWNLOAD_WORKERS):
+    """Runs `func` over `items` in a bounded thread pool, results in order"""
+    items = list(items)
+    if len(items) <= 1:
+        return [func(v) for v in items]
+
+    import concurrent.futures
+
+    with concurrent.futures.ThreadPoolExecutor(min(workers, len(items))) as pool:
+        return list(pool.map(func, items))
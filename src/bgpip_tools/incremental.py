@@ -0,0 +1,206 @@
+import os
+import json
+import struct
+import datetime
+
+import tqdm
+
+from .config import DATA_DIR, DT_NOW, BGP_FULL_RELOAD_DAYS, ROOT_LOGGER
+from .data import get_stream_bgp, prepare_data_bgp_file
+from .download import map_downloads
+from .origin import OriginTable
+from .ranges import parse_prefix
+from .reader import get_path_origin
+from .utils import query_latest_bgp_data, query_bgp_updates
+
+ORIGIN_STATE_SUFFIX = '.state'
+ORIGIN_STATE_MAGIC = b'BGPS'
+ORIGIN_STATE_VERSION = 1
+
+# magic, format version, padding, metadata length
+_HEADER = struct.Struct('<4sB3xI')
+
+logger = ROOT_LOGGER.getChild('incremental')
+
+
+def parse_broker_time(value: str):
+    dt = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt
+
+
+def get_origin_state_path(collector):
+    return os.path.join(DATA_DIR, f'{collector}{ORIGIN_STATE_SUFFIX}')
+
+
+class OriginState:
+    """Prefix -> origin set table of a collector, maintained from BGP updates
+
+    Every origin of a prefix carries a bitmask of the peers announcing it,
+    so a withdrawal only drops the origin once no peer announces it anymore.
+    Prefixes are keyed by `(version, network, length)` integers.
+    """
+
+    def __init__(self, collector, rib_timestamp, updated_until=None, peers=None):
+        self.collector = collector
+        self.rib_timestamp = rib_timestamp
+        self.updated_until = updated_until or rib_timestamp
+        self.peers = [tuple(v) for v in peers] if peers else []
+        self.peer_bits = {peer: 1 << i for i, peer in enumerate(self.peers)}
+        self.routes = {}
+
+    def get_peer_bit(self, peer_asn, peer_address):
+        peer = (peer_asn, peer_address)
+        if peer not in self.peer_bits:
+            self.peer_bits[peer] = 1 << len(self.peers)
+            self.peers.append(peer)
+        return self.peer_bits[peer]
+
+    def announce(self, peer_bit, prefix, origin):
+        origins = self.routes.setdefault(prefix, {})
+        for k, mask in list(origins.items()):
+            if k != origin and mask & peer_bit:
+                mask &= ~peer_bit
+                if mask:
+                    origins[k] = mask
+                else:
+                    del origins[k]
+        origins[origin] = origins.get(origin, 0) | peer_bit
+
+    def withdraw(self, peer_bit, prefix):
+        origins = self.routes.get(prefix)
+        if not origins:
+            return
+        for k, mask in list(origins.items()):
+            mask &= ~peer_bit
+            if mask:
+                origins[k] = mask
+            else:
+                del origins[k]
+        if not origins:
+            del self.routes[prefix]
+
+    def drop_peer(self, peer_bit):
+        for prefix in list(self.routes):
+            self.withdraw(peer_bit, prefix)
+
+    def apply_elem(self, elem):
+        """Applies a RIB entry, announcement, withdrawal or peer state change"""
+        peer_bit = self.get_peer_bit(elem.peer_asn, elem.peer_address)
+        if elem.type == 'S':
+            if elem.fields.get('new-state', 'established') != 'established':
+                self.drop_peer(peer_bit)
+            return
+        if elem.type not in ('R', 'A', 'W') or 'prefix' not in elem.fields:
+            return
+        prefix = elem.fields['prefix']
+        if prefix == '0.0.0.0/0' or prefix == '::/0':
+            return
+        prefix = parse_prefix(prefix)
+        if elem.type == 'W':
+            self.withdraw(peer_bit, prefix)
+            return
+        if 'as-path' not in elem.fields:
+            return
+        try:
+            origin = get_path_origin(elem.fields['as-path'])
+        except ValueError as e:
+            logger.error(f'parse asn error {e}, element: {elem}')
+            return
+        self.announce(peer_bit, prefix, origin)
+
+    def apply_file(self, filepath, updates=True):
+        for elem in tqdm.tqdm(
+                get_stream_bgp(filepath, updates=updates),
+                ascii=True, desc=f'Applying {os.path.basename(filepath)}',
+            ):
+            self.apply_elem(elem)
+
+    def to_origin_table(self):
+        v4_rows, v6_rows = [], []
+        for (version, network, length), origins in self.routes.items():
+            rows = v4_rows if version == 4 else v6_rows
+            rows.extend((network, length, origin) for origin in origins)
+        return OriginTable.from_rows(v4_rows, v6_rows)
+
+    def save(self, filepath):
+        """Saves the state as a header, JSON metadata, an origin table and peer masks"""
+        table = self.to_origin_table()
+        mask_size = max(1, (len(self.peers) + 7) // 8)
+        meta = json.dumps({
+            'collector': self.collector,
+            'rib_timestamp': self.rib_timestamp,
+            'updated_until': self.updated_until,
+            'peers': self.peers,
+            'mask_size': mask_size,
+        }).encode()
+        tmp_filepath = f'{filepath}.tmp'
+        with open(tmp_filepath, 'wb') as f:
+            f.write(_HEADER.pack(ORIGIN_STATE_MAGIC, ORIGIN_STATE_VERSION, len(meta)))
+            f.write(meta)
+            table.dump(f)
+            for version, network, length, origin in table.iter_rows():
+                mask = self.routes[(version, network, length)][origin]
+                f.write(mask.to_bytes(mask_size, 'little'))
+        os.replace(tmp_filepath, filepath)
+
+    @classmethod
+    def load(cls, filepath):
+        with open(filepath, 'rb') as f:
+            magic, version, meta_size = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != ORIGIN_STATE_MAGIC or version != ORIGIN_STATE_VERSION:
+                raise ValueError(f'unsupported origin state at {filepath}')
+            meta = json.loads(f.read(meta_size))
+            state = cls(meta['collector'], meta['rib_timestamp'], meta['updated_until'], meta['peers'])
+            table = OriginTable.read(f)
+            mask_size = meta['mask_size']
+            masks = f.read(mask_size * len(table))
+        for i, (version, network, length, origin) in enumerate(table.iter_rows()):
+            mask = int.from_bytes(masks[i * mask_size:(i + 1) * mask_size], 'little')
+            state.routes.setdefault((version, network, length), {})[origin] = mask
+        return state
+
+
+def load_origin_state(collector, full_reload_days=BGP_FULL_RELOAD_DAYS):
+    """Loading the origin state of a collector and bringing it up to date
+
+    The state is rebuilt from the latest RIB snapshot if it is missing or its
+    snapshot is older than `full_reload_days`, otherwise the update files
+    published since the last run are downloaded and applied. The state file
+    is only rewritten when it changed, so an up to date collector keeps its
+    mtime.
+    """
+    state_fp = get_origin_state_path(collector)
+    state = None
+    if os.path.isfile(state_fp):
+        state = OriginState.load(state_fp)
+        age = DT_NOW - parse_broker_time(state.rib_timestamp)
+        if age >= datetime.timedelta(days=full_reload_days):
+            logger.info(f"{collector} state is {age.days} days old, reloading the full RIB")
+            state = None
+
+    if state is None:
+        info = query_latest_bgp_data(collector)
+        bgp_config = prepare_data_bgp_file(info)
+        state = OriginState(collector, info['ts_start'])
+        state.apply_file(bgp_config['filepath'], updates=False)
+    else:
+        updates = [
+            info for info in query_bgp_updates(collector, state.updated_until)
+            if info['ts_start'] >= state.updated_until
+        ]
+        if not updates:
+            logger.info(f"{collector} state is up to date since {state.updated_until}")
+            return state
+        logger.info(f"applying {len(updates)} update files to {collector} state since {state.updated_until}")
+        bgp_configs = map_downloads(
+            lambda info: prepare_data_bgp_file(info, f"{collector}.{os.path.basename(info['url'])}"),
+            updates)
+        for info, bgp_config in zip(updates, bgp_configs):
+            state.apply_file(bgp_config['filepath'])
+            state.updated_until = info['ts_end']
+
+    state.save(state_fp)
+    logger.info(f"{collector} state[{len(state.routes)} prefixes] saved at {state_fp}")
+    return state
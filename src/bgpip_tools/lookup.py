@@ -0,0 +1,209 @@
+import os
+import socket
+import bisect
+import functools
+import itertools
+import socketserver
+
+from .config import ROOT_LOGGER
+from .ranges import IP_BITS, prefix_to_range
+
+BOGON_TARGET = 'bogon'
+LOOKUP_CHUNK_SIZE = 1 << 16
+
+logger = ROOT_LOGGER.getChild('lookup')
+
+
+class LookupIndex:
+    """Maps addresses to the names of the target lists containing them
+
+    The ranges of every target are cut at every range boundary into disjoint
+    segments, per family a sorted array of segment starts is kept alongside
+    the label (the names of the targets covering it) of every segment, so a
+    lookup is a single binary search.
+    """
+
+    def __init__(self, starts, labels, label_names):
+        # version -> sorted segment starts, the first one is always 0
+        self.starts = starts
+        # version -> label id of every segment
+        self.labels = labels
+        # label id -> sorted tuple of target names, label 0 is the empty one
+        self.label_names = label_names
+        self.label_strings = [','.join(v) for v in label_names]
+        # segment starts as big-endian bytes, which sort like the integers they encode
+        self._packed_starts = {
+            version: [start.to_bytes(IP_BITS[version] // 8, 'big') for start in v] for version, v in starts.items()
+        }
+        # output suffix of every segment, shifted by one to be indexed by `bisect_right`
+        self._segment_suffixes = {
+            version: [None] + [f'\t{self.label_strings[label]}\n' for label in v] for version, v in labels.items()
+        }
+        self._pton = {
+            4: functools.partial(socket.inet_pton, socket.AF_INET),
+            6: functools.partial(socket.inet_pton, socket.AF_INET6),
+        }
+
+    @classmethod
+    def from_range_maps(cls, range_maps):
+        """Build an index from `{name: {version: sorted merged ranges}}`"""
+        label_ids = {(): 0}
+        label_names = [()]
+        starts = {}
+        labels = {}
+        for version, bits in IP_BITS.items():
+            events = []
+            for name, range_map in range_maps.items():
+                for start, end in range_map.get(version, ()):
+                    events.append((start, 1, name))
+                    if end + 1 < 1 << bits:
+                        events.append((end + 1, 0, name))
+            events.sort()
+
+            version_starts = [0]
+            version_labels = [0]
+            active = set()
+            i = 0
+            while i < len(events):
+                position = events[i][0]
+                while i < len(events) and events[i][0] == position:
+                    _, is_start, name = events[i]
+                    if is_start:
+                        active.add(name)
+                    else:
+                        active.discard(name)
+                    i += 1
+                label = tuple(sorted(active))
+                if label not in label_ids:
+                    label_ids[label] = len(label_names)
+                    label_names.append(label)
+                label_id = label_ids[label]
+                if position == version_starts[-1]:
+                    version_labels[-1] = label_id
+                elif label_id != version_labels[-1]:
+                    version_starts.append(position)
+                    version_labels.append(label_id)
+            starts[version] = version_starts
+            labels[version] = version_labels
+        return cls(starts, labels, label_names)
+
+    def __len__(self):
+        return sum(len(v) for v in self.starts.values())
+
+    def lookup(self, address: str):
+        """Returns the names of the targets containing an address or a network"""
+        if '/' in address:
+            address, _, length = address.partition('/')
+        else:
+            length = None
+        if ':' in address:
+            version = 6
+            network = int.from_bytes(socket.inet_pton(socket.AF_INET6, address), 'big')
+        else:
+            version = 4
+            network = int.from_bytes(socket.inet_pton(socket.AF_INET, address), 'big')
+        starts = self.starts[version]
+        labels = self.labels[version]
+        if length is None:
+            return self.label_names[labels[bisect.bisect_right(starts, network) - 1]]
+
+        # a network belongs to the targets covering every segment it overlaps
+        start, end = prefix_to_range(version, network, int(length))
+        i = bisect.bisect_right(starts, start) - 1
+        j = bisect.bisect_right(starts, end)
+        names = set(self.label_names[labels[i]])
+        for label in labels[i + 1:j]:
+            names.intersection_update(self.label_names[label])
+        return tuple(sorted(names))
+
+    def _lookup_chunk(self, addresses):
+        """Returns the output lines of stripped addresses, mapping whole chunks with builtins"""
+        for version, pton in self._pton.items():
+            try:
+                packed = list(map(pton, addresses))
+            except (OSError, ValueError):
+                continue
+            positions = map(functools.partial(bisect.bisect_right, self._packed_starts[version]), packed)
+            return ''.join(map(str.__add__, addresses, map(self._segment_suffixes[version].__getitem__, positions)))
+
+        # mixed families, networks or malformed addresses
+        lines = []
+        for address in addresses:
+            try:
+                label = ','.join(self.lookup(address))
+            except (OSError, ValueError):
+                label = '!invalid'
+            lines.append(f'{address}\t{label}\n')
+        return ''.join(lines)
+
+    def lookup_lines(self, lines, chunk_size=LOOKUP_CHUNK_SIZE):
+        """Yields `address<TAB>name,name` lines for every line, `!invalid` for malformed or blank ones
+
+        Lines are answered by chunks of `chunk_size`, interactive clients
+        should use a chunk size of 1.
+        """
+        lines = iter(lines)
+        while True:
+            chunk = list(itertools.islice(lines, chunk_size))
+            if not chunk:
+                return
+            yield self._lookup_chunk(list(map(str.strip, chunk)))
+
+
+def load_lookup_index(cidrs_dir, bogons=True):
+    """Loading every `v4/*.txt` and `v6/*.txt` CIDR list of a directory into a `LookupIndex`
+
+    The `v4.ranges` / `v6.ranges` range tables are read instead of the text
+    lists when present. Bogon networks are added as the `bogon` target.
+    """
+    from .rangetable import read_range_maps
+
+    range_maps = read_range_maps(cidrs_dir)
+    if not range_maps:
+        logger.warning(f"no cidrs found at {cidrs_dir}")
+    if bogons:
+        from .bogon import get_bogon_ranges
+
+        range_maps[BOGON_TARGET] = get_bogon_ranges()
+
+    index = LookupIndex.from_range_maps(range_maps)
+    logger.info(f"lookup index[{len(range_maps)} targets, {len(index)} segments] loaded")
+    return index
+
+
+class _LookupHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for response in self.server.index.lookup_lines(
+                (line.decode(errors='replace') for line in self.rfile), chunk_size=1):
+            self.wfile.write(response.encode())
+
+
+class _UnixLookupServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPLookupServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve_lookup(index, socket_path=None, address=None):
+    """Answering lookups on a unix socket or a TCP `(host, port)`, one address per line
+
+    Every request line gets a response line, in the batch output format.
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixLookupServer(socket_path, _LookupHandler)
+    else:
+        server = _TCPLookupServer(address, _LookupHandler)
+    server.index = index
+    logger.info(f"serving lookups at {socket_path or '%s:%d' % address}")
+    try:
+        with server:
+            server.serve_forever()
+    finally:
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
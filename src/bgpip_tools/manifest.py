@@ -0,0 +1,107 @@
+import os
+import json
+import hashlib
+
+from .config import __version__, DT_NOW, ROOT_LOGGER
+from .utils import write_if_changed
+
+MANIFEST_FILENAME = 'manifest.json'
+# bumped whenever the fingerprints change meaning, invalidating older manifests
+MANIFEST_VERSION = 1
+
+logger = ROOT_LOGGER.getChild('manifest')
+
+
+def fingerprint(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def get_snapshot_identity(bgp_configs):
+    """Identifies the RIB snapshots (or origin states) of a family by their file names, sizes and mtimes"""
+    identities = []
+    for bgp_config in bgp_configs:
+        stat = os.stat(bgp_config['filepath'])
+        identities.append(f"{os.path.basename(bgp_config['filepath'])}:{stat.st_size}:{stat.st_mtime_ns}")
+    return ','.join(identities)
+
+
+def _iter_names(expression):
+    if isinstance(expression, str):
+        yield expression
+        return
+    (_, operands), = expression.items()
+    for operand in operands:
+        yield from _iter_names(operand)
+
+
+def get_target_fingerprints(config, asns, derived, inputs):
+    """Returns `{name: {input: digest}}` of the lists of a configuration
+
+    Every list gets the digests of its configuration entry and its resolved
+    ASNs on top of the family wide `inputs` (snapshot, bogons, output
+    options). The ASN digest of a derived list covers the fingerprints of
+    the lists its expression refers to.
+    """
+    fingerprints = {
+        k: dict(inputs, config=fingerprint(config.get(k)), asns=fingerprint(sorted(v)))
+        for k, v in asns.items()
+    }
+    evaluating = set()
+
+    def _get(name):
+        if name in fingerprints:
+            return fingerprints[name]
+        if name not in derived:
+            raise KeyError(f'unknown target {name} in derived expressions')
+        if name in evaluating:
+            raise ValueError(f'circular derived target {name}')
+        evaluating.add(name)
+        references = sorted(set(_iter_names(derived[name])))
+        fingerprints[name] = dict(
+            inputs, config=fingerprint(config.get(name)), asns=fingerprint([_get(k) for k in references]))
+        evaluating.discard(name)
+        return fingerprints[name]
+
+    for k in derived:
+        _get(k)
+    return fingerprints
+
+
+def get_changed_targets(previous, current):
+    """Returns `{name: [changed inputs]}` of the lists whose fingerprints differ, `['new']` for new lists"""
+    changed = {}
+    for name, fingerprints in current.items():
+        if name not in previous:
+            changed[name] = ['new']
+            continue
+        inputs = sorted(
+            k for k in set(fingerprints) | set(previous[name]) if fingerprints.get(k) != previous[name].get(k))
+        if inputs:
+            changed[name] = inputs
+    return changed
+
+
+def load_manifest(output_dir):
+    """Reads `{family: {name: fingerprints}}` from the manifest of an output directory, empty if missing or stale"""
+    fp = os.path.join(output_dir, MANIFEST_FILENAME)
+    try:
+        with open(fp) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('bgpip_tools') != __version__:
+        return {}
+    return manifest.get('families', {})
+
+
+def write_manifest(output_dir, families):
+    """Writes the `{family: {name: fingerprints}}` of the generated lists as the manifest of an output directory"""
+    fp = os.path.join(output_dir, MANIFEST_FILENAME)
+    content = json.dumps({
+        'version': MANIFEST_VERSION,
+        'bgpip_tools': __version__,
+        'generated_at': DT_NOW.isoformat(),
+        'families': families,
+    }, indent=2, sort_keys=True)
+    write_if_changed(fp, content)
+    logger.info(f"manifest saved at {fp}")
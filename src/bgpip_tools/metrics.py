@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import threading
+import contextlib
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def _get_peak_rss():
+    """Returns the peak RSS in KiB of the process and of its waited children"""
+    if resource is None:
+        return None, None
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+
+
+def _get_cpu_time():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class StageMetrics:
+    """Wall time, CPU time (children included), peak RSS and item counts of pipeline stages
+
+    The peak RSS of a stage (`process_peak_rss_kb`) is the high-water mark of
+    the process so far when the stage ends, not the peak within the stage: it
+    only grows, a stage under an earlier larger one reports the earlier peak.
+
+    With a `profile_dir`, every stage is also profiled with `cProfile` and
+    dumped as `<index>-<stage>.prof`; a stage starting while another one is
+    profiled is not profiled.
+    """
+
+    def __init__(self, profile_dir=None):
+        self.profile_dir = profile_dir
+        self.started_at = time.time()
+        self.stages = []
+        # name -> projected full run of a sampled dry run
+        self.projections = {}
+        self._lock = threading.Lock()
+        self._profiling = False
+
+    @contextlib.contextmanager
+    def stage(self, name, **info):
+        """Measures the enclosed block, yields a dict the block fills with item counts"""
+        counts = {}
+        profiler = None
+        with self._lock:
+            index = len(self.stages)
+            if self.profile_dir and not self._profiling:
+                import cProfile
+
+                self._profiling = True
+                profiler = cProfile.Profile()
+        wall = time.perf_counter()
+        cpu = _get_cpu_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield counts
+        finally:
+            if profiler:
+                profiler.disable()
+            peak_rss, children_peak_rss = _get_peak_rss()
+            record = {
+                'name': name,
+                **info,
+                'wall_seconds': round(time.perf_counter() - wall, 6),
+                'cpu_seconds': round(_get_cpu_time() - cpu, 6),
+                'process_peak_rss_kb': peak_rss,
+                'children_process_peak_rss_kb': children_peak_rss,
+                'counts': counts,
+            }
+            if profiler:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                record['profile'] = os.path.join(self.profile_dir, f'{index:02d}-{name}.prof')
+                profiler.dump_stats(record['profile'])
+            with self._lock:
+                if profiler:
+                    self._profiling = False
+                self.stages.append(record)
+
+    def to_dict(self):
+        totals = {}
+        for record in self.stages:
+            total = totals.setdefault(record['name'], {'calls': 0, 'wall_seconds': 0, 'cpu_seconds': 0})
+            total['calls'] += 1
+            total['wall_seconds'] = round(total['wall_seconds'] + record['wall_seconds'], 6)
+            total['cpu_seconds'] = round(total['cpu_seconds'] + record['cpu_seconds'], 6)
+        peak_rss, children_peak_rss = _get_peak_rss()
+        return {
+            'started_at': self.started_at,
+            'wall_seconds': round(time.time() - self.started_at, 6),
+            'peak_rss_kb': peak_rss,
+            'children_peak_rss_kb': children_peak_rss,
+            'totals': totals,
+            'stages': self.stages,
+            **({'projections': self.projections} if self.projections else {}),
+        }
+
+    def save(self, filepath):
+        with open(filepath, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+_METRICS = StageMetrics()
+
+
+def get_metrics():
+    return _METRICS
+
+
+def reset_metrics(profile_dir=None, keep_stages=True):
+    """Replaces the global metrics, keeping the stages recorded so far unless `keep_stages` is False"""
+    global _METRICS
+    metrics = StageMetrics(profile_dir)
+    if keep_stages:
+        metrics.started_at = _METRICS.started_at
+        metrics.stages = list(_METRICS.stages)
+        metrics.projections = dict(_METRICS.projections)
+    _METRICS = metrics
+    return metrics
+
+
+def stage(name, **info):
+    """Measures a stage into the global metrics, see `StageMetrics.stage`"""
+    return _METRICS.stage(name, **info)
@@ -0,0 +1,250 @@
+import os
+import bz2
+import mmap
+import gzip
+import struct
+import ipaddress
+import collections
+
+MRT_HEADER = struct.Struct('>IHHI')
+
+MRT_TYPE_TABLE_DUMP_V2 = 13
+MRT_SUBTYPE_PEER_INDEX_TABLE = 1
+
+DEFAULT_CHUNK_RECORDS = 20_000
+
+
+def open_mrt_file(filepath, fileobj=None):
+    """Opens a MRT file for reading, decompressing by its extension
+
+    `fileobj`, if given, is read instead of the file at `filepath`.
+    """
+    if filepath.endswith('.bz2'):
+        return bz2.open(fileobj or filepath, 'rb')
+    if filepath.endswith('.gz'):
+        return gzip.open(fileobj or filepath, 'rb')
+    return fileobj or open(filepath, 'rb')
+
+
+def iter_mrt_records(f):
+    """Yields `(type, subtype, raw record)` from a decompressed MRT stream"""
+    while True:
+        header = f.read(MRT_HEADER.size)
+        if not header:
+            return
+        if len(header) < MRT_HEADER.size:
+            raise ValueError('truncated MRT record header')
+        _, mrt_type, mrt_subtype, length = MRT_HEADER.unpack(header)
+        body = f.read(length)
+        if len(body) < length:
+            raise ValueError('truncated MRT record body')
+        yield mrt_type, mrt_subtype, header + body
+
+
+def split_mrt_file(filepath, output_dir, chunk_records=DEFAULT_CHUNK_RECORDS):
+    """Split a MRT file into uncompressed chunks of `chunk_records` records
+
+    Every chunk of a TABLE_DUMP_V2 file starts with a copy of the
+    PEER_INDEX_TABLE, so each chunk is a valid RIB file on its own.
+    Yields chunk paths as soon as they are written.
+    """
+    preamble = b''
+    chunk = []
+    index = 0
+
+    def _write_chunk():
+        chunk_fp = os.path.join(output_dir, f'{os.path.basename(filepath)}.{index:06d}.mrt')
+        with open(chunk_fp, 'wb') as f:
+            f.write(preamble)
+            f.writelines(chunk)
+        return chunk_fp
+
+    with open_mrt_file(filepath) as f:
+        for mrt_type, mrt_subtype, record in iter_mrt_records(f):
+            if mrt_type == MRT_TYPE_TABLE_DUMP_V2 and mrt_subtype == MRT_SUBTYPE_PEER_INDEX_TABLE:
+                if chunk:
+                    yield _write_chunk()
+                    index += 1
+                    chunk = []
+                preamble = record
+                continue
+            chunk.append(record)
+            if len(chunk) >= chunk_records:
+                yield _write_chunk()
+                index += 1
+                chunk = []
+    if chunk:
+        yield _write_chunk()
+
+
+def sample_mrt_file(filepath, output_fp, stride):
+    """Writes every `stride`th record of a MRT file, uncompressed, to `output_fp`
+
+    PEER_INDEX_TABLE records are always kept, so the sample is a valid RIB
+    file spanning the whole snapshot. Returns the number of records seen
+    and written, peer index tables aside.
+    """
+    records = sampled = 0
+    with open_mrt_file(filepath) as f, open(output_fp, 'wb') as output:
+        for mrt_type, mrt_subtype, record in iter_mrt_records(f):
+            if mrt_type == MRT_TYPE_TABLE_DUMP_V2 and mrt_subtype == MRT_SUBTYPE_PEER_INDEX_TABLE:
+                output.write(record)
+                continue
+            if records % stride == 0:
+                output.write(record)
+                sampled += 1
+            records += 1
+    return records, sampled
+
+
+MRT_SUBTYPE_RIB_IPV4_UNICAST = 2
+MRT_SUBTYPE_RIB_IPV4_MULTICAST = 3
+MRT_SUBTYPE_RIB_IPV6_UNICAST = 4
+MRT_SUBTYPE_RIB_IPV6_MULTICAST = 5
+MRT_SUBTYPE_RIB_IPV4_UNICAST_ADDPATH = 8
+MRT_SUBTYPE_RIB_IPV4_MULTICAST_ADDPATH = 9
+MRT_SUBTYPE_RIB_IPV6_UNICAST_ADDPATH = 10
+MRT_SUBTYPE_RIB_IPV6_MULTICAST_ADDPATH = 11
+
+# subtype: (is ipv6, has path identifier)
+_RIB_SUBTYPES = {
+    MRT_SUBTYPE_RIB_IPV4_UNICAST: (False, False),
+    MRT_SUBTYPE_RIB_IPV4_MULTICAST: (False, False),
+    MRT_SUBTYPE_RIB_IPV6_UNICAST: (True, False),
+    MRT_SUBTYPE_RIB_IPV6_MULTICAST: (True, False),
+    MRT_SUBTYPE_RIB_IPV4_UNICAST_ADDPATH: (False, True),
+    MRT_SUBTYPE_RIB_IPV4_MULTICAST_ADDPATH: (False, True),
+    MRT_SUBTYPE_RIB_IPV6_UNICAST_ADDPATH: (True, True),
+    MRT_SUBTYPE_RIB_IPV6_MULTICAST_ADDPATH: (True, True),
+}
+
+BGP_ATTR_FLAG_EXTENDED_LENGTH = 0x10
+BGP_ATTR_TYPE_AS_PATH = 2
+AS_PATH_SEGMENT_AS_SET = 1
+AS_PATH_SEGMENT_AS_SEQUENCE = 2
+
+READ_BLOCK_SIZE = 1 << 22
+
+
+def _get_path_origin(buffer, offset, end):
+    """Returns the origin ASN of the AS_PATH attribute in `buffer[offset:end]`
+
+    TABLE_DUMP_V2 always encodes AS_PATH with 4-byte ASNs. Like the textual
+    AS path, the origin is the last ASN of the last AS_SEQUENCE or AS_SET.
+    """
+    while offset < end:
+        flags = buffer[offset]
+        attr_type = buffer[offset + 1]
+        if flags & BGP_ATTR_FLAG_EXTENDED_LENGTH:
+            length = buffer[offset + 2] << 8 | buffer[offset + 3]
+            offset += 4
+        else:
+            length = buffer[offset + 2]
+            offset += 3
+        if attr_type != BGP_ATTR_TYPE_AS_PATH:
+            offset += length
+            continue
+
+        origin = None
+        path_end = offset + length
+        while offset < path_end:
+            segment_type = buffer[offset]
+            count = buffer[offset + 1]
+            offset += 2 + 4 * count
+            if segment_type not in (AS_PATH_SEGMENT_AS_SET, AS_PATH_SEGMENT_AS_SEQUENCE):
+                origin = None
+            elif count:
+                origin = int.from_bytes(buffer[offset - 4:offset], 'big')
+        return origin
+    return None
+
+
+def iter_rib_origins(buffer, counters=None):
+    """Yields `(prefix, origin ASN)` pairs from TABLE_DUMP_V2 RIB records
+
+    `buffer` is a bytes-like object (e.g. a `memoryview` over a `mmap`) holding
+    whole MRT records; only the AS_PATH attributes are decoded and every
+    origin is reported once per prefix. Returns the offset of the first
+    incomplete record.
+    """
+    if counters is None:
+        counters = collections.Counter()
+    buffer = memoryview(buffer)
+    offset = 0
+    size = len(buffer)
+    while offset + MRT_HEADER.size <= size:
+        _, mrt_type, mrt_subtype, length = MRT_HEADER.unpack_from(buffer, offset)
+        body = offset + MRT_HEADER.size
+        end = body + length
+        if end > size:
+            break
+        offset = end
+        if mrt_type != MRT_TYPE_TABLE_DUMP_V2 or mrt_subtype not in _RIB_SUBTYPES:
+            continue
+
+        is_v6, has_path_id = _RIB_SUBTYPES[mrt_subtype]
+        prefix_length = buffer[body + 4]
+        if prefix_length == 0:
+            # skip default routes
+            continue
+        cursor = body + 5 + (prefix_length + 7) // 8
+        network = bytes(buffer[body + 5:cursor])
+        if is_v6:
+            prefix = f'{ipaddress.IPv6Address(network + bytes(16 - len(network)))}/{prefix_length}'
+        else:
+            prefix = f'{ipaddress.IPv4Address(network + bytes(4 - len(network)))}/{prefix_length}'
+
+        entry_count = buffer[cursor] << 8 | buffer[cursor + 1]
+        counters['elements'] += entry_count
+        cursor += 2
+        origins = set()
+        for _ in range(entry_count):
+            # peer index (2), [path identifier (4)], originated time (4)
+            cursor += 10 if has_path_id else 6
+            attr_length = buffer[cursor] << 8 | buffer[cursor + 1]
+            cursor += 2
+            origin = _get_path_origin(buffer, cursor, cursor + attr_length)
+            cursor += attr_length
+            if origin is not None:
+                origins.add(origin)
+        for origin in origins:
+            yield prefix, origin
+    return offset
+
+
+def read_rib_origins(filepath, counters=None):
+    """Yields `(prefix, origin ASN)` pairs from a TABLE_DUMP_V2 RIB file
+
+    Uncompressed files are memory mapped, compressed ones are decoded in
+    blocks of whole records.
+    """
+    if not filepath.endswith(('.bz2', '.gz')):
+        with open(filepath, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                offset = yield from iter_rib_origins(buffer, counters)
+                if offset != len(buffer):
+                    raise ValueError(f'truncated MRT record in {filepath}')
+        return
+
+    with open_mrt_file(filepath) as f:
+        yield from read_rib_stream(f, counters)
+
+
+def read_rib_stream(f, counters=None):
+    """Yields `(prefix, origin ASN)` pairs from a decompressed TABLE_DUMP_V2 stream
+
+    The stream is decoded in blocks of whole records as soon as they are read,
+    so it may still be downloading.
+    """
+    pending = bytearray()
+    while True:
+        block = f.read(READ_BLOCK_SIZE)
+        if not block:
+            break
+        pending += block
+        offset = yield from iter_rib_origins(pending, counters)
+        del pending[:offset]
+    if pending:
+        raise ValueError('truncated MRT record')
@@ -0,0 +1,319 @@
+import os
+import sys
+import array
+import heapq
+import struct
+import tempfile
+
+from .ranges import format_prefix, parse_prefix
+
+ORIGIN_TABLE_SUFFIX = '.origins'
+ORIGIN_TABLE_MAGIC = b'BGPO'
+ORIGIN_TABLE_VERSION = 1
+
+# magic, format version, padding, ipv4 count, ipv6 count
+_HEADER = struct.Struct('<4sB3xQQ')
+_MASK_64 = (1 << 64) - 1
+# rows are packed as `network << 40 | length << 32 | origin`, which sorts like the `(network, length, origin)` tuple
+_ROW_BITS = {4: 72, 6: 168}
+# approximate bytes per buffered row (int object and list slot), to turn a memory limit into a row count
+_ROW_MEMORY = {4: 48, 6: 60}
+_SPILL_BLOCK_ROWS = 1 << 16
+
+
+def get_origin_table_path(rib_filepath):
+    return rib_filepath + ORIGIN_TABLE_SUFFIX
+
+
+def _typed_array(typecode, itemsize):
+    # pick the native typecode with the expected width for portable files
+    for code in typecode:
+        if array.array(code).itemsize == itemsize:
+            return code
+    raise TypeError(f'no array typecode of {itemsize} bytes in {typecode}')
+
+
+_U8 = 'B'
+_U32 = _typed_array('IL', 4)
+_U64 = _typed_array('QL', 8)
+
+
+class OriginTable:
+    """Every (prefix, origin ASN) pair of a RIB snapshot, stored column-wise.
+
+    Rows are deduplicated and sorted by (network, length, origin) per family.
+    IPv4 networks use a single unsigned 32-bit column while IPv6 networks are
+    split into two unsigned 64-bit columns (high and low word).
+    """
+
+    def __init__(self, v4_columns=None, v6_columns=None):
+        self.v4_nets, self.v4_lengths, self.v4_origins = v4_columns or (
+            array.array(_U32), array.array(_U8), array.array(_U32))
+        self.v6_highs, self.v6_lows, self.v6_lengths, self.v6_origins = v6_columns or (
+            array.array(_U64), array.array(_U64), array.array(_U8), array.array(_U32))
+
+    def __len__(self):
+        return len(self.v4_origins) + len(self.v6_origins)
+
+    @classmethod
+    def from_pairs(cls, pairs, memory_limit=None, spill_dir=None):
+        """Build a table from `(prefix, origin)` pairs, see `OriginTableBuilder`"""
+        builder = OriginTableBuilder(memory_limit, spill_dir)
+        builder.update(pairs)
+        return builder.build()
+
+    @classmethod
+    def from_rows(cls, v4_rows, v6_rows):
+        """Build a table from `(network, length, origin)` integer rows"""
+        table = cls()
+        for network, length, origin in sorted(v4_rows):
+            table.v4_nets.append(network)
+            table.v4_lengths.append(length)
+            table.v4_origins.append(origin)
+        for network, length, origin in sorted(v6_rows):
+            table.v6_highs.append(network >> 64)
+            table.v6_lows.append(network & _MASK_64)
+            table.v6_lengths.append(length)
+            table.v6_origins.append(origin)
+        return table
+
+    def iter_rows(self, v4=True, v6=True):
+        """Yields `(version, network, length, origin)` integer rows"""
+        if v4:
+            for network, length, origin in zip(self.v4_nets, self.v4_lengths, self.v4_origins):
+                yield 4, network, length, origin
+        if v6:
+            for high, low, length, origin in zip(
+                    self.v6_highs, self.v6_lows, self.v6_lengths, self.v6_origins):
+                yield 6, high << 64 | low, length, origin
+
+    def count_prefixes(self):
+        """Returns the number of distinct prefixes, rows being sorted"""
+        count = 0
+        for columns in ((self.v4_nets, self.v4_lengths), (self.v6_highs, self.v6_lows, self.v6_lengths)):
+            previous = None
+            for key in zip(*columns):
+                if key != previous:
+                    count += 1
+                    previous = key
+        return count
+
+    def iter_pairs(self, v4=True, v6=True):
+        """Yields `(prefix, origin)` pairs"""
+        for version, network, length, origin in self.iter_rows(v4, v6):
+            yield format_prefix(version, network, length), origin
+
+    def _columns(self):
+        return (
+            self.v4_nets, self.v4_lengths, self.v4_origins,
+            self.v6_highs, self.v6_lows, self.v6_lengths, self.v6_origins,
+        )
+
+    def dump(self, f):
+        f.write(_HEADER.pack(
+            ORIGIN_TABLE_MAGIC, ORIGIN_TABLE_VERSION, len(self.v4_origins), len(self.v6_origins)))
+        for column in self._columns():
+            if sys.byteorder != 'little':
+                column = array.array(column.typecode, column)
+                column.byteswap()
+            column.tofile(f)
+
+    def save(self, filepath):
+        tmp_filepath = f'{filepath}.tmp'
+        with open(tmp_filepath, 'wb') as f:
+            self.dump(f)
+        os.replace(tmp_filepath, filepath)
+
+    @classmethod
+    def read(cls, f):
+        table = cls()
+        magic, version, v4_count, v6_count = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != ORIGIN_TABLE_MAGIC or version != ORIGIN_TABLE_VERSION:
+            raise ValueError(f'unsupported origin table in {f.name}')
+        counts = (v4_count,) * 3 + (v6_count,) * 4
+        for column, count in zip(table._columns(), counts):
+            column.fromfile(f, count)
+            if sys.byteorder != 'little':
+                column.byteswap()
+        return table
+
+    @classmethod
+    def load(cls, filepath):
+        with open(filepath, 'rb') as f:
+            return cls.read(f)
+
+
+def _tag_rows(rows, index):
+    for _, network, length, origin in rows:
+        yield network, length, origin, index
+
+
+def merge_origin_tables(tables):
+    """Merges origin tables in a single ordered pass over their sorted rows
+
+    Returns the merged table and the visibility of every table: its
+    `pairs`, its `prefixes` and its `exclusive_prefixes`, seen by no other
+    table.
+    """
+    merged = OriginTable()
+    prefixes = [0] * len(tables)
+    exclusive = [0] * len(tables)
+
+    def _count(seen):
+        if seen & (seen - 1) == 0:
+            exclusive[seen.bit_length() - 1] += 1
+        for i in range(len(tables)):
+            if seen >> i & 1:
+                prefixes[i] += 1
+
+    for version in (4, 6):
+        rows = heapq.merge(*(
+            _tag_rows(table.iter_rows(v4=version == 4, v6=version == 6), i) for i, table in enumerate(tables)))
+        prefix = row = None
+        # bitset of the tables holding the current prefix
+        seen = 0
+        for network, length, origin, i in rows:
+            if (network, length) != prefix:
+                if seen:
+                    _count(seen)
+                prefix = (network, length)
+                seen = 0
+            seen |= 1 << i
+            if (network, length, origin) == row:
+                continue
+            row = (network, length, origin)
+            if version == 4:
+                merged.v4_nets.append(network)
+                merged.v4_lengths.append(length)
+                merged.v4_origins.append(origin)
+            else:
+                merged.v6_highs.append(network >> 64)
+                merged.v6_lows.append(network & _MASK_64)
+                merged.v6_lengths.append(length)
+                merged.v6_origins.append(origin)
+        if seen:
+            _count(seen)
+    visibility = [
+        {'pairs': len(table), 'prefixes': prefixes[i], 'exclusive_prefixes': exclusive[i]}
+        for i, table in enumerate(tables)
+    ]
+    return merged, visibility
+
+
+def estimate_builder_memory(version, rows):
+    """Approximate bytes an `OriginTableBuilder` buffers for `rows` pairs of a family"""
+    return rows * _ROW_MEMORY[version]
+
+
+def _dedupe_sorted(rows):
+    """Removes the duplicates of the sorted list `rows` in place"""
+    j = 0
+    for row in rows:
+        if not j or row != rows[j - 1]:
+            rows[j] = row
+            j += 1
+    del rows[j:]
+
+
+def _iter_run(filepath, size):
+    with open(filepath, 'rb') as f:
+        while True:
+            block = f.read(size * _SPILL_BLOCK_ROWS)
+            if not block:
+                return
+            for offset in range(0, len(block), size):
+                yield int.from_bytes(block[offset:offset + size], 'big')
+
+
+class OriginTableBuilder:
+    """Collects `(prefix, origin)` pairs into an `OriginTable` within a memory budget
+
+    Pairs are buffered as single packed integers per family. Once the buffers
+    pass `memory_limit` bytes they are sorted and deduplicated in place, and
+    spilled into `spill_dir` as runs of fixed size records if the unique rows
+    still take more than half of it; `build` merges the runs back with the
+    buffers.
+    """
+
+    def __init__(self, memory_limit=None, spill_dir=None):
+        self.memory_limit = memory_limit
+        self.spill_dir = spill_dir
+        self.rows = {4: [], 6: []}
+        # version -> spilled run paths
+        self.runs = {4: [], 6: []}
+        self._memory = 0
+
+    def add(self, prefix, origin):
+        version, network, length = parse_prefix(prefix)
+        self.rows[version].append(network << 40 | length << 32 | origin)
+        self._memory += _ROW_MEMORY[version]
+        if self.memory_limit and self._memory > self.memory_limit:
+            self.compact()
+            if self._memory > self.memory_limit // 2:
+                self.spill()
+
+    def update(self, pairs):
+        for prefix, origin in pairs:
+            self.add(prefix, origin)
+
+    @property
+    def spilled(self):
+        return sum(len(v) for v in self.runs.values())
+
+    def compact(self):
+        """Sorts and deduplicates the buffered rows in place"""
+        for rows in self.rows.values():
+            rows.sort()
+            _dedupe_sorted(rows)
+        self._memory = sum(len(rows) * _ROW_MEMORY[version] for version, rows in self.rows.items())
+
+    def spill(self):
+        """Writes the buffered rows of every family as sorted runs"""
+        self.compact()
+        for version, rows in self.rows.items():
+            if not rows:
+                continue
+            size = _ROW_BITS[version] // 8
+            fd, filepath = tempfile.mkstemp(prefix='origins.', suffix='.run', dir=self.spill_dir)
+            with os.fdopen(fd, 'wb') as f:
+                for row in rows:
+                    f.write(row.to_bytes(size, 'big'))
+            self.runs[version].append(filepath)
+            rows.clear()
+        self._memory = 0
+
+    def build(self):
+        """Returns the sorted unique rows as an `OriginTable`, removing the spilled runs"""
+        table = OriginTable()
+        try:
+            for version, rows in self.rows.items():
+                rows.sort()
+                size = _ROW_BITS[version] // 8
+                runs = [_iter_run(fp, size) for fp in self.runs[version]]
+                previous = None
+                for row in heapq.merge(rows, *runs) if runs else rows:
+                    if row == previous:
+                        continue
+                    previous = row
+                    network = row >> 40
+                    if version == 4:
+                        table.v4_nets.append(network)
+                        table.v4_lengths.append(row >> 32 & 0xff)
+                        table.v4_origins.append(row & 0xffffffff)
+                    else:
+                        table.v6_highs.append(network >> 64)
+                        table.v6_lows.append(network & _MASK_64)
+                        table.v6_lengths.append(row >> 32 & 0xff)
+                        table.v6_origins.append(row & 0xffffffff)
+                rows.clear()
+        finally:
+            self.close()
+        return table
+
+    def close(self):
+        for runs in self.runs.values():
+            for filepath in runs:
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+            runs.clear()
+        self._memory = 0
@@ -0,0 +1,171 @@
+import socket
+import bisect
+
+IP_BITS = {4: 32, 6: 128}
+_ADDRESS_FAMILIES = {4: socket.AF_INET, 6: socket.AF_INET6}
+
+
+def parse_prefix(prefix: str):
+    """Parse a prefix string into `(version, network, length)` integers"""
+    address, _, length = prefix.partition('/')
+    if ':' in address:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, address), 'big'), int(length)
+    return 4, int.from_bytes(socket.inet_aton(address), 'big'), int(length)
+
+
+def prefix_to_range(version, network, length):
+    """Returns the inclusive `(start, end)` integer range of a prefix, host bits cleared"""
+    host_bits = IP_BITS[version] - length
+    start = network >> host_bits << host_bits
+    return start, start | ((1 << host_bits) - 1)
+
+
+def cidrs_to_ranges(cidrs):
+    """Converts CIDR strings into `{version: sorted merged ranges}`"""
+    ranges = {4: [], 6: []}
+    for cidr in cidrs:
+        version, network, length = parse_prefix(cidr)
+        ranges[version].append(prefix_to_range(version, network, length))
+    return {version: merge_ranges(v) for version, v in ranges.items()}
+
+
+def merge_ranges(ranges):
+    """Sorts ranges and merges the overlapping and adjacent ones"""
+    starts = []
+    ends = []
+    for start, end in sorted(ranges):
+        if ends and start <= ends[-1] + 1:
+            if end > ends[-1]:
+                ends[-1] = end
+            continue
+        starts.append(start)
+        ends.append(end)
+    return list(zip(starts, ends))
+
+
+class RangeMerger:
+    """Merges ranges added one at a time, like `merge_ranges` without holding them all
+
+    Ranges added in ascending start order are merged on the fly, the others
+    are kept aside until `get_ranges`.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self._unsorted = []
+
+    def add(self, start, end):
+        starts = self.starts
+        ends = self.ends
+        if starts and start < starts[-1]:
+            self._unsorted.append((start, end))
+        elif ends and start <= ends[-1] + 1:
+            if end > ends[-1]:
+                ends[-1] = end
+        else:
+            starts.append(start)
+            ends.append(end)
+
+    def get_ranges(self):
+        ranges = list(zip(self.starts, self.ends))
+        if self._unsorted:
+            return merge_ranges(ranges + self._unsorted)
+        return ranges
+
+
+def union_ranges(*range_lists):
+    return merge_ranges(r for ranges in range_lists for r in ranges)
+
+
+def intersect_ranges(ranges, other):
+    """Intersects two sorted merged range lists with a linear sweep"""
+    result = []
+    i = j = 0
+    while i < len(ranges) and j < len(other):
+        start = max(ranges[i][0], other[j][0])
+        end = min(ranges[i][1], other[j][1])
+        if start <= end:
+            result.append((start, end))
+        if ranges[i][1] < other[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def subtract_ranges(ranges, other):
+    """Removes `other` from `ranges`, both sorted and merged, with a linear sweep"""
+    result = []
+    j = 0
+    for start, end in ranges:
+        while j < len(other) and other[j][1] < start:
+            j += 1
+        k = j
+        while start <= end and k < len(other) and other[k][0] <= end:
+            if other[k][0] > start:
+                result.append((start, other[k][0] - 1))
+            start = max(start, other[k][1] + 1)
+            k += 1
+        if start <= end:
+            result.append((start, end))
+    return result
+
+
+def filter_covered_ranges(ranges, cover):
+    """Yields the ranges not lying entirely inside the sorted merged `cover` ranges"""
+    cover_starts = [start for start, _ in cover]
+    for start, end in ranges:
+        i = bisect.bisect_right(cover_starts, start) - 1
+        if i >= 0 and end <= cover[i][1]:
+            continue
+        yield start, end
+
+
+def ranges_to_prefixes(ranges, version):
+    """Yields the minimal `(network, length)` prefixes covering sorted merged ranges"""
+    bits = IP_BITS[version]
+    for start, end in ranges:
+        while start <= end:
+            # the largest block aligned at start which does not pass end
+            size = (start & -start).bit_length() - 1 if start else bits
+            size = min(size, (end - start + 1).bit_length() - 1)
+            yield start, bits - size
+            start += 1 << size
+
+
+def format_address(version, address):
+    return socket.inet_ntop(_ADDRESS_FAMILIES[version], address.to_bytes(IP_BITS[version] // 8, 'big'))
+
+
+def format_prefix(version, network, length):
+    """Formats a prefix like `netaddr` (`inet_ntop`) does"""
+    return f'{format_address(version, network)}/{length}'
+
+
+def ranges_to_cidrs(range_map):
+    """Formats `{version: sorted merged ranges}` into CIDR strings, IPv4 first"""
+    cidrs = []
+    for version in sorted(range_map):
+        for network, length in ranges_to_prefixes(range_map[version], version):
+            cidrs.append(format_prefix(version, network, length))
+    return cidrs
+
+
+def aggregate_prefixes(prefixes, bogon_ranges=None):
+    """Aggregates `(version, network, length)` prefixes into `{version: merged ranges}`
+
+    Prefixes lying entirely inside `bogon_ranges` (`{version: merged ranges}`)
+    are dropped before merging.
+    """
+    ranges = {}
+    for version, network, length in prefixes:
+        ranges.setdefault(version, []).append(prefix_to_range(version, network, length))
+
+    range_map = {}
+    for version, v in ranges.items():
+        v.sort()
+        if bogon_ranges and bogon_ranges.get(version):
+            v = filter_covered_ranges(v, bogon_ranges[version])
+        range_map[version] = merge_ranges(v)
+    return range_map
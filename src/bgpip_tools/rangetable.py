@@ -0,0 +1,243 @@
+import os
+import glob
+import mmap
+import bisect
+import socket
+import struct
+import hashlib
+
+from .config import ROOT_LOGGER
+from .ranges import IP_BITS, cidrs_to_ranges
+from .utils import write_if_changed
+
+RANGE_TABLE_SUFFIX = '.ranges'
+RANGE_TABLE_MAGIC = b'BGPR'
+RANGE_TABLE_VERSION = 3
+
+# magic, format version, ip version, padding, target count, padding, range count, sha256 of everything after
+# the header; 56 bytes, so every field and the following records are 8 bytes aligned
+_HEADER = struct.Struct('<4sBB2xI4xQ32s')
+# name offset, name size, segment count, range count
+_TARGET = struct.Struct('<IIQQ')
+# start, end, target id of a segment; IPv6 addresses are split into high and low words
+_RANGES = {
+    4: struct.Struct('<III4x'),
+    6: struct.Struct('<QQQQI4x'),
+}
+_MASK_64 = (1 << 64) - 1
+
+logger = ROOT_LOGGER.getChild('rangetable')
+
+
+def _padding(size):
+    return -size % 8
+
+
+def _pack_range(version, start, end, target_id):
+    if version == 4:
+        return _RANGES[4].pack(start, end, target_id)
+    return _RANGES[6].pack(start >> 64, start & _MASK_64, end >> 64, end & _MASK_64, target_id)
+
+
+def _split_ranges(range_maps):
+    """Yields the `(start, end, target id)` segments of `[sorted merged ranges]` indexed by target id
+
+    Ranges are cut at every range boundary of every target, so two segments
+    either cover the same addresses or none in common.
+    """
+    boundaries = sorted({v for ranges in range_maps for start, end in ranges for v in (start, end + 1)})
+    for target_id, ranges in enumerate(range_maps):
+        for start, end in ranges:
+            i = bisect.bisect_right(boundaries, start)
+            while boundaries[i] <= end:
+                yield start, boundaries[i] - 1, target_id
+                start = boundaries[i]
+                i += 1
+            yield start, end, target_id
+
+
+def pack_range_table(version, range_map):
+    """Packs `{name: sorted merged ranges}` of one family into a range table
+
+    Layout, little-endian and 8 bytes aligned:
+
+    - header: magic `BGPR`, format version, ip version, target and segment
+      counts, sha256 of the rest of the file
+    - target table: name offset / size in the name blob, segment count and
+      merged range count of every target, sorted by name
+    - name blob: UTF-8 target names
+    - segments: the ranges of every target cut at the range boundaries of all
+      targets into inclusive `(start, end, target id)` records sorted by start
+      then target id, IPv6 addresses as high and low 64-bit words; segments
+      are identical or disjoint, so an address lookup is a single search
+    """
+    names = sorted(range_map)
+    segments = sorted(_split_ranges([range_map[name] for name in names]))
+    segment_counts = [0] * len(names)
+    for _, _, target_id in segments:
+        segment_counts[target_id] += 1
+    targets = bytearray()
+    name_blob = bytearray()
+    for target_id, name in enumerate(names):
+        encoded = name.encode()
+        targets += _TARGET.pack(len(name_blob), len(encoded), segment_counts[target_id], len(range_map[name]))
+        name_blob += encoded
+    name_blob += bytes(_padding(len(name_blob)))
+    records = b''.join(_pack_range(version, start, end, target_id) for start, end, target_id in segments)
+    body = bytes(targets + name_blob) + records
+    header = _HEADER.pack(
+        RANGE_TABLE_MAGIC, RANGE_TABLE_VERSION, version, len(names), len(segments), hashlib.sha256(body).digest())
+    return header + body
+
+
+def write_range_table(filepath, version, range_map):
+    """Writes a range table, returns False if the file already had the same content"""
+    os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+    return write_if_changed(filepath, pack_range_table(version, range_map))
+
+
+def read_range_maps(cidrs_dir):
+    """Reads the lists of a `cidrs` output directory as `{name: {version: sorted merged ranges}}`
+
+    The `v4.ranges` / `v6.ranges` range tables are read instead of the
+    `v4/*.txt` / `v6/*.txt` text lists when present and readable (e.g. not
+    of an older format version).
+    """
+    range_maps = {}
+    for version in IP_BITS:
+        table_fp = os.path.join(cidrs_dir, f'v{version}{RANGE_TABLE_SUFFIX}')
+        if os.path.isfile(table_fp):
+            try:
+                table = RangeTable.load(table_fp)
+            except ValueError as e:
+                logger.warning(f"{e}, reading the text lists")
+            else:
+                for name, ranges in table.to_range_map().items():
+                    range_maps.setdefault(name, {})[version] = ranges
+                table.close()
+                continue
+        for fp in sorted(glob.glob(os.path.join(cidrs_dir, f'v{version}', '*.txt'))):
+            name = os.path.basename(fp)[:-len('.txt')]
+            with open(fp) as f:
+                cidrs = [line.strip() for line in f if line.strip()]
+            range_maps.setdefault(name, {})[version] = cidrs_to_ranges(cidrs)[version]
+    return range_maps
+
+
+class RangeTable:
+    """Read only view of a range table file, see `pack_range_table`
+
+    The file is memory mapped and segments are decoded on access, a lookup
+    is a single binary search over the segments.
+    """
+
+    def __init__(self, buffer, version, targets, count, ranges_offset):
+        self._buffer = buffer
+        self.version = version
+        # name -> (target id, segment count, range count)
+        self.targets = targets
+        self._names = list(targets)
+        self._count = count
+        self._ranges_offset = ranges_offset
+        self._range = _RANGES[version]
+
+    @property
+    def names(self):
+        return list(self.targets)
+
+    def __len__(self):
+        return sum(v[2] for v in self.targets.values())
+
+    @classmethod
+    def load(cls, filepath, verify=True):
+        """Maps a range table, `verify` checks its sha256 (reads the whole file)"""
+        with open(filepath, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, ip_version, target_count, count, checksum = _HEADER.unpack_from(buffer)
+        if magic != RANGE_TABLE_MAGIC or version != RANGE_TABLE_VERSION or ip_version not in _RANGES:
+            raise ValueError(f'unsupported range table at {filepath}')
+        if verify and hashlib.sha256(memoryview(buffer)[_HEADER.size:]).digest() != checksum:
+            raise ValueError(f'checksum mismatch of range table at {filepath}')
+
+        names_offset = _HEADER.size + _TARGET.size * target_count
+        targets = {}
+        names_size = 0
+        for i in range(target_count):
+            name_offset, name_size, segment_count, range_count = _TARGET.unpack_from(
+                buffer, _HEADER.size + _TARGET.size * i)
+            name = bytes(buffer[names_offset + name_offset:names_offset + name_offset + name_size]).decode()
+            targets[name] = (i, segment_count, range_count)
+            names_size = max(names_size, name_offset + name_size)
+        ranges_offset = names_offset + names_size + _padding(names_size)
+        if ranges_offset + _RANGES[ip_version].size * count != len(buffer):
+            raise ValueError(f'truncated range table at {filepath}')
+        return cls(buffer, ip_version, targets, count, ranges_offset)
+
+    def _get_segment(self, i):
+        values = self._range.unpack_from(self._buffer, self._ranges_offset + self._range.size * i)
+        if self.version == 4:
+            return values
+        return values[0] << 64 | values[1], values[2] << 64 | values[3], values[4]
+
+    def _iter_segments(self):
+        for i in range(self._count):
+            yield self._get_segment(i)
+
+    def to_range_map(self):
+        """Returns `{name: sorted merged ranges}`, merging the segments back in a single pass"""
+        range_map = {name: [] for name in self._names}
+        for start, end, target_id in self._iter_segments():
+            ranges = range_map[self._names[target_id]]
+            if ranges and ranges[-1][1] + 1 == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return range_map
+
+    def get_ranges(self, name):
+        """Returns the sorted merged `(start, end)` ranges of a target"""
+        target_id = self.targets[name][0]
+        ranges = []
+        for start, end, segment_target_id in self._iter_segments():
+            if segment_target_id != target_id:
+                continue
+            if ranges and ranges[-1][1] + 1 == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return ranges
+
+    def lookup(self, address):
+        """Returns the names of the targets containing an address, given as a string or an integer"""
+        if isinstance(address, str):
+            family = socket.AF_INET if self.version == 4 else socket.AF_INET6
+            address = int.from_bytes(socket.inet_pton(family, address), 'big')
+        if not 0 <= address < 1 << IP_BITS[self.version]:
+            raise ValueError(f'address out of range of IPv{self.version}')
+
+        # the last segment starting at or before the address
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._get_segment(mid)[0] <= address:
+                lo = mid + 1
+            else:
+                hi = mid
+        names = []
+        if lo == 0:
+            return names
+        start, end, target_id = self._get_segment(lo - 1)
+        if end < address:
+            return names
+        # the targets of a segment are its records sharing the same start
+        i = lo - 1
+        while i >= 0:
+            segment_start, _, target_id = self._get_segment(i)
+            if segment_start != start:
+                break
+            names.append(self._names[target_id])
+            i -= 1
+        return sorted(names)
+
+    def close(self):
+        self._buffer.close()
@@ -0,0 +1,162 @@
+import re
+import collections
+
+import click
+
+from .config import DEFAULT_RIB_READER, ROOT_LOGGER
+from .utils import command_exists
+
+AS_PATH_SPLITTER = re.compile('[ ,]+')
+# the memoized AS paths are dropped once the cache grows past this size
+PATH_ORIGIN_CACHE_SIZE = 1 << 20
+
+logger = ROOT_LOGGER.getChild('reader')
+
+
+def get_path_origin(as_path: str) -> int:
+    """Returns the last ASN of a textual AS path, AS sets included"""
+    return int(re.split(AS_PATH_SPLITTER, as_path)[-1].strip('{}'))
+
+
+def get_elem_origin(elem, path_origins=None):
+    """Returns the `(prefix, origin ASN)` pair of a RIB element, or None
+
+    `path_origins` memoizes the origin of every AS path string seen so far.
+
+    BGPElem
+    -------
+    record_type|type|time|project|collector|router|router_ip|peer_asn|peer_address
+
+    record_type: R RIB, U Update
+    type: R RIB, A announcement, W withdrawal, S state message
+    """
+    if elem.record_type != 'rib':
+        return
+    if elem.type != 'R':
+        return
+    fields = elem.fields
+    if 'as-path' not in fields or 'prefix' not in fields:
+        return
+    prefix = fields['prefix']
+    if prefix == '0.0.0.0/0' or prefix == '::/0':
+        return
+
+    as_path = fields['as-path']
+    if path_origins is not None and as_path in path_origins:
+        return prefix, path_origins[as_path]
+    try:
+        last_asn = get_path_origin(as_path)
+    except KeyboardInterrupt:
+        raise
+    except Exception as e:
+        logger.error(f'parse asn error {e}, element: {elem}')
+    else:
+        if path_origins is not None:
+            path_origins[as_path] = last_asn
+        return prefix, last_asn
+
+
+def read_rib_bgpstream(filepath, counters=None):
+    """Reading a RIB file with pybgpstream (libbgpstream)
+
+    Elements of a RIB record share one prefix, so an origin is only yielded
+    the first time it is seen for the current prefix.
+    """
+    from .data import get_stream_bgp
+
+    if counters is None:
+        counters = collections.Counter()
+    path_origins = {}
+    current_prefix = None
+    current_origins = set()
+    for elem in get_stream_bgp(filepath):
+        counters['elements'] += 1
+        if len(path_origins) > PATH_ORIGIN_CACHE_SIZE:
+            path_origins.clear()
+        paths = len(path_origins)
+        pair = get_elem_origin(elem, path_origins)
+        if pair is None:
+            continue
+        if len(path_origins) == paths:
+            counters['path_cache_hits'] += 1
+        prefix, origin = pair
+        if prefix != current_prefix:
+            current_prefix = prefix
+            current_origins = set()
+        elif origin in current_origins:
+            continue
+        current_origins.add(origin)
+        yield pair
+
+
+def read_rib_bgpkit(filepath, counters=None):
+    """Reading a RIB file from the piped output of `bgpkit-parser`
+
+    type|timestamp|peer_ip|peer_asn|prefix|as_path|origin|next_hop|...
+    """
+    cmds = ['bgpkit-parser', filepath]
+    if command_exists(cmds[0]) is False:
+        raise click.ClickException(f'Could not find "{cmds[0]}" in the $PATH')
+
+    import subprocess
+
+    if counters is None:
+        counters = collections.Counter()
+    path_origins = {}
+    current_prefix = None
+    current_origins = set()
+    logger.info(f"loading bgp data at {filepath}")
+    with subprocess.Popen(cmds, stdout=subprocess.PIPE, text=True, bufsize=1 << 20) as proc:
+        for line in proc.stdout:
+            fields = line.split('|', 6)
+            if len(fields) < 6 or fields[0] != 'A':
+                continue
+            counters['elements'] += 1
+            prefix, as_path = fields[4], fields[5]
+            if prefix == '0.0.0.0/0' or prefix == '::/0':
+                continue
+            if len(path_origins) > PATH_ORIGIN_CACHE_SIZE:
+                path_origins.clear()
+            if as_path in path_origins:
+                counters['path_cache_hits'] += 1
+                last_asn = path_origins[as_path]
+            else:
+                try:
+                    last_asn = path_origins[as_path] = get_path_origin(as_path)
+                except ValueError as e:
+                    logger.error(f'parse asn error {e}, line: {line.rstrip()}')
+                    continue
+            if prefix != current_prefix:
+                current_prefix = prefix
+                current_origins = set()
+            elif last_asn in current_origins:
+                continue
+            current_origins.add(last_asn)
+            yield prefix, last_asn
+    if proc.returncode != 0:
+        raise ValueError(f'{cmds[0]} exited with {proc.returncode} on {filepath}')
+
+
+def read_rib_mrt(filepath, counters=None):
+    """Reading a TABLE_DUMP_V2 RIB file with the builtin MRT decoder"""
+    from .mrt import read_rib_origins
+
+    logger.info(f"loading bgp data at {filepath}")
+    yield from read_rib_origins(filepath, counters)
+
+
+RIB_READERS = {
+    'bgpstream': read_rib_bgpstream,
+    'bgpkit': read_rib_bgpkit,
+    'mrt': read_rib_mrt,
+}
+
+
+def get_rib_reader(name=DEFAULT_RIB_READER):
+    """Returns a callable yielding `(prefix, origin ASN)` pairs of a RIB file
+
+    Readers take an optional `collections.Counter` collecting decode statistics.
+    """
+    if name not in RIB_READERS:
+        raise KeyError(f'unknown RIB reader {name}, choose from {list(RIB_READERS)}')
+    return RIB_READERS[name]
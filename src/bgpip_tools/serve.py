@@ -0,0 +1,153 @@
+import os
+
+from . import config as _config
+from .asn import load_asns_by_config
+from .bgp import load_collector_tables, load_ranges_by_asns
+from .config import BGP_COLLECTORS, DEFAULT_BOGON_SOURCE, ROOT_LOGGER, get_config_key, read_config, refresh_now
+from .derived import evaluate_derived_targets, load_derived_targets
+from .metrics import reset_metrics
+from .origin import get_origin_table_path
+from .reader import DEFAULT_RIB_READER
+
+logger = ROOT_LOGGER.getChild('serve')
+
+
+class GenerationService:
+    """Regenerates the lists of a configuration directory as its inputs change
+
+    The configuration, the ASN classification and the merged origin table of
+    the latest RIB snapshots of the collectors of every family are kept
+    between calls of `poll`,
+    which reloads only what changed: new snapshots regenerate every list of
+    their family, configuration edits only the lists whose `asn_filters`
+    changed. Derived lists are evaluated again on every regeneration.
+    On a new UTC day, the ASN snapshot (and the online bogon lists, with
+    `bogons` other than bundled) of that day are fetched and every list is
+    regenerated from them.
+    """
+
+    def __init__(self, config_dir, families=('ipv4', 'ipv6'), jobs=1, reader=DEFAULT_RIB_READER, memory_limit=None,
+                 collectors=None, bogons=DEFAULT_BOGON_SOURCE):
+        self.config_dir = config_dir
+        self.families = list(families)
+        self.collectors = collectors or BGP_COLLECTORS
+        self.decode_options = {'jobs': jobs, 'reader': reader, 'memory_limit': memory_limit}
+        self.bogons = bogons
+        # day of the ASN and bogon data in use, the caller prepares the data of the first one
+        self.day = _config.DT_NOW.date()
+        self.config_key = None
+        self.config = {}
+        self.derived = {}
+        self.asns = {}
+        # family -> bgp configs of the loaded snapshots, one per collector
+        self.bgp = {}
+        self.tables = {}
+        # family -> {name: {version: ranges}} of the asn_filters lists
+        self.range_maps = {}
+        # changes not regenerated yet, kept when a check fails halfway
+        self.stale_names = set()
+        self.stale_families = set()
+        self.stale_derived = False
+
+    def refresh_day(self):
+        """Moves to the ASN snapshot and bogon lists of the current day, marking every list to regenerate"""
+        day = refresh_now().date()
+        if day == self.day:
+            return
+        from .data import prepare_data_asn, prepare_data_bogons
+
+        logger.info(f"loading the data of {day}")
+        prepare_data_asn()
+        if self.bogons != 'bundled':
+            prepare_data_bogons()
+        # classify every list again against the new snapshot
+        self.config_key = None
+        self.config = {}
+        self.stale_families.update(self.families)
+        self.day = day
+
+    def reload_config(self):
+        """Reads the configuration again if a file changed, marking the lists to regenerate"""
+        key = get_config_key(self.config_dir)
+        if key == self.config_key:
+            return
+        config = read_config(self.config_dir)
+        changed = {
+            k for k in set(config) | set(self.config)
+            if _get_asn_filters(config.get(k)) != _get_asn_filters(self.config.get(k))
+        }
+        derived = load_derived_targets(config)
+        if changed:
+            logger.info(f"asn_filters changed: {sorted(changed)}")
+            filters = {k: config[k] for k in changed if _get_asn_filters(config.get(k))}
+            asns = load_asns_by_config(filters) if filters else {}
+            # in configuration order, like a full classification
+            self.asns = {
+                k: asns[k] if k in changed else self.asns[k]
+                for k in config if k in asns or k not in changed and k in self.asns
+            }
+        self.stale_names |= changed
+        self.stale_derived |= derived != self.derived
+        self.config_key = key
+        self.config = config
+        self.derived = derived
+
+    def refresh_snapshots(self):
+        """Loads the origin tables of the families with RIB snapshots newer than the loaded ones"""
+        from .data import get_bgp_info, prepare_data_bgp_file
+        from .download import map_downloads
+
+        infos = get_bgp_info({family: self.collectors[family] for family in self.families})
+        for family in self.families:
+            previous = self.bgp.get(family, [])
+            if [v['url'] for v in previous] == [v['url'] for v in infos[family]]:
+                continue
+            bgp_configs = map_downloads(prepare_data_bgp_file, infos[family])
+            self.tables[family] = load_collector_tables(bgp_configs, **self.decode_options)
+            self.bgp[family] = bgp_configs
+            self.stale_families.add(family)
+            filepaths = {v['filepath'] for v in bgp_configs}
+            for v in previous:
+                if v['filepath'] not in filepaths:
+                    _remove_snapshot(v['filepath'])
+
+    def poll(self):
+        """Brings the lists up to date, returns `{family: {name: {version: ranges}}}` of the regenerated families"""
+        reset_metrics(keep_stages=False)
+        self.refresh_day()
+        self.reload_config()
+        self.refresh_snapshots()
+
+        updates = {}
+        for family in self.families:
+            if family in self.stale_families:
+                names = set(self.asns)
+            elif self.stale_names or self.stale_derived:
+                names = self.stale_names & set(self.asns)
+            else:
+                continue
+            range_map = self.range_maps.setdefault(family, {})
+            for k in self.stale_names - set(self.asns):
+                range_map.pop(k, None)
+            if names:
+                logger.info(f"regenerating {len(names)} {family} lists")
+                range_map.update(load_ranges_by_asns(
+                    self.bgp[family], {k: self.asns[k] for k in names},
+                    v4=family == 'ipv4', v6=family == 'ipv6', table=self.tables[family], bogons=self.bogons))
+            updates[family] = {k: range_map[k] for k in self.asns if k in range_map}
+            updates[family].update(evaluate_derived_targets(range_map, self.derived))
+        self.stale_names.clear()
+        self.stale_families.clear()
+        self.stale_derived = False
+        return updates
+
+
+def _get_asn_filters(config):
+    return (config or {}).get('asn_filters')
+
+
+def _remove_snapshot(filepath):
+    for fp in (filepath, get_origin_table_path(filepath)):
+        if os.path.isfile(fp):
+            os.remove(fp)
+            logger.info(f"removed replaced snapshot at {fp}")
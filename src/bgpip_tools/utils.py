@@ -1,14 +1,28 @@
+import io
 import os
 import json
 import click
 import shutil
-import subprocess
 
 
 def command_exists(cmd) -> bool:
     return shutil.which(cmd) is not None
 
 
+def write_if_changed(filepath, content):
+    """Atomically writes `content` (str or bytes), returns False if the file already had it"""
+    mode = 'b' if isinstance(content, bytes) else ''
+    if os.path.isfile(filepath):
+        with open(filepath, 'r' + mode) as f:
+            if f.read() == content:
+                return False
+    tmp_filepath = f'{filepath}.tmp'
+    with open(tmp_filepath, 'w' + mode) as f:
+        f.write(content)
+    os.replace(tmp_filepath, filepath)
+    return True
+
+
 def download_asn_data(data_dir, filename):
     filepath = os.path.join(data_dir, filename)
 
@@ -16,6 +30,8 @@ def download_asn_data(data_dir, filename):
     if command_exists(cmds[0]) is False:
         raise click.ClickException(f'Could not find "{cmds[0]}" in the $PATH')
 
+    import subprocess
+
     completed = subprocess.run(cmds)
     assert completed.returncode == 0
 
@@ -25,6 +41,8 @@ def query_latest_bgp_data(collector: str):
     if command_exists(cmds[0]) is False:
         raise click.ClickException(f'Could not find "{cmds[0]}" in the $PATH')
 
+    import subprocess
+
     completed = subprocess.run(cmds, capture_output=True)
     if completed.returncode != 0:
         print(completed.stdout)
@@ -38,13 +56,102 @@ def query_latest_bgp_data(collector: str):
     raise ValueError(f"could not find RIB file from remote: {js}")
 
 
-def download_remote_data(url, data_dir, filename, quiet=False):
-    filepath = os.path.join(data_dir, filename)
+def query_bgp_updates(collector: str, ts_start: str, page_size=1000):
+    """Query the BGP update files of a collector starting from `ts_start`, oldest first
 
-    cmds = ['wget', url, '-O', filepath]
-    if quiet or os.environ.get("DISABLE_DOWNLOAD_PROGRESS") == '1':
-        cmds.append('-q')
+    The broker is queried page by page until a page shorter than `page_size`
+    comes back.
+    """
+    cmds = [
+        'bgpkit-broker', 'search', '-c', collector, '-d', 'updates',
+        '--ts-start', ts_start, '--page-size', str(page_size), '--json',
+    ]
     if command_exists(cmds[0]) is False:
         raise click.ClickException(f'Could not find "{cmds[0]}" in the $PATH')
-    completed = subprocess.run(cmds)
-    assert completed.returncode == 0
+
+    import subprocess
+
+    res = []
+    page = 1
+    while True:
+        completed = subprocess.run(cmds + ['--page', str(page)], capture_output=True)
+        if completed.returncode != 0:
+            print(completed.stdout)
+            print(completed.stderr)
+            raise ValueError(completed.returncode)
+        js = json.loads(completed.stdout)
+        if isinstance(js, dict):
+            js = js.get('data', [])
+        for info in js:
+            if info.get('data_type') == 'updates':
+                info['collector'] = collector
+                res.append(info)
+        if len(js) < page_size:
+            break
+        page += 1
+    return sorted(res, key=lambda info: info['ts_start'])
+
+
+class RemoteDataStream(io.RawIOBase):
+    """Reads a remote file while saving every byte read into `data_dir`
+
+    The file is written as `<filename>.part`. Once the whole response has
+    been read, it is checked against the `Content-Length` of the response and
+    the `expected` size (see `download.verify_download`), then added to the
+    download cache and linked at `<filename>`. Closing raises `ValueError` if
+    a check fails; an aborted or rejected stream leaves nothing behind.
+    """
+
+    def __init__(self, url, data_dir, filename, **expected):
+        import hashlib
+        import urllib.request
+
+        self.url = url
+        self.data_dir = data_dir
+        self.filename = filename
+        self.expected = expected
+        self._part_filepath = os.path.join(data_dir, f'{filename}.part')
+        self._response = urllib.request.urlopen(url)
+        self._length = self._response.headers.get('Content-Length')
+        self._file = open(self._part_filepath, 'wb')
+        self._digest = hashlib.sha256()
+        self._size = 0
+        self._completed = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self._response.readinto(b)
+        if n:
+            self._file.write(memoryview(b)[:n])
+            self._digest.update(memoryview(b)[:n])
+            self._size += n
+        else:
+            self._completed = True
+        return n
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._response.close()
+            self._file.close()
+            if not self._completed:
+                os.remove(self._part_filepath)
+            elif self._length is not None and self._size != int(self._length):
+                os.remove(self._part_filepath)
+                raise ValueError(f'incomplete download of {self.url}: {self._size} of {self._length} bytes')
+            else:
+                from .download import add_downloaded_file
+
+                add_downloaded_file(
+                    self.url, self._part_filepath, self.data_dir, self.filename, self._digest.hexdigest(),
+                    self._response.headers.get('ETag'), self._response.headers.get('Last-Modified'),
+                    **self.expected)
+        finally:
+            super().close()
+
+
+def open_remote_data(url, data_dir, filename, **expected):
+    return io.BufferedReader(RemoteDataStream(url, data_dir, filename, **expected), buffer_size=1 << 20)
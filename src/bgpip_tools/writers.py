@@ -0,0 +1,179 @@
+import os
+import re
+import filecmp
+import hashlib
+import ipaddress
+
+from .ranges import format_address, format_prefix, ranges_to_prefixes
+
+WRITE_BUFFER_SIZE = 1 << 20
+# ipset names are limited to 31 characters
+IPSET_NAME_SIZE = 31
+# `swap` hands the parameters of the temporary set to the live one, so both are created with the same fixed
+# parameters, letting `create -exist` match the live set on every run
+IPSET_MAXELEM = 1 << 20
+
+
+def _set_name(name, version, suffix=''):
+    return f"{re.sub('[^0-9A-Za-z_]', '_', name)}_v{version}{suffix}"
+
+
+def _ipset_name(name, version, suffix=''):
+    """`_set_name` within `IPSET_NAME_SIZE`, long names are cut and given a short hash to stay distinct"""
+    set_name = _set_name(name, version, suffix)
+    if len(set_name) <= IPSET_NAME_SIZE:
+        return set_name
+    tail = f"_{hashlib.sha1(name.encode()).hexdigest()[:6]}_v{version}{suffix}"
+    return f"{re.sub('[^0-9A-Za-z_]', '_', name)[:IPSET_NAME_SIZE - len(tail)]}{tail}"
+
+
+def _iter_cidrs(version, ranges):
+    for network, length in ranges_to_prefixes(ranges, version):
+        yield format_prefix(version, network, length)
+
+
+def _format_range(version, start, end):
+    prefixes = ranges_to_prefixes([(start, end)], version)
+    network, length = next(prefixes)
+    if next(prefixes, None) is None:
+        return format_prefix(version, network, length)
+    return f'{format_address(version, start)}-{format_address(version, end)}'
+
+
+def _route_target(route_via):
+    """Returns `(gateway, device)` of a `--route-via` value, both None for blackhole routes"""
+    if not route_via:
+        return None, None
+    try:
+        return str(ipaddress.ip_address(route_via)), None
+    except ValueError:
+        return None, route_via
+
+
+def write_text(f, name, version, ranges, **options):
+    """One CIDR per line"""
+    for cidr in _iter_cidrs(version, ranges):
+        f.write(f'{cidr}\n')
+
+
+def write_nftables(f, name, version, ranges, **options):
+    """nftables interval set `<name>_v4|v6`, to be included in a table
+
+    Declaring a set again adds its elements to the existing ones, so the
+    including table has to be replaced as a whole (e.g. a file starting with
+    `destroy table` or `flush table`) for removed CIDRs to go away.
+    """
+    f.write(f'set {_set_name(name, version)} {{\n')
+    f.write(f'\ttype ipv{version}_addr\n')
+    f.write('\tflags interval\n')
+    if ranges:
+        f.write('\telements = {\n')
+        separator = '\t\t'
+        for start, end in ranges:
+            f.write(f'{separator}{_format_range(version, start, end)}')
+            separator = ',\n\t\t'
+        f.write('\n\t}\n')
+    f.write('}\n')
+
+
+def write_ipset(f, name, version, ranges, **options):
+    """`ipset restore` batch filling a temporary hash:net set swapped with `<name>_v4|v6`"""
+    set_name = _ipset_name(name, version)
+    tmp_set_name = _ipset_name(name, version, '_tmp')
+    create = f"hash:net family {'inet' if version == 4 else 'inet6'} maxelem {IPSET_MAXELEM}"
+    f.write(f'create {set_name} {create} -exist\n')
+    f.write(f'create {tmp_set_name} {create} -exist\n')
+    f.write(f'flush {tmp_set_name}\n')
+    count = 0
+    for cidr in _iter_cidrs(version, ranges):
+        count += 1
+        if count > IPSET_MAXELEM:
+            raise ValueError(f'{name} has more than {IPSET_MAXELEM} CIDRs, the maxelem of its ipset')
+        f.write(f'add {tmp_set_name} {cidr}\n')
+    f.write(f'swap {tmp_set_name} {set_name}\n')
+    f.write(f'destroy {tmp_set_name}\n')
+
+
+def write_bird(f, name, version, ranges, route_via=None, **options):
+    """BIRD static routes, to be included in a `protocol static` block"""
+    gateway, device = _route_target(route_via)
+    if gateway:
+        target = f'via {gateway}'
+    elif device:
+        target = f'via "{device}"'
+    else:
+        target = 'blackhole'
+    for cidr in _iter_cidrs(version, ranges):
+        f.write(f'route {cidr} {target};\n')
+
+
+def write_iproute2(f, name, version, ranges, route_via=None, **options):
+    """`ip -batch` routes"""
+    gateway, device = _route_target(route_via)
+    for cidr in _iter_cidrs(version, ranges):
+        if gateway:
+            f.write(f'route replace {cidr} via {gateway}\n')
+        elif device:
+            f.write(f'route replace {cidr} dev {device}\n')
+        else:
+            f.write(f'route replace blackhole {cidr}\n')
+
+
+# format -> (output directory, file extension, writer)
+OUTPUT_WRITERS = {
+    'text': ('cidrs', '.txt', write_text),
+    'nftables': ('nftables', '.nft', write_nftables),
+    'ipset': ('ipset', '.ipset', write_ipset),
+    'bird': ('bird', '.conf', write_bird),
+    'iproute2': ('iproute2', '.batch', write_iproute2),
+}
+# format -> set name of a target, names must stay distinct
+SET_NAMES = {
+    'nftables': _set_name,
+    'ipset': _ipset_name,
+}
+
+
+def _check_set_names(output_format, version, names):
+    set_names = {}
+    for name in names:
+        set_name = SET_NAMES[output_format](name, version)
+        if set_name in set_names:
+            raise ValueError(f'{output_format} set {set_name} of {name} is already the set of {set_names[set_name]}')
+        set_names[set_name] = name
+
+
+def remove_output(output_dir, output_format, version, names):
+    """Removes the files of targets of a family in an output format, yields the removed paths"""
+    directory, extension, _ = OUTPUT_WRITERS[output_format]
+    for name in names:
+        fp = os.path.join(output_dir, directory, f'v{version}', f'{name}{extension}')
+        if os.path.isfile(fp):
+            os.remove(fp)
+            yield fp
+
+
+def write_output(output_dir, output_format, version, range_map, **options):
+    """Writes every `{name: sorted merged ranges}` target of a family in an output format
+
+    Files are streamed into a temporary file which replaces
+    `<format dir>/v4|v6/<name><ext>` only if its content changed.
+    Yields `(name, filepath, changed)`, raises ValueError if two targets
+    would share a nftables or ipset set name.
+    """
+    directory, extension, writer = OUTPUT_WRITERS[output_format]
+    if output_format in SET_NAMES:
+        _check_set_names(output_format, version, range_map)
+    family_output_dir = os.path.join(output_dir, directory, f'v{version}')
+    os.makedirs(family_output_dir, exist_ok=True)
+    for name, ranges in range_map.items():
+        fp = os.path.join(family_output_dir, f'{name}{extension}')
+        tmp_fp = f'{fp}.tmp'
+        with open(tmp_fp, 'w', buffering=WRITE_BUFFER_SIZE) as f:
+            writer(f, name, version, ranges, **options)
+        if os.path.isfile(fp) and filecmp.cmp(tmp_fp, fp, shallow=False):
+            os.remove(tmp_fp)
+            yield name, fp, False
+        else:
+            os.replace(tmp_fp, fp)
+            yield name, fp, True
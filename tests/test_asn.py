@@ -0,0 +1,53 @@
+import random
+
+from bgpip_tools.asn import ASNClassifier, ASNFilterGroup, load_asn_filters
+
+CONFIG = {
+    'cn': {'asn_filters': {'filters': [{'country': 'CN'}], 'excludes': [4134]}},
+    'cn.telecom': {'asn_filters': {
+        'filters': [
+            {'country': 'CN', 'regexp': 'telecom'},
+            {'country': 'CN', 'regexp': '^chinanet'},
+            {'country': 'HK', 'regexp': 'telecom|pccw'},
+        ],
+        'includes': [64512],
+    }},
+    'cloud': {'asn_filters': {'filters': [{'regexp': 'cloud'}, {'regexp': r'(\w)\1-net'}, {'regexp': '(?i)cdn'}]}},
+    'not-cn': {'asn_filters': {'filters': [{'country': '!CN', 'regexp': 'telecom'}, {'country': '!US'}]}},
+    'any': {'asn_filters': {'filters': [{'regexp': 'cloud'}, {}], 'excludes': [64512]}},
+    'none': {},
+}
+
+COUNTRIES = ['CN', 'HK', 'US', 'DE']
+WORDS = ['telecom', 'ChinaNet', 'chinanet', 'cloud', 'CLOUD', 'pccw', 'aa-net', 'ab-net', 'cdn', 'backbone']
+
+
+def _records(rnd, count):
+    for i in range(count):
+        asn = rnd.choice([4134, 64512, 64513]) if i % 10 == 0 else rnd.randrange(1, 1 << 32)
+        name = ' '.join(rnd.sample(WORDS, rnd.randrange(1, 4)))
+        yield {'asn': asn, 'name': name, 'country': rnd.choice(COUNTRIES)}
+
+
+def test_classifier_matches_filter_groups():
+    filter_groups = load_asn_filters(CONFIG)
+    assert list(filter_groups) == ['cn', 'cn.telecom', 'cloud', 'not-cn', 'any']
+    classifier = ASNClassifier(filter_groups)
+    assert classifier.names == list(filter_groups)
+    matched = {name: 0 for name in filter_groups}
+    for data in _records(random.Random(0), 5000):
+        expected = {name for name, group in filter_groups.items() if group.match_dict(data)}
+        assert classifier.classify(data) == expected, data
+        for name in expected:
+            matched[name] += 1
+    # every group matches some records but not all of them
+    assert all(0 < v < 5000 for v in matched.values()), matched
+
+
+def test_classifier_overrides():
+    classifier = ASNClassifier({
+        'a': ASNFilterGroup.from_config({'filters': [{'country': 'CN'}], 'excludes': [1], 'includes': [2]}),
+    })
+    assert classifier.classify({'asn': 1, 'name': 'x', 'country': 'CN'}) == set()
+    assert classifier.classify({'asn': 2, 'name': 'x', 'country': 'US'}) == {'a'}
+    assert classifier.classify({'asn': 3, 'name': 'x', 'country': 'CN'}) == {'a'}
@@ -0,0 +1,75 @@
+import os
+import json
+import random
+
+import pytest
+
+from bgpip_tools.asnstore import ASNStore, get_asn_store_path
+from bgpip_tools.data import load_asn_store
+
+RECORDS = [
+    {'asn': 4134, 'name': 'CHINANET-BACKBONE', 'country': 'CN'},
+    {'asn': 4294967295, 'name': 'Ünïcode AS', 'country': 'DE'},
+    {'asn': 13335, 'name': 'CLOUDFLARENET', 'country': 'US'},
+    {'asn': 23456, 'name': '', 'country': None},
+    {'asn': 4809, 'name': 'CHINATELECOM-CN2', 'country': 'CN'},
+]
+
+
+def _write_jsonl(filepath, records):
+    with open(filepath, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n\n')
+
+
+def test_lookup():
+    store = ASNStore.from_records(RECORDS)
+    assert len(store) == 5
+    assert list(store.iter_records()) == RECORDS
+    assert store.country_codes == [None, 'CN', 'DE', 'US']
+    for i, record in enumerate(RECORDS):
+        assert store.find(record['asn']) == i
+        assert store.get(record['asn']) == record
+        assert record['asn'] in store
+    assert store.get(1) is None
+    assert 0 not in store
+
+
+def test_save_and_load(tmp_path):
+    rnd = random.Random(0)
+    records = [
+        {'asn': asn, 'name': f'AS{asn}', 'country': rnd.choice(['CN', 'US', None])}
+        for asn in rnd.sample(range(1 << 32), 3000)
+    ]
+    jsonl_fp = str(tmp_path / 'asn.jsonl')
+    _write_jsonl(jsonl_fp, records)
+    store_fp = get_asn_store_path(jsonl_fp)
+    ASNStore.from_jsonl(jsonl_fp).save(store_fp)
+    assert sorted(os.listdir(tmp_path)) == ['asn.jsonl', 'asn.jsonl.store']
+
+    store = ASNStore.load(store_fp)
+    assert list(store.iter_records()) == records
+    for record in rnd.sample(records, 200):
+        assert store.get(record['asn']) == record
+    asns = {v['asn'] for v in records}
+    assert all(store.find(asn) is None for asn in range(1000) if asn not in asns)
+
+    with open(store_fp, 'r+b') as f:
+        f.write(b'XXXX')
+    with pytest.raises(ValueError, match='unsupported asn store'):
+        ASNStore.load(store_fp)
+
+
+def test_store_is_rebuilt_when_snapshot_changes(tmp_path):
+    jsonl_fp = str(tmp_path / 'asn.jsonl')
+    _write_jsonl(jsonl_fp, RECORDS[:2])
+    assert list(load_asn_store(jsonl_fp).iter_records()) == RECORDS[:2]
+    assert os.path.isfile(get_asn_store_path(jsonl_fp))
+
+    _write_jsonl(jsonl_fp, RECORDS)
+    store_mtime = os.path.getmtime(get_asn_store_path(jsonl_fp))
+    os.utime(jsonl_fp, (store_mtime + 1, store_mtime + 1))
+    assert list(load_asn_store(jsonl_fp).iter_records()) == RECORDS
+
+    with pytest.raises(FileNotFoundError):
+        load_asn_store(str(tmp_path / 'missing.jsonl'))
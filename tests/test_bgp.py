@@ -0,0 +1,56 @@
+import functools
+import threading
+
+import pytest
+
+from benchmarks.synthetic import SyntheticRIB
+from bgpip_tools import bgp, reader
+from bgpip_tools.mrt import read_rib_origins, split_mrt_file
+from bgpip_tools.origin import OriginTable
+
+
+def _read_rib_failing(filepath, counters=None):
+    raise ValueError(f'corrupt chunk {filepath}')
+
+
+@pytest.fixture
+def rib_file(tmp_path, monkeypatch):
+    filepath = str(tmp_path / 'rib.mrt')
+    SyntheticRIB(range(64600, 64700), prefixes=500, peers=3).write_mrt(filepath)
+    monkeypatch.setattr(bgp, 'split_mrt_file', functools.partial(split_mrt_file, chunk_records=50))
+    return filepath
+
+
+def test_decode_origin_table_in_chunks(rib_file):
+    table = bgp.decode_origin_table(rib_file, jobs=2, reader='mrt')
+    assert list(table.iter_rows()) == list(OriginTable.from_pairs(read_rib_origins(rib_file)).iter_rows())
+
+
+def test_decode_origin_table_raises_on_failing_chunk(rib_file, monkeypatch):
+    # workers are forked, they see the patched readers
+    monkeypatch.setitem(reader.RIB_READERS, 'failing', _read_rib_failing)
+    errors = []
+
+    def _decode():
+        try:
+            bgp.decode_origin_table(rib_file, jobs=2, reader='failing')
+        except ValueError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=_decode, daemon=True)
+    thread.start()
+    thread.join(60)
+    assert not thread.is_alive(), 'decoding hangs on a failing chunk'
+    assert errors and 'corrupt chunk' in str(errors[0])
+
+
+def test_missing_pybgpstream_names_the_extra(monkeypatch):
+    import sys
+
+    import click
+
+    from bgpip_tools.data import get_stream_bgp
+
+    monkeypatch.setitem(sys.modules, 'pybgpstream', None)
+    with pytest.raises(click.ClickException, match=r'\[bgpstream\] extra'):
+        next(get_stream_bgp('rib.bz2'))
@@ -0,0 +1,62 @@
+import os
+import sys
+import subprocess
+
+from bgpip_tools.config import DEFAULT_OUTPUT_FORMAT, DEFAULT_RIB_READER, OUTPUT_FORMATS, RIB_READER_NAMES
+from bgpip_tools.reader import RIB_READERS
+from bgpip_tools.writers import OUTPUT_WRITERS
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+# modules the light commands must not load
+HEAVY_MODULES = ['bgpip_tools.reader', 'bgpip_tools.writers', 'bgpip_tools.origin', 'bgpip_tools.bgp', 'tqdm']
+
+
+def _loaded_modules(*args):
+    code = (
+        'import sys\n'
+        'from bgpip_tools.__main__ import cli\n'
+        'try:\n'
+        f'    cli({list(args)!r})\n'
+        'except SystemExit:\n'
+        '    pass\n'
+        'print(" ".join(sys.modules))\n'
+    )
+    completed = subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True, check=True,
+        env=dict(os.environ, PYTHONPATH=SRC_DIR))
+    return set(completed.stdout.splitlines()[-1].split())
+
+
+def test_help_does_not_load_heavy_modules():
+    for args in (['--help'], ['bgp', 'generate', '--help'], ['serve', '--help']):
+        loaded = _loaded_modules(*args)
+        assert not loaded & set(HEAVY_MODULES), args
+
+
+def test_cli_choices_match_backends():
+    assert set(RIB_READER_NAMES) == set(RIB_READERS)
+    assert DEFAULT_RIB_READER in RIB_READERS
+    assert set(OUTPUT_FORMATS) == set(OUTPUT_WRITERS)
+    assert DEFAULT_OUTPUT_FORMAT in OUTPUT_WRITERS
+
+
+def test_target_rejects_output_and_config_dir(tmp_path):
+    from click.testing import CliRunner
+
+    from bgpip_tools.__main__ import cli
+
+    target = ['bgp', 'generate', '-t', str(tmp_path), str(tmp_path / 'out')]
+    result = CliRunner().invoke(cli, target + ['-o', str(tmp_path / 'dist')])
+    assert result.exit_code == 2 and '--output-dir could not be used with --target' in result.output
+    result = CliRunner().invoke(cli, ['-c', str(tmp_path)] + target)
+    assert result.exit_code == 2 and '--config-dir could not be used with --target' in result.output
+
+
+def test_pipeline_rejects_reader_and_jobs():
+    from click.testing import CliRunner
+
+    from bgpip_tools.__main__ import cli
+
+    for option in (['-r', 'mrt'], ['-j', '2']):
+        result = CliRunner().invoke(cli, ['bgp', 'generate', '-P'] + option)
+        assert result.exit_code == 2 and 'could not be used with --pipeline' in result.output
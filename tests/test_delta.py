@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from bgpip_tools.delta import DEFAULT_DELTA_DIR, compute_deltas, write_deltas
+from bgpip_tools.ranges import merge_ranges, parse_prefix, prefix_to_range, ranges_to_cidrs
+
+
+def _ranges(*cidrs):
+    return merge_ranges([prefix_to_range(*parse_prefix(cidr)) for cidr in cidrs])
+
+
+def _apply(output_dir, name, cidrs):
+    """Applies the delta lines of `name` like element deletions and additions of a set"""
+    entries = set(cidrs)
+    with open(os.path.join(output_dir, DEFAULT_DELTA_DIR, 'v4', f'{name}.txt')) as f:
+        for line in f.read().splitlines():
+            if line[0] == '-':
+                entries.remove(line[1:])
+            else:
+                assert line[1:] not in entries
+                entries.add(line[1:])
+    return entries
+
+
+@pytest.mark.parametrize('old, new', [
+    # shrink
+    (['10.0.0.0/23'], ['10.0.0.0/24']),
+    # split
+    (['10.0.0.0/23'], ['10.0.0.0/24', '10.0.1.128/25']),
+    # merge
+    (['10.0.0.0/24', '10.0.2.0/24'], ['10.0.0.0/23', '10.0.2.0/24']),
+    # grow past a boundary
+    (['10.0.1.0/24'], ['10.0.1.0/24', '10.0.2.0/23']),
+])
+def test_deltas_apply_to_previous_list(tmp_path, old, new):
+    previous = {'cn': _ranges(*old), 'gone': _ranges('192.0.2.0/24')}
+    current = {'cn': _ranges(*new), 'unchanged': _ranges('198.51.100.0/24')}
+    previous['unchanged'] = current['unchanged']
+    deltas = compute_deltas(previous, current, 4)
+    assert set(deltas) == {'cn', 'gone'}
+
+    summary = write_deltas(str(tmp_path), 4, deltas)
+    old_cidrs = ranges_to_cidrs({4: previous['cn']})
+    assert _apply(str(tmp_path), 'cn', old_cidrs) == set(ranges_to_cidrs({4: current['cn']}))
+    assert _apply(str(tmp_path), 'gone', ['192.0.2.0/24']) == set()
+    assert summary['gone'] == {'added': 0, 'removed': 1, 'added_addresses': 0, 'removed_addresses': 256}
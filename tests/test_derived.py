@@ -0,0 +1,62 @@
+import pytest
+
+from bgpip_tools.derived import evaluate_derived_targets, load_derived_targets
+from bgpip_tools.ranges import cidrs_to_ranges
+
+RANGE_MAP = {
+    'cn': cidrs_to_ranges(['1.0.0.0/8', '2.0.0.0/8', '2400::/16']),
+    'cn.google': cidrs_to_ranges(['1.1.0.0/16', '2400:1::/32']),
+    'cn.cernet': cidrs_to_ranges(['2.2.0.0/16', '3.0.0.0/8']),
+}
+
+
+def test_nested_expressions():
+    config = {
+        'cn': {'asn_filters': ['country:CN']},
+        'cn.rest': {'derived': {'difference': ['cn', {'union': ['cn.google', 'cn.cernet']}]}},
+        'cn.both': {'derived': {'intersection': ['cn', {'union': ['cn.google', 'cn.cernet']}]}},
+        'cn.all': {'derived': {'union': ['cn.rest', 'cn.both']}},
+    }
+    derived = load_derived_targets(config)
+    assert list(derived) == ['cn.rest', 'cn.both', 'cn.all']
+    result = evaluate_derived_targets(RANGE_MAP, derived)
+    assert result['cn.rest'] == cidrs_to_ranges([
+        '1.0.0.0/16', '1.2.0.0/15', '1.4.0.0/14', '1.8.0.0/13', '1.16.0.0/12', '1.32.0.0/11', '1.64.0.0/10',
+        '1.128.0.0/9', '2.0.0.0/15', '2.3.0.0/16', '2.4.0.0/14', '2.8.0.0/13', '2.16.0.0/12', '2.32.0.0/11',
+        '2.64.0.0/10', '2.128.0.0/9', '2400::/32', '2400:2::/31', '2400:4::/30', '2400:8::/29', '2400:10::/28',
+        '2400:20::/27', '2400:40::/26', '2400:80::/25', '2400:100::/24', '2400:200::/23', '2400:400::/22',
+        '2400:800::/21', '2400:1000::/20', '2400:2000::/19', '2400:4000::/18', '2400:8000::/17',
+    ])
+    assert result['cn.both'] == cidrs_to_ranges(['1.1.0.0/16', '2.2.0.0/16', '2400:1::/32'])
+    assert result['cn.all'] == RANGE_MAP['cn']
+
+
+def test_named_targets_are_reused():
+    derived = {'x': {'intersection': ['cn', 'cn.cernet']}, 'y': 'x', 'z': {'difference': ['x', 'y']}}
+    result = evaluate_derived_targets(RANGE_MAP, derived)
+    assert result['x'] == result['y'] == cidrs_to_ranges(['2.2.0.0/16'])
+    assert result['x'] is result['y']
+    assert result['z'] == {4: [], 6: []}
+
+
+def test_invalid_expressions():
+    with pytest.raises(ValueError, match='both asn_filters and derived'):
+        load_derived_targets({'x': {'asn_filters': ['asn:1'], 'derived': 'cn'}})
+    with pytest.raises(ValueError, match='unknown operation xor'):
+        load_derived_targets({'x': {'derived': {'xor': ['cn', 'cn.google']}}})
+    with pytest.raises(ValueError, match='requires a list'):
+        load_derived_targets({'x': {'derived': {'union': []}}})
+    with pytest.raises(ValueError, match='single operation'):
+        load_derived_targets({'x': {'derived': {'union': ['cn'], 'difference': ['cn']}}})
+
+
+def test_unknown_and_circular_targets():
+    with pytest.raises(KeyError, match='unknown target cn.missing'):
+        evaluate_derived_targets(RANGE_MAP, {'x': {'union': ['cn', 'cn.missing']}})
+    with pytest.raises(ValueError, match='circular derived target'):
+        evaluate_derived_targets(RANGE_MAP, {
+            'a': {'union': ['cn', 'b']},
+            'b': {'difference': ['cn', {'intersection': ['a', 'cn.google']}]},
+        })
+    with pytest.raises(ValueError, match='circular derived target x'):
+        evaluate_derived_targets(RANGE_MAP, {'x': 'x'})
@@ -0,0 +1,155 @@
+import os
+import threading
+import multiprocessing
+import http.server
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from bgpip_tools.download import DOWNLOAD_BLOCK_SIZE, DOWNLOAD_CACHE_DIRNAME, DownloadCache, download_remote_data
+from bgpip_tools.utils import open_remote_data
+
+CONTENT = bytes(range(256)) * (3 * DOWNLOAD_BLOCK_SIZE // 256)
+ETAG = '"content-v1"'
+# bytes sent by a truncated response
+TRUNCATED_SIZE = DOWNLOAD_BLOCK_SIZE + DOWNLOAD_BLOCK_SIZE // 2
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Serves `CONTENT` with ETag and Range support, truncating the first response if `truncate` is set"""
+
+    truncate = False
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        cls = type(self)
+        cls.requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        offset = 0
+        if self.headers.get('Range') and self.headers.get('If-Range') == ETAG:
+            offset = int(self.headers['Range'][len('bytes='):-1])
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {offset}-{len(CONTENT) - 1}/{len(CONTENT)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(CONTENT) - offset))
+        self.send_header('ETag', ETAG)
+        self.end_headers()
+        body = CONTENT[offset:]
+        if cls.truncate:
+            cls.truncate = False
+            body = body[:TRUNCATED_SIZE]
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    Handler.truncate = False
+    Handler.requests = []
+    httpd = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}/rib.bz2'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _read(filepath):
+    with open(filepath, 'rb') as f:
+        return f.read()
+
+
+def test_download_and_revalidate(server, tmp_path):
+    filepath = download_remote_data(server, str(tmp_path), 'rib.bz2', quiet=True, size=len(CONTENT))
+    assert _read(filepath) == CONTENT
+    assert os.path.isdir(tmp_path / DOWNLOAD_CACHE_DIRNAME)
+
+    os.remove(filepath)
+    filepath = download_remote_data(server, str(tmp_path), 'rib.bz2', quiet=True, size=len(CONTENT))
+    assert _read(filepath) == CONTENT
+    # answered 304 from the ETag of the cache entry
+    assert Handler.requests[-1].get('If-None-Match') == ETAG
+
+
+def test_resume_interrupted_download(server, tmp_path):
+    Handler.truncate = True
+    with pytest.raises(ValueError, match='incomplete download'):
+        download_remote_data(server, str(tmp_path), 'rib.bz2', quiet=True)
+    assert not os.path.exists(tmp_path / 'rib.bz2')
+
+    filepath = download_remote_data(server, str(tmp_path), 'rib.bz2', quiet=True, size=len(CONTENT))
+    assert _read(filepath) == CONTENT
+    assert Handler.requests[-1]['Range'] == f'bytes={TRUNCATED_SIZE}-'
+
+
+def test_reject_size_mismatch(server, tmp_path):
+    with pytest.raises(ValueError, match='size mismatch'):
+        download_remote_data(server, str(tmp_path), 'rib.bz2', quiet=True, size=len(CONTENT) + 1)
+    assert not os.path.exists(tmp_path / 'rib.bz2')
+    with pytest.raises(ValueError, match='size mismatch'):
+        download_remote_data(server, str(tmp_path), 'rib.bz2', quiet=True, rough_size=len(CONTENT) * 2)
+    assert not os.path.exists(tmp_path / 'rib.bz2')
+
+
+def test_evict_keeps_objects_being_added(tmp_path):
+    cache = DownloadCache(str(tmp_path / DOWNLOAD_CACHE_DIRNAME))
+
+    def _add(i):
+        part_filepath = tmp_path / f'{i}.part'
+        part_filepath.write_bytes(b'%d' % i)
+        entry = cache.add(f'http://127.0.0.1/{i}', str(part_filepath), f'{i:064x}')
+        cache.evict()
+        return os.path.isfile(cache.get_object_path(entry['sha256']))
+
+    with ThreadPoolExecutor(8) as pool:
+        assert all(pool.map(_add, range(200)))
+
+
+def _add_from_process(cache_dir, worker):
+    cache = DownloadCache(cache_dir)
+    for i in range(50):
+        part_filepath = os.path.join(cache_dir, f'{worker}.{i}.part')
+        with open(part_filepath, 'wb') as f:
+            f.write(b'%d.%d' % (worker, i))
+        entry = cache.add(f'http://127.0.0.1/{worker}/{i}', part_filepath, f'{worker:032x}{i:032x}')
+        cache.evict()
+        if not os.path.isfile(cache.get_object_path(entry['sha256'])):
+            return False
+    return True
+
+
+def test_cache_shared_by_processes(tmp_path):
+    cache_dir = str(tmp_path / DOWNLOAD_CACHE_DIRNAME)
+    os.makedirs(cache_dir)
+    with multiprocessing.Pool(4) as pool:
+        assert all(pool.starmap(_add_from_process, [(cache_dir, worker) for worker in range(4)]))
+    index = DownloadCache(cache_dir)
+    assert all(index.lookup(f'http://127.0.0.1/{worker}/{i}') for worker in range(4) for i in range(50))
+
+
+def _stream(url, data_dir, **expected):
+    with open_remote_data(url, data_dir, 'rib.bz2', **expected) as stream:
+        return stream.read()
+
+
+def test_stream_adds_to_cache(server, tmp_path):
+    assert _stream(server, str(tmp_path), size=len(CONTENT)) == CONTENT
+    assert _read(tmp_path / 'rib.bz2') == CONTENT
+    download_remote_data(server, str(tmp_path), 'rib.bz2', quiet=True, size=len(CONTENT))
+    assert Handler.requests[-1].get('If-None-Match') == ETAG
+
+
+def test_stream_rejects_truncated_or_mismatched(server, tmp_path):
+    Handler.truncate = True
+    with pytest.raises(ValueError, match='incomplete download'):
+        _stream(server, str(tmp_path))
+    assert not os.path.exists(tmp_path / 'rib.bz2')
+    with pytest.raises(ValueError, match='size mismatch'):
+        _stream(server, str(tmp_path), size=len(CONTENT) + 1)
+    assert not os.listdir(tmp_path)
@@ -0,0 +1,37 @@
+import socket
+import threading
+
+from bgpip_tools.lookup import LookupIndex, serve_lookup
+from bgpip_tools.ranges import parse_prefix, prefix_to_range
+
+RANGE_MAPS = {
+    'cn': {4: [prefix_to_range(*parse_prefix('1.2.4.0/24'))], 6: [prefix_to_range(*parse_prefix('2400:3200::/32'))]},
+    'cn.telecom': {4: [prefix_to_range(*parse_prefix('1.2.4.0/25'))]},
+}
+
+
+def test_lookup_lines_answers_every_line():
+    index = LookupIndex.from_range_maps(RANGE_MAPS)
+    lines = ['1.2.4.8\n', '\n', '  \n', 'nope\n', '2400:3200::1\n']
+    assert ''.join(index.lookup_lines(lines)) == (
+        '1.2.4.8\tcn,cn.telecom\n\t!invalid\n\t!invalid\nnope\t!invalid\n2400:3200::1\tcn\n')
+    assert list(index.lookup_lines(['\n'], chunk_size=1)) == ['\t!invalid\n']
+
+
+def test_socket_answers_blank_lines(tmp_path):
+    socket_path = str(tmp_path / 'lookup.sock')
+    index = LookupIndex.from_range_maps(RANGE_MAPS)
+    threading.Thread(target=serve_lookup, args=(index, socket_path), daemon=True).start()
+    for _ in range(100):
+        try:
+            client = socket.socket(socket.AF_UNIX)
+            client.connect(socket_path)
+            break
+        except (FileNotFoundError, ConnectionRefusedError):
+            threading.Event().wait(0.05)
+    client.settimeout(5)
+    with client, client.makefile('rw') as f:
+        for line, expected in (('\n', '\t!invalid\n'), ('1.2.4.200\n', '1.2.4.200\tcn\n')):
+            f.write(line)
+            f.flush()
+            assert f.readline() == expected
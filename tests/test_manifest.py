@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from bgpip_tools.manifest import (
+    MANIFEST_FILENAME, get_changed_targets, get_snapshot_identity, get_target_fingerprints, load_manifest,
+    write_manifest,
+)
+
+CONFIG = {
+    'cn': {'asn_filters': {'filters': [{'country': 'CN'}]}},
+    'cn.telecom': {'asn_filters': {'filters': [{'country': 'CN', 'regexp': 'telecom'}]}},
+    'hk': {'asn_filters': {'filters': [{'country': 'HK'}]}},
+    'cn.rest': {'derived': {'difference': ['cn', 'cn.telecom']}},
+    'cn.rest.all': {'derived': {'union': ['cn.rest', 'hk']}},
+}
+DERIVED = {k: v['derived'] for k, v in CONFIG.items() if 'derived' in v}
+ASNS = {'cn': [4134, 4809, 4538], 'cn.telecom': [4809, 4134], 'hk': [4760]}
+INPUTS = {'snapshot': 'rib.bz2:1:1', 'bogons': 'v1', 'outputs': 'text'}
+
+
+def _changed(config=CONFIG, asns=ASNS, derived=DERIVED, inputs=INPUTS):
+    previous = get_target_fingerprints(CONFIG, ASNS, DERIVED, INPUTS)
+    return get_changed_targets(previous, get_target_fingerprints(config, asns, derived, inputs))
+
+
+def test_unchanged_inputs():
+    fingerprints = get_target_fingerprints(CONFIG, ASNS, DERIVED, INPUTS)
+    assert list(fingerprints) == list(CONFIG)
+    assert fingerprints['cn'].keys() == {'snapshot', 'bogons', 'outputs', 'config', 'asns'}
+    assert _changed() == {}
+    # the order of the resolved ASNs does not matter
+    assert _changed(asns=dict(ASNS, cn=sorted(ASNS['cn']))) == {}
+
+
+def test_changed_asns_propagate_to_derived_lists():
+    assert _changed(asns=dict(ASNS, **{'cn.telecom': [4134]})) == {
+        'cn.telecom': ['asns'], 'cn.rest': ['asns'], 'cn.rest.all': ['asns']}
+    assert _changed(asns=dict(ASNS, hk=[4760, 9304])) == {'hk': ['asns'], 'cn.rest.all': ['asns']}
+
+
+def test_changed_config_and_inputs():
+    config = dict(CONFIG, hk={'asn_filters': {'filters': [{'country': 'HK'}], 'excludes': [9304]}})
+    # derived lists cover the whole fingerprints of the lists they refer to
+    assert _changed(config=config) == {'hk': ['config'], 'cn.rest.all': ['asns']}
+    derived = dict(DERIVED, **{'cn.rest': {'difference': ['cn', 'hk']}})
+    config = dict(CONFIG, **{'cn.rest': {'derived': derived['cn.rest']}})
+    assert _changed(config=config, derived=derived) == {'cn.rest': ['asns', 'config'], 'cn.rest.all': ['asns']}
+    assert _changed(inputs=dict(INPUTS, snapshot='rib.bz2:2:2')) == {
+        'cn': ['snapshot'], 'cn.telecom': ['snapshot'], 'hk': ['snapshot'],
+        'cn.rest': ['asns', 'snapshot'], 'cn.rest.all': ['asns', 'snapshot'],
+    }
+
+    config = dict(CONFIG, mo={'asn_filters': {'filters': [{'country': 'MO'}]}})
+    assert _changed(config=config, asns=dict(ASNS, mo=[4609])) == {'mo': ['new']}
+
+
+def test_unknown_and_circular_references():
+    with pytest.raises(KeyError, match='unknown target tw'):
+        get_target_fingerprints(CONFIG, ASNS, {'x': {'union': ['cn', 'tw']}}, INPUTS)
+    with pytest.raises(ValueError, match='circular derived target'):
+        get_target_fingerprints(CONFIG, ASNS, {'x': {'union': ['cn', 'y']}, 'y': 'x'}, INPUTS)
+
+
+def test_snapshot_identity(tmp_path):
+    fp = tmp_path / 'rib.20261018.0000.bz2'
+    fp.write_bytes(b'rib')
+    identity = get_snapshot_identity([{'filepath': str(fp)}])
+    assert identity.startswith('rib.20261018.0000.bz2:3:')
+    fp.write_bytes(b'rib2')
+    assert get_snapshot_identity([{'filepath': str(fp)}]) != identity
+
+
+def test_manifest_round_trip(tmp_path):
+    assert load_manifest(str(tmp_path)) == {}
+    families = {'ipv4': get_target_fingerprints(CONFIG, ASNS, DERIVED, INPUTS)}
+    write_manifest(str(tmp_path), families)
+    assert load_manifest(str(tmp_path)) == families
+
+    manifest_fp = tmp_path / MANIFEST_FILENAME
+    manifest = json.loads(manifest_fp.read_text())
+    manifest_fp.write_text(json.dumps(dict(manifest, version=0)))
+    assert load_manifest(str(tmp_path)) == {}
+    manifest_fp.write_text('{')
+    assert load_manifest(str(tmp_path)) == {}
@@ -0,0 +1,98 @@
+import bz2
+import struct
+import collections
+
+import pytest
+
+from bgpip_tools.mrt import (
+    MRT_HEADER, MRT_SUBTYPE_PEER_INDEX_TABLE, MRT_SUBTYPE_RIB_IPV4_UNICAST, MRT_SUBTYPE_RIB_IPV4_UNICAST_ADDPATH,
+    MRT_SUBTYPE_RIB_IPV6_UNICAST, MRT_TYPE_TABLE_DUMP_V2, iter_mrt_records, iter_rib_origins, read_rib_origins,
+    read_rib_stream, split_mrt_file,
+)
+
+AS_SET = 1
+AS_SEQUENCE = 2
+
+
+def _record(subtype, body):
+    return MRT_HEADER.pack(0, MRT_TYPE_TABLE_DUMP_V2, subtype, len(body)) + body
+
+
+def _attribute(attr_type, value, extended=False):
+    if extended:
+        return struct.pack('>BBH', 0x50, attr_type, len(value)) + value
+    return struct.pack('>BBB', 0x40, attr_type, len(value)) + value
+
+
+def _as_path(*segments, extended=False):
+    value = b''.join(struct.pack(f'>BB{len(asns)}I', kind, len(asns), *asns) for kind, asns in segments)
+    # ORIGIN first, the AS_PATH is searched among the attributes
+    return _attribute(1, b'\x00') + _attribute(2, value, extended)
+
+
+def _rib(subtype, sequence, prefix_bytes, length, paths, path_id=False):
+    body = struct.pack('>IB', sequence, length) + prefix_bytes + struct.pack('>H', len(paths))
+    for peer, attributes in enumerate(paths):
+        body += struct.pack('>H', peer)
+        if path_id:
+            body += struct.pack('>I', 1)
+        body += struct.pack('>IH', 0, len(attributes)) + attributes
+    return _record(subtype, body)
+
+
+PEER_INDEX = _record(MRT_SUBTYPE_PEER_INDEX_TABLE, bytes(4) + struct.pack('>HH', 0, 0))
+RECORDS = [
+    # 1.2.4.0/22 seen with a 4-byte origin and twice through the same origin
+    _rib(MRT_SUBTYPE_RIB_IPV4_UNICAST, 0, bytes([1, 2, 4]), 22, [
+        _as_path((AS_SEQUENCE, [64512, 4200000000])),
+        _as_path((AS_SEQUENCE, [64513, 174, 4200000000])),
+    ]),
+    # the origin of an AS_SET is its last ASN, like the textual AS path
+    _rib(MRT_SUBTYPE_RIB_IPV4_UNICAST, 1, bytes([10]), 8, [
+        _as_path((AS_SEQUENCE, [64512]), (AS_SET, [65001, 65002]), extended=True),
+    ]),
+    # default routes are skipped
+    _rib(MRT_SUBTYPE_RIB_IPV4_UNICAST, 2, b'', 0, [_as_path((AS_SEQUENCE, [64512]))]),
+    _rib(MRT_SUBTYPE_RIB_IPV4_UNICAST_ADDPATH, 3, bytes([192, 0, 2, 128]), 25, [
+        _as_path((AS_SEQUENCE, [64512, 64999])),
+    ], path_id=True),
+    _rib(MRT_SUBTYPE_RIB_IPV6_UNICAST, 4, bytes.fromhex('24003200'), 32, [
+        _as_path((AS_SEQUENCE, [64512, 24400])),
+    ]),
+]
+EXPECTED = [
+    ('1.2.4.0/22', 4200000000), ('10.0.0.0/8', 65002), ('192.0.2.128/25', 64999), ('2400:3200::/32', 24400),
+]
+
+
+def test_handcrafted_records():
+    counters = collections.Counter()
+    assert list(iter_rib_origins(PEER_INDEX + b''.join(RECORDS), counters)) == EXPECTED
+    # the entries of the default route are not counted
+    assert counters['elements'] == 5
+
+
+def test_read_files_and_streams(tmp_path):
+    data = PEER_INDEX + b''.join(RECORDS)
+    (tmp_path / 'rib.mrt').write_bytes(data)
+    (tmp_path / 'rib.bz2').write_bytes(bz2.compress(data))
+    assert list(read_rib_origins(str(tmp_path / 'rib.mrt'))) == EXPECTED
+    assert list(read_rib_origins(str(tmp_path / 'rib.bz2'))) == EXPECTED
+
+    (tmp_path / 'truncated.mrt').write_bytes(data[:-3])
+    with pytest.raises(ValueError, match='truncated'):
+        list(read_rib_origins(str(tmp_path / 'truncated.mrt')))
+    with open(tmp_path / 'truncated.mrt', 'rb') as f, pytest.raises(ValueError, match='truncated'):
+        list(read_rib_stream(f))
+
+
+def test_split_chunks_start_with_the_peer_index(tmp_path):
+    (tmp_path / 'rib.mrt').write_bytes(PEER_INDEX + b''.join(RECORDS))
+    chunks = list(split_mrt_file(str(tmp_path / 'rib.mrt'), str(tmp_path), chunk_records=2))
+    assert len(chunks) == 3
+    pairs = []
+    for chunk_fp in chunks:
+        with open(chunk_fp, 'rb') as f:
+            assert next(iter_mrt_records(f))[2] == PEER_INDEX
+        pairs.extend(read_rib_origins(chunk_fp))
+    assert pairs == EXPECTED
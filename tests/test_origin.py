@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from bgpip_tools.origin import (
+    _ROW_MEMORY, OriginTable, OriginTableBuilder, get_origin_table_path, merge_origin_tables,
+)
+
+PAIRS = [
+    ('1.2.4.0/24', 4134), ('1.2.4.0/24', 4134), ('1.2.4.0/24', 4809), ('1.0.0.0/8', 13335),
+    ('2400:3200::/32', 37963), ('2001:db8:ffff:ffff::/64', 4294967295), ('1.2.4.0/23', 4134),
+]
+
+
+def _random_pairs(rnd, count):
+    pairs = []
+    for _ in range(count):
+        if rnd.random() < 0.8:
+            prefix = f'10.{rnd.randrange(16)}.{rnd.randrange(256)}.0/24'
+        else:
+            prefix = f'2400:{rnd.randrange(1 << 16):x}::/32'
+        pairs.append((prefix, rnd.randrange(64500, 64600)))
+    return pairs
+
+
+def test_rows_are_sorted_and_unique():
+    table = OriginTable.from_pairs(PAIRS)
+    assert list(table.iter_pairs()) == [
+        ('1.0.0.0/8', 13335), ('1.2.4.0/23', 4134), ('1.2.4.0/24', 4134), ('1.2.4.0/24', 4809),
+        ('2001:db8:ffff:ffff::/64', 4294967295), ('2400:3200::/32', 37963),
+    ]
+    assert len(table) == 6
+    assert table.count_prefixes() == 5
+
+
+def test_dump_and_load_round_trip(tmp_path):
+    table = OriginTable.from_pairs(_random_pairs(random.Random(0), 5000))
+    fp = get_origin_table_path(str(tmp_path / 'rib.20261018.0000.bz2'))
+    table.save(fp)
+    loaded = OriginTable.load(fp)
+    assert list(loaded.iter_rows()) == list(table.iter_rows())
+
+    with open(fp, 'r+b') as f:
+        f.write(b'XXXX')
+    with pytest.raises(ValueError, match='unsupported origin table'):
+        OriginTable.load(fp)
+
+
+def test_merge_tables_counts_visibility():
+    a = OriginTable.from_pairs([('1.2.4.0/24', 4134), ('1.0.0.0/8', 13335), ('2400:3200::/32', 37963)])
+    b = OriginTable.from_pairs([('1.2.4.0/24', 4134), ('1.2.4.0/24', 4809), ('2400:3200::/32', 37963)])
+    merged, visibility = merge_origin_tables([a, b])
+    assert list(merged.iter_rows()) == list(OriginTable.from_pairs(
+        list(a.iter_pairs()) + list(b.iter_pairs())).iter_rows())
+    assert visibility == [
+        {'pairs': 3, 'prefixes': 3, 'exclusive_prefixes': 1},
+        {'pairs': 3, 'prefixes': 2, 'exclusive_prefixes': 0},
+    ]
+
+
+def test_builder_spills_within_memory_limit(tmp_path):
+    pairs = _random_pairs(random.Random(1), 20000)
+    expected = list(OriginTable.from_pairs(pairs).iter_rows())
+
+    # duplicates only: compaction keeps the buffers under the limit without spilling
+    builder = OriginTableBuilder(memory_limit=200 * _ROW_MEMORY[6], spill_dir=str(tmp_path))
+    builder.update(pairs[:10] * 100)
+    assert builder.spilled == 0
+    assert list(builder.build().iter_rows()) == list(OriginTable.from_pairs(pairs[:10]).iter_rows())
+
+    builder = OriginTableBuilder(memory_limit=1000 * _ROW_MEMORY[4], spill_dir=str(tmp_path))
+    builder.update(pairs)
+    assert builder.spilled > 1
+    assert len(list(tmp_path.glob('*.run'))) == builder.spilled
+    assert list(builder.build().iter_rows()) == expected
+    assert not list(tmp_path.glob('*.run'))
+
+    table = OriginTable.from_pairs(pairs, memory_limit=1000 * _ROW_MEMORY[4], spill_dir=str(tmp_path))
+    assert list(table.iter_rows()) == expected
+    assert not list(tmp_path.glob('*.run'))
+
+
+def test_builder_close_removes_runs(tmp_path):
+    builder = OriginTableBuilder(spill_dir=str(tmp_path))
+    builder.update(PAIRS)
+    builder.spill()
+    assert builder.spilled == 2
+    builder.close()
+    assert builder.spilled == 0
+    assert not list(tmp_path.iterdir())
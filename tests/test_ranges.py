@@ -0,0 +1,56 @@
+import random
+
+import netaddr
+
+from bgpip_tools.ranges import (
+    RangeMerger, aggregate_prefixes, cidrs_to_ranges, format_prefix, merge_ranges, parse_prefix, prefix_to_range,
+    ranges_to_cidrs, subtract_ranges,
+)
+
+
+def _random_cidrs(rnd, version, count):
+    """Random networks within a /12 (IPv4) or /36 (IPv6), so that many of them overlap or touch"""
+    bits = 32 if version == 4 else 128
+    base = (10 << 24) if version == 4 else (0x2400 << 112)
+    scope = bits - (12 if version == 4 else 36)
+    cidrs = []
+    for _ in range(count):
+        length = rnd.randint(bits - scope + 4, bits - scope + 12)
+        network = (base | rnd.getrandbits(scope)) >> (bits - length) << (bits - length)
+        cidrs.append(str(netaddr.IPNetwork((network, length), version=version)))
+    return cidrs
+
+
+def test_merging_matches_netaddr():
+    rnd = random.Random(0)
+    for version in (4, 6):
+        for _ in range(20):
+            cidrs = _random_cidrs(rnd, version, rnd.randint(1, 200))
+            expected = [str(v) for v in netaddr.cidr_merge(cidrs)]
+            ranges = [prefix_to_range(*parse_prefix(cidr)) for cidr in cidrs]
+            assert ranges_to_cidrs({version: merge_ranges(ranges)}) == expected
+
+            merger = RangeMerger()
+            for start, end in sorted(ranges)[::2] + sorted(ranges)[1::2]:
+                merger.add(start, end)
+            assert merger.get_ranges() == merge_ranges(ranges)
+            assert ranges_to_cidrs(cidrs_to_ranges(cidrs)) == expected
+
+
+def test_formatting_matches_netaddr():
+    for cidr in ('1.2.4.0/24', '0.0.0.0/8', '2400:3200::/32', '2001:db8:0:1::/64', '::ffff:0:0/96', '::/3'):
+        version, network, length = parse_prefix(cidr)
+        assert format_prefix(version, network, length) == str(netaddr.IPNetwork(cidr).cidr)
+
+
+def test_host_bits_are_cleared():
+    assert ranges_to_cidrs(aggregate_prefixes([parse_prefix('10.0.0.1/8'), parse_prefix('11.0.0.0/8')])) == [
+        '10.0.0.0/7']
+
+
+def test_bogons_and_subtraction():
+    bogons = {4: [prefix_to_range(*parse_prefix('10.0.0.0/8'))]}
+    prefixes = [parse_prefix(v) for v in ('10.1.0.0/16', '9.0.0.0/8', '10.0.0.0/7')]
+    # only the prefixes lying entirely inside the bogons are dropped
+    assert ranges_to_cidrs(aggregate_prefixes(prefixes, bogons)) == ['9.0.0.0/8', '10.0.0.0/7']
+    assert ranges_to_cidrs({4: subtract_ranges(cidrs_to_ranges(['10.0.0.0/7'])[4], bogons[4])}) == ['11.0.0.0/8']
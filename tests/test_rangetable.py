@@ -0,0 +1,73 @@
+import random
+
+from bgpip_tools.ranges import merge_ranges
+from bgpip_tools.rangetable import (
+    _HEADER, _RANGES, _TARGET, RangeTable, pack_range_table, read_range_maps, write_range_table,
+)
+
+RANGE_MAP = {
+    'cn': [(0x01020300, 0x010203ff), (0x0a000000, 0x0affffff)],
+    'cn.telecom': [(0x01020300, 0x010203ff)],
+    'empty': [],
+}
+
+
+def test_records_are_aligned():
+    assert _HEADER.size % 8 == 0
+    assert _TARGET.size % 8 == 0
+    assert all(v.size % 8 == 0 for v in _RANGES.values())
+
+
+def test_round_trip(tmp_path):
+    fp = tmp_path / 'cidrs' / 'v4.ranges'
+    assert write_range_table(str(fp), 4, RANGE_MAP)
+    assert not write_range_table(str(fp), 4, RANGE_MAP)
+    table = RangeTable.load(str(fp))
+    assert table._ranges_offset % 8 == 0
+    assert table.to_range_map() == RANGE_MAP
+    assert sorted(table.lookup('1.2.3.4')) == ['cn', 'cn.telecom']
+    assert table.lookup('10.1.1.1') == ['cn']
+    table.close()
+
+
+def test_unreadable_table_falls_back_to_text_lists(tmp_path):
+    (tmp_path / 'v4').mkdir()
+    (tmp_path / 'v4' / 'cn.txt').write_text('1.2.3.0/24\n')
+    (tmp_path / 'v4.ranges').write_bytes(b'BGPR\x01' + bytes(51))
+    assert read_range_maps(str(tmp_path)) == {'cn': {4: [(0x01020300, 0x010203ff)]}}
+
+
+def _random_ranges(rnd, bits, count):
+    ranges = []
+    for _ in range(count):
+        start = rnd.randrange(1 << bits)
+        ranges.append((start, min(start + rnd.randrange(1 << (bits - 4)), (1 << bits) - 1)))
+    return merge_ranges(ranges)
+
+
+def test_overlapping_targets_lookup(tmp_path):
+    rnd = random.Random(0)
+    for version, bits in ((4, 32), (6, 128)):
+        range_map = {f't{i}': _random_ranges(rnd, bits, 20) for i in range(6)}
+        fp = tmp_path / f'v{version}.ranges'
+        write_range_table(str(fp), version, range_map)
+        table = RangeTable.load(str(fp))
+        assert table.to_range_map() == range_map
+        assert table.get_ranges('t3') == range_map['t3']
+        assert len(table) == sum(len(v) for v in range_map.values())
+        addresses = [v for ranges in range_map.values() for start, end in ranges for v in (start - 1, start, end, end + 1)]
+        addresses += [rnd.randrange(1 << bits) for _ in range(200)]
+        for address in addresses:
+            if not 0 <= address < 1 << bits:
+                continue
+            expected = sorted(k for k, v in range_map.items() if any(s <= address <= e for s, e in v))
+            assert table.lookup(address) == expected
+        table.close()
+
+
+def test_segments_are_sorted_and_disjoint():
+    data = pack_range_table(4, RANGE_MAP)
+    table = RangeTable(data, 4, {'cn': (0, 0, 0), 'cn.telecom': (1, 0, 0), 'empty': (2, 0, 0)}, 3,
+                       len(data) - 3 * _RANGES[4].size)
+    segments = list(table._iter_segments())
+    assert segments == [(0x01020300, 0x010203ff, 0), (0x01020300, 0x010203ff, 1), (0x0a000000, 0x0affffff, 0)]
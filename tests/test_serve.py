@@ -0,0 +1,33 @@
+import datetime
+
+from bgpip_tools import config, data, serve
+
+
+def test_new_day_reloads_the_daily_data(monkeypatch):
+    calls = []
+    monkeypatch.setattr(data, 'prepare_data_asn', lambda: calls.append('asn'))
+    monkeypatch.setattr(data, 'prepare_data_bogons', lambda: calls.append('bogons'))
+    service = serve.GenerationService(config.get_config_dir(), bogons='online')
+    service.config_key = 'key'
+    service.config = {'cn': {'asn_filters': {}}}
+
+    service.refresh_day()
+    assert calls == [] and service.config_key == 'key'
+
+    tomorrow = config.DT_NOW + datetime.timedelta(days=1)
+    monkeypatch.setattr(serve, 'refresh_now', lambda: tomorrow)
+    service.refresh_day()
+    assert calls == ['asn', 'bogons']
+    assert service.day == tomorrow.date()
+    assert service.config_key is None and service.config == {}
+    assert service.stale_families == {'ipv4', 'ipv6'}
+
+
+def test_refresh_now_moves_the_dated_filenames(monkeypatch):
+    monkeypatch.setattr(config, 'DT_NOW', datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+    monkeypatch.setitem(config.BOGONS_DATA, 'ipv4', dict(config.BOGONS_DATA['ipv4']))
+    monkeypatch.setitem(config.BOGONS_DATA, 'ipv6', dict(config.BOGONS_DATA['ipv6']))
+    assert data.get_asn_filename() == 'asn_20200101.jsonl'
+    now = config.refresh_now()
+    assert data.get_asn_filename() == f'asn_{now.strftime("%Y%m%d")}.jsonl'
+    assert config.BOGONS_DATA['ipv6']['filename'] == f'bogons_v6_{now.strftime("%Y%m%d")}.txt'
@@ -0,0 +1,90 @@
+import io
+
+import pytest
+
+from bgpip_tools.ranges import cidrs_to_ranges
+from bgpip_tools.writers import (
+    IPSET_MAXELEM, IPSET_NAME_SIZE, _ipset_name, remove_output, write_bird, write_iproute2, write_ipset,
+    write_nftables, write_output, write_text,
+)
+
+V4_RANGES = cidrs_to_ranges(['1.2.3.0/24', '10.0.0.0/31', '10.0.0.2/32'])[4]
+V6_RANGES = cidrs_to_ranges(['2400::/32'])[6]
+
+
+def _write(writer, name, version, ranges, **options):
+    f = io.StringIO()
+    writer(f, name, version, ranges, **options)
+    return f.getvalue()
+
+
+def test_text():
+    assert _write(write_text, 'cn', 4, V4_RANGES) == '1.2.3.0/24\n10.0.0.0/31\n10.0.0.2/32\n'
+    assert _write(write_text, 'cn', 6, V6_RANGES) == '2400::/32\n'
+
+
+def test_nftables():
+    assert _write(write_nftables, 'cn.telecom', 4, V4_RANGES) == (
+        'set cn_telecom_v4 {\n'
+        '\ttype ipv4_addr\n'
+        '\tflags interval\n'
+        '\telements = {\n'
+        '\t\t1.2.3.0/24,\n'
+        '\t\t10.0.0.0-10.0.0.2\n'
+        '\t}\n'
+        '}\n'
+    )
+    assert _write(write_nftables, 'empty', 6, []) == 'set empty_v6 {\n\ttype ipv6_addr\n\tflags interval\n}\n'
+
+
+def test_ipset():
+    assert _write(write_ipset, 'cn', 6, V6_RANGES) == (
+        f'create cn_v6 hash:net family inet6 maxelem {IPSET_MAXELEM} -exist\n'
+        f'create cn_v6_tmp hash:net family inet6 maxelem {IPSET_MAXELEM} -exist\n'
+        'flush cn_v6_tmp\n'
+        'add cn_v6_tmp 2400::/32\n'
+        'swap cn_v6_tmp cn_v6\n'
+        'destroy cn_v6_tmp\n'
+    )
+
+
+def test_ipset_names_are_truncated():
+    name = 'cn.telecom.very.long.target.name'
+    set_name = _ipset_name(name, 4)
+    tmp_set_name = _ipset_name(name, 4, '_tmp')
+    assert len(set_name) <= IPSET_NAME_SIZE and len(tmp_set_name) <= IPSET_NAME_SIZE
+    assert set_name.startswith('cn_telecom_') and set_name.endswith('_v4')
+    assert tmp_set_name.endswith('_v4_tmp')
+    assert set_name.rsplit('_', 2)[1] == tmp_set_name.rsplit('_', 3)[1]
+    assert _ipset_name(name + '2', 4) != set_name
+    assert f'swap {tmp_set_name} {set_name}\n' in _write(write_ipset, name, 4, V4_RANGES)
+
+
+def test_routes():
+    assert _write(write_bird, 'cn', 6, V6_RANGES) == 'route 2400::/32 blackhole;\n'
+    assert _write(write_bird, 'cn', 6, V6_RANGES, route_via='fe80::1') == 'route 2400::/32 via fe80::1;\n'
+    assert _write(write_bird, 'cn', 6, V6_RANGES, route_via='wg0') == 'route 2400::/32 via "wg0";\n'
+    assert _write(write_iproute2, 'cn', 6, V6_RANGES) == 'route replace blackhole 2400::/32\n'
+    assert _write(write_iproute2, 'cn', 6, V6_RANGES, route_via='10.0.0.1') == (
+        'route replace 2400::/32 via 10.0.0.1\n')
+    assert _write(write_iproute2, 'cn', 6, V6_RANGES, route_via='wg0') == 'route replace 2400::/32 dev wg0\n'
+
+
+def test_write_and_remove_output(tmp_path):
+    range_map = {'cn': V4_RANGES, 'cn.telecom': V4_RANGES[:1]}
+    assert [(name, changed) for name, _, changed in write_output(str(tmp_path), 'nftables', 4, range_map)] == [
+        ('cn', True), ('cn.telecom', True)]
+    range_map['cn.telecom'] = V4_RANGES
+    assert [(name, changed) for name, _, changed in write_output(str(tmp_path), 'nftables', 4, range_map)] == [
+        ('cn', False), ('cn.telecom', True)]
+    assert sorted(p.name for p in (tmp_path / 'nftables' / 'v4').iterdir()) == ['cn.nft', 'cn.telecom.nft']
+
+    removed = list(remove_output(str(tmp_path), 'nftables', 4, ['cn.telecom', 'missing']))
+    assert removed == [str(tmp_path / 'nftables' / 'v4' / 'cn.telecom.nft')]
+    assert [p.name for p in (tmp_path / 'nftables' / 'v4').iterdir()] == ['cn.nft']
+
+
+def test_set_name_collision(tmp_path):
+    with pytest.raises(ValueError, match='nftables set cn_telecom_v4'):
+        list(write_output(str(tmp_path), 'nftables', 4, {'cn.telecom': [], 'cn-telecom': []}))
+    assert not (tmp_path / 'nftables').exists()